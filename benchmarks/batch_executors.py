@@ -0,0 +1,86 @@
+"""Throughput of the batch executors: worker processes vs threads.
+
+Prepares copies of the test structures with `run_batch` and reports the
+receptors prepared per second for each executor and number of workers.
+Threads only scale with the number of workers on a free-threaded build
+of Python (e.g. `python3.13t`); with the GIL they measure the overhead
+saved by not starting processes and pickling arguments.
+
+Usage (from the repository root):
+
+    python benchmarks/batch_executors.py --copies 20 --workers 1 2 4 8
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import sys
+import sysconfig
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docktprep.batch import collect_inputs, configure_batch_argparser, run_batch
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests", "data")
+
+
+def make_inputs(directory: str, copies: int) -> list[str]:
+    for name in sorted(os.listdir(DATA_DIR)):
+        root, ext = os.path.splitext(name)
+        for i in range(copies):
+            shutil.copy(os.path.join(DATA_DIR, name), os.path.join(directory, f"{root}_{i}{ext}"))
+    return collect_inputs([directory])
+
+
+def run(inputs: list[str], output_dir: str, executor: str, workers: int, options: list[str]) -> float:
+    args = configure_batch_argparser(
+        ["-i", "unused", "-d", output_dir, "--executor", executor,
+         "--workers", str(workers), "--output-ext", "pdb", *options]
+    )
+    start = time.perf_counter()
+    summary = run_batch(inputs, args)
+    elapsed = time.perf_counter() - start
+    if summary["failed"]:
+        raise RuntimeError(f"{summary['failed']} inputs failed with the {executor} executor")
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--copies", type=int, default=10, help="Copies of each test structure.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--executors", nargs="+", default=["process", "thread"])
+    parser.add_argument("--repeat", type=int, default=3, help="Best of this many runs.")
+    parser.add_argument(
+        "options", nargs=argparse.REMAINDER, help="Extra pipeline options, after '--'."
+    )
+    args = parser.parse_args()
+    options = [o for o in args.options if o != "--"]
+    logging.disable(logging.WARNING)
+
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(
+        f"Python {sys.version.split()[0]}, free-threaded build: "
+        f"{bool(sysconfig.get_config_var('Py_GIL_DISABLED'))}, GIL enabled: {gil}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir = os.path.join(tmp, "inputs")
+        os.mkdir(input_dir)
+        inputs = make_inputs(input_dir, args.copies)
+        print(f"{len(inputs)} receptors, best of {args.repeat} runs\n")
+        print(f"{'executor':>8} {'workers':>7} {'time (s)':>9} {'receptors/s':>11}")
+        for workers in args.workers:
+            for executor in args.executors:
+                times = []
+                for i in range(args.repeat):
+                    output_dir = os.path.join(tmp, f"{executor}-{workers}-{i}")
+                    times.append(run(inputs, output_dir, executor, workers, options))
+                best = min(times)
+                print(f"{executor:>8} {workers:>7} {best:>9.2f} {len(inputs) / best:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
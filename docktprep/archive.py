@@ -0,0 +1,215 @@
+"""Read structures straight from tar and zip archives, without extracting them.
+
+An archive is indexed once: the index maps each member name to the offset
+and size of its data, so reading a member is a single seek and read.
+Members (and plain files) may be gzip-compressed, as in the divided
+directories of PDB mirrors (`pdb/ab/pdb1abc.ent.gz`).
+
+A member is named `<archive>::<member>`. The batch entry point resolves
+these names against the index in the parent process and hands workers
+picklable `ArchiveMember` objects, so workers never index the archive
+themselves.
+"""
+
+import fnmatch
+import gzip
+import io
+import logging
+import os
+import struct
+import tarfile
+import threading
+import zipfile
+import zlib
+from dataclasses import dataclass
+
+__all__ = [
+    "ArchiveIndex",
+    "ArchiveMember",
+    "archive_index",
+    "is_archive",
+    "open_structure",
+    "resolve_source",
+    "split_structure_name",
+]
+
+MEMBER_SEPARATOR = "::"
+ARCHIVE_FORMATS = (".tar", ".zip")
+COMPRESSED_TAR_FORMATS = (".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+STRUCTURE_EXTS = {".pdb": ".pdb", ".ent": ".pdb", ".cif": ".cif"}
+
+# zip local file header: signature, ..., file name length, extra field length
+_ZIP_LOCAL_HEADER = struct.Struct("<4s22xHH")
+_ZIP_LOCAL_SIGNATURE = b"PK\x03\x04"
+
+_index_cache: dict[tuple, "ArchiveIndex"] = {}
+_index_lock = threading.Lock()
+
+
+def split_structure_name(path: str) -> tuple[str, str, bool]:
+    """Return (root, structure extension, gzip-compressed) of a file or member name.
+
+    `.ent` files are PDB files; other extensions are returned unchanged.
+    """
+    root, ext = os.path.splitext(path)
+    compressed = ext.lower() == ".gz"
+    if compressed:
+        root, ext = os.path.splitext(root)
+    return root, STRUCTURE_EXTS.get(ext.lower(), ext), compressed
+
+
+def is_archive(path: str) -> bool:
+    return path.lower().endswith(ARCHIVE_FORMATS + COMPRESSED_TAR_FORMATS)
+
+
+@dataclass(frozen=True)
+class ArchiveMember:
+    """Location of a member's data in an archive (picklable, O(1) to read).
+
+    For zip archives `offset` is that of the member's local header and
+    `method` its compression method; tar members are stored as is.
+    """
+
+    archive: str
+    name: str
+    offset: int
+    size: int
+    method: int = zipfile.ZIP_STORED
+    zip: bool = False
+
+    def __str__(self) -> str:
+        return f"{self.archive}{MEMBER_SEPARATOR}{self.name}"
+
+    def read_bytes(self) -> bytes:
+        """Return the member's contents (decompressed if the member is gzip'd)."""
+        with open(self.archive, "rb") as f:
+            offset = self.offset
+            if self.zip:
+                f.seek(offset)
+                signature, name_len, extra_len = _ZIP_LOCAL_HEADER.unpack(
+                    f.read(_ZIP_LOCAL_HEADER.size)
+                )
+                if signature != _ZIP_LOCAL_SIGNATURE:
+                    e = f"Corrupt zip archive {self.archive}: bad header of {self.name}."
+                    logging.error(e)
+                    raise ValueError(e)
+                offset += _ZIP_LOCAL_HEADER.size + name_len + extra_len
+            f.seek(offset)
+            data = f.read(self.size)
+
+        if self.method == zipfile.ZIP_DEFLATED:
+            data = zlib.decompress(data, -zlib.MAX_WBITS)
+        if split_structure_name(self.name)[2]:
+            data = gzip.decompress(data)
+        return data
+
+
+class ArchiveIndex:
+    """Member name -> data location of an uncompressed tar or a zip archive.
+
+    Parameters
+    ----------
+    archive : str
+        path of the archive
+    """
+
+    def __init__(self, archive: str) -> None:
+        self.archive = archive
+        self.zip = archive.lower().endswith(".zip")
+        if archive.lower().endswith(COMPRESSED_TAR_FORMATS):
+            e = (
+                f"Cannot index {archive}: members of a compressed tarball cannot be read "
+                "by offset. Use an uncompressed tar (members may be gzip'd) or a zip archive."
+            )
+            logging.error(e)
+            raise ValueError(e)
+        # name -> (offset, size, compression method); tuples keep large indexes small
+        self.entries: dict[str, tuple[int, int, int]] = (
+            self._index_zip() if self.zip else self._index_tar()
+        )
+        logging.info(f"Indexed {len(self.entries)} members of {archive}")
+
+    def _index_tar(self) -> dict[str, tuple[int, int, int]]:
+        entries = {}
+        with tarfile.open(self.archive, "r:") as tar:
+            while (info := tar.next()) is not None:
+                tar.members = []  # do not keep every TarInfo of a large archive
+                if info.isfile():
+                    entries[info.name] = (info.offset_data, info.size, zipfile.ZIP_STORED)
+        return entries
+
+    def _index_zip(self) -> dict[str, tuple[int, int, int]]:
+        entries = {}
+        with zipfile.ZipFile(self.archive) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                if info.flag_bits & 0x1 or info.compress_type not in (
+                    zipfile.ZIP_STORED,
+                    zipfile.ZIP_DEFLATED,
+                ):
+                    logging.warning(
+                        f"Skipping {self.archive}{MEMBER_SEPARATOR}{info.filename}: "
+                        "encrypted or unsupported compression"
+                    )
+                    continue
+                entries[info.filename] = (
+                    info.header_offset, info.compress_size, info.compress_type
+                )
+        return entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def member(self, name: str) -> ArchiveMember:
+        try:
+            offset, size, method = self.entries[name]
+        except KeyError:
+            e = f"No member {name} in {self.archive}."
+            logging.error(e)
+            raise FileNotFoundError(e) from None
+        return ArchiveMember(self.archive, name, offset, size, method, self.zip)
+
+    def select(self, patterns: list[str] | None = None) -> list[ArchiveMember]:
+        """Structure members matching any of the glob `patterns` (all if None)."""
+        names = [
+            name
+            for name in self.entries
+            if split_structure_name(name)[1] in STRUCTURE_EXTS.values()
+            and (not patterns or any(fnmatch.fnmatch(name, p) for p in patterns))
+        ]
+        return [self.member(name) for name in sorted(names)]
+
+
+def archive_index(archive: str) -> ArchiveIndex:
+    """Index of `archive`, built once per process while the archive is unchanged."""
+    stat = os.stat(archive)
+    key = (os.path.abspath(archive), stat.st_mtime_ns, stat.st_size)
+    with _index_lock:
+        index = _index_cache.get(key)
+        if index is None:
+            index = _index_cache[key] = ArchiveIndex(archive)
+        return index
+
+
+def resolve_source(source: str) -> "str | ArchiveMember":
+    """Resolve an `<archive>::<member>` name; other paths are returned unchanged."""
+    if MEMBER_SEPARATOR not in source:
+        return source
+    archive, name = source.split(MEMBER_SEPARATOR, 1)
+    return archive_index(archive).member(name)
+
+
+def open_structure(source: "str | ArchiveMember", encoding: str | None = None) -> io.TextIOBase:
+    """Open a structure file, a gzip'd file or an archive member as a text stream.
+
+    Archive members and gzip'd files are read into memory (seekable).
+    """
+    if isinstance(source, str) and MEMBER_SEPARATOR in source:
+        source = resolve_source(source)
+    if isinstance(source, ArchiveMember):
+        return io.StringIO(source.read_bytes().decode(encoding or "utf-8"))
+    if split_structure_name(source)[2]:
+        with gzip.open(source, "rt", encoding=encoding) as f:
+            return io.StringIO(f.read())
+    return open(source, "r", encoding=encoding)
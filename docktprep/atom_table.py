@@ -0,0 +1,141 @@
+"""Columnar (NumPy) view of the atoms of a Biopython structure."""
+
+from dataclasses import dataclass, field
+
+import numpy as np
+from Bio.PDB import Structure
+
+
+@dataclass
+class AtomTable:
+    """Per-atom NumPy arrays, in the order `PDBIO` writes the atoms.
+
+    Disordered atoms and residues are unpacked, so every alternate location
+    is a row of its own. `residues` holds the Biopython residue of each
+    `residue_index`, when the table was built from a structure.
+    """
+
+    coord: np.ndarray
+    name: np.ndarray
+    fullname: np.ndarray
+    element: np.ndarray
+    altloc: np.ndarray
+    serial: np.ndarray
+    occupancy: np.ndarray
+    bfactor: np.ndarray
+    resname: np.ndarray
+    hetflag: np.ndarray
+    resseq: np.ndarray
+    icode: np.ndarray
+    segid: np.ndarray
+    chain_id: np.ndarray
+    model_id: np.ndarray
+    residue_index: np.ndarray
+    residues: list = field(default_factory=list, repr=False)
+
+    def __len__(self) -> int:
+        return len(self.coord)
+
+    @property
+    def is_hetero(self) -> np.ndarray:
+        return self.hetflag != " "
+
+    @property
+    def is_water(self) -> np.ndarray:
+        return self.hetflag == "W"
+
+    @property
+    def is_hydrogen(self) -> np.ndarray:
+        return (self.element == "H") | (self.element == "D")
+
+    @property
+    def n_residues(self) -> int:
+        return int(self.residue_index.max()) + 1 if len(self) else 0
+
+    def residue_starts(self) -> np.ndarray:
+        """Index of the first atom of each residue (rows are grouped by residue)."""
+        return np.flatnonzero(np.diff(self.residue_index, prepend=-1))
+
+    def residue_mask(self, residue_mask: np.ndarray) -> np.ndarray:
+        """Expand a per-residue boolean mask to a per-atom mask."""
+        return np.asarray(residue_mask, dtype=bool)[self.residue_index]
+
+    def atom_index_by_name(self, name: str, mask: np.ndarray | None = None) -> np.ndarray:
+        """Per-residue index of the first atom called `name` (-1 if absent)."""
+        index = np.full(self.n_residues, -1, dtype=np.int64)
+        selected = self.name == name
+        if mask is not None:
+            selected &= mask
+        found = np.flatnonzero(selected)[::-1]  # reversed: the first atom wins
+        index[self.residue_index[found]] = found
+        return index
+
+    def take(self, mask: np.ndarray) -> "AtomTable":
+        """Return a new table with the selected rows (residue indices are kept)."""
+        values = {
+            name: getattr(self, name)[mask]
+            for name in self.__dataclass_fields__
+            if name != "residues"
+        }
+        return AtomTable(**values, residues=self.residues)
+
+    @classmethod
+    def from_structure(cls, structure: Structure, model_id: int | None = None) -> "AtomTable":
+        """Build a table from a structure (or from one of its models)."""
+        atoms = []
+        residues = []
+        residue_sizes = []
+        residue_chains = []
+        residue_models = []
+        models = structure.get_list()
+        if model_id is not None:
+            models = [m for m in models if m.id == model_id]
+
+        for model in models:
+            for chain in model.get_list():
+                for residue in chain.get_unpacked_list():
+                    # only residues flagged as disordered hold DisorderedAtoms
+                    residue_atoms = (
+                        residue.get_unpacked_list() if residue.disordered else residue.child_list
+                    )
+                    atoms += residue_atoms
+                    residues.append(residue)
+                    residue_sizes.append(len(residue_atoms))
+                    residue_chains.append(chain.id)
+                    residue_models.append(model.id)
+
+        # residue-level columns are built once per residue and repeated per atom
+        sizes = np.array(residue_sizes, dtype=np.int64)
+
+        def per_residue(values, dtype) -> np.ndarray:
+            return np.repeat(np.array(values, dtype=dtype), sizes)
+
+        coord = (
+            np.concatenate([atom.coord for atom in atoms]).astype(np.float64).reshape(-1, 3)
+            if atoms
+            else np.zeros((0, 3))
+        )
+        return cls(
+            coord=coord,
+            name=np.array([atom.name for atom in atoms], dtype=str),
+            fullname=np.array([atom.fullname for atom in atoms], dtype=str),
+            element=np.array(
+                [(atom.element or "").strip().upper() for atom in atoms], dtype=str
+            ),
+            altloc=np.array([atom.altloc for atom in atoms], dtype=str),
+            serial=np.array([atom.serial_number or 0 for atom in atoms], dtype=np.int64),
+            occupancy=np.array(
+                [-1.0 if atom.occupancy is None else atom.occupancy for atom in atoms],
+                dtype=np.float64,
+            ),
+            bfactor=np.array([atom.bfactor for atom in atoms], dtype=np.float64),
+            resname=per_residue([residue.resname for residue in residues], str),
+            hetflag=per_residue([residue.id[0] for residue in residues], str),
+            resseq=per_residue([residue.id[1] for residue in residues], np.int64),
+            icode=per_residue([residue.id[2] for residue in residues], str),
+            segid=per_residue([residue.segid for residue in residues], str),
+            chain_id=per_residue(residue_chains, str),
+            model_id=per_residue(residue_models, np.int64),
+            residue_index=np.repeat(np.arange(len(residues), dtype=np.int64), sizes),
+            residues=residues,
+        )
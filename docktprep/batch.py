@@ -0,0 +1,401 @@
+"""Prepare many receptors in parallel, with a resumable progress journal."""
+
+import argparse
+import logging
+import os
+import time
+import traceback
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .archive import ArchiveMember, archive_index, is_archive, resolve_source, split_structure_name
+from .journal import (
+    DONE,
+    FAILED,
+    BatchJournal,
+    JournalEntry,
+    file_sha256,
+    summarize,
+    write_metrics,
+)
+from .logs import configure_logging
+from .receptor_parser import FileFormatHandler
+from .scheduler import BatchScheduler, Job, default_memory_budget, estimate_cost
+from .store import DEFAULT_SHARDS, StoreReader, open_store
+
+__all__ = [
+    "collect_inputs",
+    "output_path",
+    "make_executor",
+    "prepare_item",
+    "run_batch",
+]
+
+JOURNAL_NAME = "docktprep-journal.jsonl"
+
+
+def _is_structure(name: str) -> bool:
+    return split_structure_name(name)[1].lower() in FileFormatHandler.ACCEPTED_FORMATS
+
+
+def collect_inputs(
+    paths: list[str], exclude_dir: str | None = None, members: list[str] | None = None
+) -> list[str]:
+    """Expand directories and archives into the structures they contain (sorted).
+
+    Structures may be gzip-compressed. Archive members are named
+    `<archive>::<member>`; `members` restricts them to names matching any of
+    these glob patterns.
+    """
+    inputs = []
+    exclude_dir = os.path.abspath(exclude_dir) if exclude_dir else None
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                # never pick up our own outputs
+                dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != exclude_dir]
+                inputs += [os.path.join(root, f) for f in files if _is_structure(f)]
+        elif is_archive(path):
+            inputs += [str(member) for member in archive_index(path).select(members)]
+        else:
+            inputs.append(path)
+    return sorted(dict.fromkeys(inputs))
+
+
+def output_path(input_file: str, output_dir: str, output_ext: str | None = None) -> str:
+    root, ext, _ = split_structure_name(os.path.basename(input_file))
+    ext = FileFormatHandler.normalize_ext(output_ext) if output_ext else ext
+    return os.path.join(output_dir, root + ext)
+
+
+def check_unique_outputs(inputs: list[str], output_dir: str, output_ext: str | None) -> None:
+    """Fail if two inputs would be written to the same output file."""
+    seen: dict[str, str] = {}
+    for input_file in inputs:
+        output_file = output_path(input_file, output_dir, output_ext)
+        if output_file in seen:
+            e = f"Inputs {seen[output_file]} and {input_file} would both be written to {output_file}."
+            logging.error(e)
+            raise ValueError(e)
+        seen[output_file] = input_file
+
+
+def make_executor(executor: str, workers: int) -> Executor:
+    """Pool running the batch jobs: worker processes, or threads of this process."""
+    if executor == "thread":
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="docktprep")
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+def prepare_item(
+    input_file: str | ArchiveMember, output_file: str, args: argparse.Namespace, attempt: int = 1
+) -> JournalEntry:
+    """Prepare one receptor; failures are returned in the entry, not raised."""
+    from .main import prepare_receptor
+
+    entry = JournalEntry(input=str(input_file), status=FAILED, attempt=attempt, output=output_file)
+    entry.started = time.time()
+    start = time.perf_counter()
+    try:
+        if args.output_store:
+            store = open_store(args.output_store, shards=args.store_shards)
+            entry.output = f"{args.output_store}::{os.path.basename(output_file)}"
+            entry.timings = prepare_receptor(
+                input_file, output_file, args, store=store, events=entry.events
+            )
+            entry.sha256 = store.last_record().sha256
+        else:
+            entry.timings = prepare_receptor(input_file, output_file, args, events=entry.events)
+            entry.sha256 = file_sha256(output_file)
+        entry.status = DONE
+    except Exception as e:
+        entry.error = f"{type(e).__name__}: {e}"
+        logging.error(f"{input_file}: {entry.error}\n{traceback.format_exc()}")
+    entry.elapsed = round(time.perf_counter() - start, 6)
+    return entry
+
+
+def pending_items(
+    inputs: list[str], journal: BatchJournal, output_dir: str, args: argparse.Namespace
+) -> list[tuple[str, int]]:
+    """Return (input, attempt) of the inputs that still need to run."""
+    state = journal.scan()
+    max_attempts = args.max_retries + 1
+    if args.output_store:
+        with StoreReader(args.output_store) as store:
+            stored = set(store)
+        is_written = lambda output_file: os.path.basename(output_file) in stored
+    else:
+        is_written = os.path.exists
+    pending = []
+    n_done = n_exhausted = 0
+    for input_file in inputs:
+        status, attempt = state.get(input_file, ("", 0))
+        output_file = output_path(input_file, output_dir, args.output_ext)
+        if status == DONE and is_written(output_file):
+            n_done += 1
+        elif status == FAILED and attempt >= max_attempts:
+            n_exhausted += 1
+        else:
+            pending.append((input_file, attempt + 1 if status == FAILED else 1))
+
+    if n_done or n_exhausted:
+        logging.info(
+            f"Journal {journal.file}: skipping {n_done} completed inputs and "
+            f"{n_exhausted} inputs that failed {max_attempts} times"
+        )
+    return pending
+
+
+def run_batch(inputs: list[str], args: argparse.Namespace) -> dict[str, int]:
+    """Prepare `inputs` into `args.output_dir`, resuming from the journal.
+
+    Failed inputs are retried (in this run and in later ones) until they
+    have been attempted `args.max_retries + 1` times. The metrics of the
+    run are written next to the journal. Returns the number of inputs that
+    finished as done or failed in this run.
+    """
+    check_unique_outputs(inputs, args.output_dir, args.output_ext)
+    os.makedirs(args.output_dir, exist_ok=True)
+    # archive members are located once, here: workers read them by offset
+    sources = {input_file: resolve_source(input_file) for input_file in inputs}
+    journal = BatchJournal(args.journal or os.path.join(args.output_dir, JOURNAL_NAME))
+    final_status = {}
+    entries = []
+
+    pending = pending_items(inputs, journal, args.output_dir, args)
+    modeller = args.add_missing_atoms or args.replace_nstd_res
+    memory_budget_mb = args.memory_budget or default_memory_budget()
+    costs = {}
+    # inputs that were running when a worker died: the culprit is unknown
+    suspects: list[tuple[str, int]] = []
+    while pending or suspects:
+        retry, unfinished = [], []
+        # suspects run one at a time, so that a crash is charged to its input only
+        isolating = bool(suspects)
+        alone = isolating or args.workers == 1
+        if isolating:
+            round_items, suspects = suspects, []
+        else:
+            round_items, pending = pending, []
+
+        def record(job: Job, future) -> None:
+            try:
+                entry = future.result()
+            except BrokenProcessPool as e:
+                if not alone:
+                    unfinished.append((job.input, job.attempt))
+                    return
+                # its worker died (e.g. killed by the OOM killer)
+                entry = JournalEntry(
+                    input=job.input,
+                    status=FAILED,
+                    attempt=job.attempt,
+                    started=time.time(),
+                    error=f"BrokenProcessPool: {e}",
+                )
+            journal.record(entry)
+            entries.append(entry)
+            final_status[job.input] = entry.status
+            if entry.status == FAILED and job.attempt <= args.max_retries:
+                retry.append((job.input, job.attempt + 1))
+
+        workers = 1 if alone else args.workers
+        scheduler = BatchScheduler(
+            workers=workers,
+            memory_budget_mb=memory_budget_mb,
+            largest_first=args.schedule == "largest-first",
+        )
+        with make_executor(args.executor, workers) as pool:
+            new_inputs = [i for i, _ in round_items if i not in costs]
+            for cost in pool.map(estimate_cost, map(sources.get, new_inputs), chunksize=16):
+                costs[cost.input] = cost
+            jobs = [
+                Job(
+                    input=input_file,
+                    attempt=attempt,
+                    cost=costs[input_file],
+                    work=costs[input_file].work(modeller),
+                    memory_mb=costs[input_file].memory_mb(modeller),
+                )
+                for input_file, attempt in round_items
+            ]
+            report = scheduler.run(
+                jobs,
+                submit=lambda job: pool.submit(
+                    prepare_item,
+                    sources[job.input],
+                    output_path(job.input, args.output_dir, args.output_ext),
+                    args,
+                    job.attempt,
+                ),
+                on_done=record,
+            )
+        # a worker died: the jobs not submitted yet run in a new pool, unchanged
+        unsubmitted = [(job.input, job.attempt) for job in report.unsubmitted]
+        if unfinished:
+            logging.warning(
+                f"A worker died while {len(unfinished)} inputs were running: "
+                "rerunning them one at a time"
+            )
+        pending += retry
+        if isolating:
+            suspects += unsubmitted
+        else:
+            pending += unsubmitted
+        suspects += unfinished
+
+    statuses = list(final_status.values())
+    summary = {DONE: statuses.count(DONE), FAILED: statuses.count(FAILED)}
+    metrics = summarize(entries)
+    write_metrics(journal, metrics)
+    events = ", ".join(f"{n} {event}" for event, n in sorted(metrics["events"].items()))
+    logging.info(
+        f"Batch finished: {summary[DONE]} done, {summary[FAILED]} failed"
+        + (f" ({events})" if events else "")
+    )
+    return summary
+
+
+def configure_batch_argparser(argv: list[str] | None = None) -> argparse.Namespace:
+    from .main import add_pipeline_arguments
+
+    parser = argparse.ArgumentParser(
+        prog="docktprep batch",
+        description="DockTPrep: prepare many receptors in parallel (resumable).",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "-i",
+        "--inputs",
+        nargs="+",
+        required=True,
+        help="Receptor files, directories containing receptor files, and/or tar or zip "
+        "archives (read without extraction). Receptor files may be gzip-compressed.",
+    )
+    parser.add_argument(
+        "--members",
+        nargs="+",
+        default=None,
+        help="Glob patterns selecting the archive members to prepare (e.g. 'pdb/ab/*'); None selects all structures.",
+    )
+    parser.add_argument(
+        "-d",
+        "--output-dir",
+        type=str,
+        required=True,
+        help="Directory for the prepared structures (or only the journal, with --output-store).",
+    )
+    parser.add_argument(
+        "--output-store",
+        type=str,
+        default=None,
+        metavar="DIR",
+        help="Append the prepared structures to a packed store in DIR (a few large shard "
+        "files with an index) instead of writing one file per receptor.",
+    )
+    parser.add_argument(
+        "--store-shards",
+        type=int,
+        default=DEFAULT_SHARDS,
+        help="Number of shard files of a new output store.",
+    )
+    parser.add_argument(
+        "--output-ext",
+        choices=("pdb", "cif"),
+        default=None,
+        help="Format of the prepared structures; None keeps the format of each input.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of workers.",
+    )
+    parser.add_argument(
+        "--executor",
+        choices=("process", "thread"),
+        default="process",
+        help="Run the workers as processes, or as threads of one process (no start-up "
+        "or pickling cost; scales with free-threaded Python).",
+    )
+    parser.add_argument(
+        "--journal",
+        type=str,
+        default=None,
+        help=f"Progress journal used to resume interrupted runs; None uses OUTPUT_DIR/{JOURNAL_NAME}.",
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=2,
+        help="Number of times a failed input is retried, across runs.",
+    )
+    parser.add_argument(
+        "--schedule",
+        choices=("largest-first", "input-order"),
+        default="largest-first",
+        help="Dispatch order: largest estimated cost first, or the order of the inputs.",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=float,
+        default=None,
+        help="Memory (MB) available to concurrent jobs on this node; None uses 80%% of the physical memory.",
+    )
+    parser.add_argument(
+        "--queue",
+        type=str,
+        default=None,
+        metavar="DIR",
+        help="Shared queue directory for multi-node runs: every node runs the same command "
+        "with this option and claims inputs from the queue (the first node fills it).",
+    )
+    parser.add_argument(
+        "--lease",
+        type=float,
+        default=600.0,
+        metavar="SECONDS",
+        help="Inputs claimed from the queue by a node that stopped renewing them for this "
+        "long (e.g. a crashed node) are released to the other nodes.",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=5.0,
+        metavar="SECONDS",
+        help="How often a node checks the queue for expired leases and new inputs.",
+    )
+    parser.add_argument(
+        "--log-file",
+        type=str,
+        help="Output file for logging.",
+        default=None,
+    )
+    add_pipeline_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.output_store and args.grid_box:
+        parser.error(
+            "--grid-box needs the prepared receptor files: it cannot be used with --output-store"
+        )
+    modeller = args.add_missing_atoms or args.replace_nstd_res
+    if modeller and args.executor == "thread" and not args.modeller_isolation:
+        # MODELLER's output is captured from fds 1/2, which all threads share
+        parser.error(
+            "--no-modeller-isolation cannot be used with --executor thread: the output of "
+            "the other threads would be captured as MODELLER's"
+        )
+    return args
+
+
+def main(argv: list[str] | None = None):
+    args = configure_batch_argparser(argv)
+    configure_logging(args.log_file)
+    inputs = collect_inputs(args.inputs, exclude_dir=args.output_dir, members=args.members)
+    if args.queue:
+        from .work_queue import run_queue
+
+        summary = run_queue(inputs, args)
+    else:
+        summary = run_batch(inputs, args)
+    return 1 if summary[FAILED] else 0
@@ -0,0 +1,308 @@
+"""Crop the receptor to the region around a binding site."""
+
+import io
+import logging
+import os
+import re
+from typing import Protocol
+
+import numpy as np
+from Bio.PDB.MMCIF2Dict import MMCIF2Dict
+from Bio.PDB.mmcifio import MMCIFIO
+from Bio.PDB.PDBIO import Select
+
+from . import nonstd_residues, residue_templates
+from .atom_table import AtomTable
+from .receptor_parser import FileFormatHandler, Receptor
+from .spatial import CellList
+
+__all__ = [
+    "BindingSite",
+    "LigandBindingSite",
+    "ResidueBindingSite",
+    "BoxBindingSite",
+    "RepairBindingSite",
+    "BindingSiteCropOperation",
+    "read_ligand_coords",
+]
+
+_TER_FORMAT_STRING = (
+    "TER   %5i      %3s %c%4i%c                                                      \n"
+)
+_RESIDUE_SELECTOR = re.compile(r"^\s*(\S+):(-?\d+)([A-Za-z]?)\s*$")
+
+
+def read_ligand_coords(file: str) -> np.ndarray:
+    """Read the atom coordinates of a ligand file (PDB, mmCIF, MOL2 or SDF)."""
+    ext = os.path.splitext(file)[1].lower()
+    if ext in (".mol2",):
+        coords = []
+        with open(file) as f:
+            in_atoms = False
+            for line in f:
+                if line.startswith("@<TRIPOS>"):
+                    in_atoms = line.strip() == "@<TRIPOS>ATOM"
+                elif in_atoms and line.strip():
+                    coords.append([float(v) for v in line.split()[2:5]])
+        return np.array(coords, dtype=np.float64).reshape(-1, 3)
+
+    if ext in (".sdf", ".mol"):
+        with open(file) as f:
+            lines = f.read().splitlines()
+        if len(lines) < 4 or "V3000" in lines[3]:
+            e = f"Unsupported molfile (only V2000 is accepted): {file}"
+            logging.error(e)
+            raise ValueError(e)
+        n_atoms = int(lines[3][0:3])
+        coords = [
+            [float(line[0:10]), float(line[10:20]), float(line[20:30])]
+            for line in lines[4 : 4 + n_atoms]
+        ]
+        return np.array(coords, dtype=np.float64).reshape(-1, 3)
+
+    parser = FileFormatHandler.get_parser(ext)
+    structure = parser.get_structure("ligand", file)
+    return np.array(
+        [atom.coord for atom in structure.get_atoms()], dtype=np.float64
+    ).reshape(-1, 3)
+
+
+class BindingSite(Protocol):
+    def select_residues(self, table: AtomTable, cutoff: float) -> np.ndarray:
+        """Return a per-residue boolean mask of the residues to keep."""
+        ...
+
+
+def _residues_near_points(table: AtomTable, points: np.ndarray, cutoff: float) -> np.ndarray:
+    """Mark residues with any atom within `cutoff` of `points`."""
+    selected = np.zeros(table.n_residues, dtype=bool)
+    if len(points) == 0:
+        return selected
+    index = CellList(table.coord, cell_size=cutoff)
+    selected[table.residue_index[index.within(points, cutoff)]] = True
+    return selected
+
+
+class LigandBindingSite:
+    """Binding site defined by the atoms of a ligand file."""
+
+    def __init__(self, ligand_file: str) -> None:
+        self.ligand_file = ligand_file
+
+    def select_residues(self, table: AtomTable, cutoff: float) -> np.ndarray:
+        points = read_ligand_coords(self.ligand_file)
+        if len(points) == 0:
+            e = f"No atoms found in ligand file: {self.ligand_file}"
+            logging.error(e)
+            raise ValueError(e)
+        return _residues_near_points(table, points, cutoff)
+
+
+class ResidueBindingSite:
+    """Binding site defined by a list of residues (e.g. `A:45`, `A:52B`)."""
+
+    def __init__(self, residues: list[str]) -> None:
+        self.residues = []
+        for selector in residues:
+            match = _RESIDUE_SELECTOR.match(selector)
+            if not match:
+                e = f"Invalid residue selector: {selector!r}. Expected CHAIN:RESSEQ[ICODE]."
+                logging.error(e)
+                raise ValueError(e)
+            chain_id, resseq, icode = match.groups()
+            self.residues.append((chain_id, int(resseq), icode or " "))
+
+    @classmethod
+    def from_string(cls, residues: str) -> "ResidueBindingSite":
+        """Create from a comma-separated list of residue selectors."""
+        return cls([r for r in residues.split(",") if r.strip()])
+
+    def select_residues(self, table: AtomTable, cutoff: float) -> np.ndarray:
+        site_atoms = np.zeros(len(table), dtype=bool)
+        for chain_id, resseq, icode in self.residues:
+            found = (
+                (table.chain_id == chain_id)
+                & (table.resseq == resseq)
+                & (table.icode == icode)
+            )
+            if not found.any():
+                logging.warning(f"Binding site residue {chain_id}:{resseq}{icode.strip()} not found")
+            site_atoms |= found
+
+        if not site_atoms.any():
+            e = "None of the binding site residues were found in the receptor."
+            logging.error(e)
+            raise ValueError(e)
+        return _residues_near_points(table, table.coord[site_atoms], cutoff)
+
+
+class BoxBindingSite:
+    """Binding site defined by a box center and size (in angstroms)."""
+
+    def __init__(self, center: list[float], size: list[float]) -> None:
+        self.center = np.asarray(center, dtype=np.float64)
+        self.size = np.asarray(size, dtype=np.float64)
+
+    def select_residues(self, table: AtomTable, cutoff: float) -> np.ndarray:
+        outside = np.abs(table.coord - self.center) - self.size / 2
+        dist = np.linalg.norm(np.maximum(outside, 0.0), axis=1)
+        selected = np.zeros(table.n_residues, dtype=bool)
+        selected[table.residue_index[dist <= cutoff]] = True
+        return selected
+
+
+class RepairBindingSite:
+    """Region around the residues MODELLER has to rebuild.
+
+    Non-standard residues and residues missing heavy atoms; used to retry
+    MODELLER on a smaller receptor.
+    """
+
+    def select_residues(self, table: AtomTable, cutoff: float) -> np.ndarray:
+        repair = np.zeros(table.n_residues, dtype=bool)
+        for i, residue in enumerate(table.residues):
+            template = residue_templates.HEAVY_ATOMS.get(residue.resname)
+            repair[i] = residue.resname in nonstd_residues.nstds_to_std or bool(
+                template and set(template) - {atom.get_id() for atom in residue}
+            )
+        if not repair.any():
+            e = "No residues to rebuild in the receptor."
+            logging.error(e)
+            raise ValueError(e)
+        return _residues_near_points(table, table.coord[table.residue_mask(repair)], cutoff)
+
+
+class _ResidueSelect(Select):
+    def __init__(self, residues: list) -> None:
+        self.residue_ids = {id(residue) for residue in residues}
+
+    def accept_residue(self, residue):
+        return id(residue) in self.residue_ids
+
+
+class BindingSiteCropOperation:
+    """Keep only whole residues within `cutoff` angstroms of a binding site.
+
+    Residue numbering is preserved. Wherever cropping opened a gap in a
+    chain, PDB streams get a TER record, so that MODELLER treats the
+    fragments as separate segments instead of bridging them, and mmCIF
+    streams keep the original `label_seq_id` of the residues, so the gap
+    stays in the sequence numbering.
+    """
+
+    def __init__(self, site: BindingSite, cutoff: float = 8.0) -> None:
+        if cutoff <= 0:
+            e = f"The crop cutoff must be positive, got {cutoff}."
+            logging.error(e)
+            raise ValueError(e)
+        self.site = site
+        self.cutoff = cutoff
+
+    @staticmethod
+    def segment_ends(table: AtomTable, selected: np.ndarray) -> set[int]:
+        """Return residue indices after which a kept polymer chain is interrupted."""
+        starts = table.residue_starts()
+        polymer = np.flatnonzero(~table.is_hetero[starts])
+        chain = table.chain_id[starts][polymer]
+        kept = np.flatnonzero(selected[polymer])  # positions among polymer residues
+        if len(kept) < 2:
+            return set()
+        gap = (np.diff(kept) > 1) & (chain[kept[1:]] == chain[kept[:-1]])
+        return set(polymer[kept[:-1][gap]].tolist())
+
+    @staticmethod
+    def insert_ter_records(pdb_text: str, table: AtomTable, ends: set[int]) -> str:
+        """Insert a TER record after the last atom of each residue in `ends`.
+
+        As in the PDB format, each TER record takes the next serial number:
+        the atoms that follow are renumbered.
+        """
+        if not ends:
+            return pdb_text
+        end_keys = {}
+        for res_idx in ends:
+            residue = table.residues[res_idx]
+            key = (residue.get_parent().id, residue.id[1], residue.id[2])
+            end_keys[key] = residue.resname
+
+        out = io.StringIO()
+        pending = None
+        serial = shift = 0
+        for line in pdb_text.splitlines(keepends=True):
+            is_atom = line.startswith(("ATOM  ", "HETATM"))
+            key = (line[21], int(line[22:26]), line[26]) if is_atom else None
+            if pending is not None and key != pending:
+                chain_id, resseq, icode = pending
+                shift += 1
+                out.write(
+                    _TER_FORMAT_STRING
+                    % (serial + 1, end_keys[pending], chain_id, resseq, icode)
+                )
+                pending = None
+            if is_atom or (line.startswith("TER") and line[6:11].strip().isdigit()):
+                serial = int(line[6:11]) + shift
+                line = f"{line[:6]}{serial % 100000:5d}{line[11:]}"
+            if key in end_keys:
+                pending = key
+            out.write(line)
+        return out.getvalue()
+
+    @staticmethod
+    def keep_sequence_gaps(cif_text: str, table: AtomTable) -> str:
+        """Give the polymer residues of an mmCIF text their `label_seq_id` before cropping.
+
+        The writer numbers the kept residues consecutively, which hides the gaps.
+        """
+        seq_ids, counts = {}, {}
+        for residue in table.residues:
+            if residue.id[0] != " ":
+                continue
+            chain_id = residue.get_parent().id
+            counts[chain_id] = counts.get(chain_id, 0) + 1
+            icode = residue.id[2] if residue.id[2] != " " else "?"
+            seq_ids[(chain_id, str(residue.id[1]), icode)] = str(counts[chain_id])
+
+        data = MMCIF2Dict(io.StringIO(cif_text))
+        keys = zip(
+            data["_atom_site.auth_asym_id"],
+            data["_atom_site.auth_seq_id"],
+            data["_atom_site.pdbx_PDB_ins_code"],
+        )
+        data["_atom_site.label_seq_id"] = [
+            seq_ids.get(key, seq_id) if seq_id != "." else seq_id
+            for key, seq_id in zip(keys, data["_atom_site.label_seq_id"])
+        ]
+        file_io = MMCIFIO()
+        file_io.set_dict(data)
+        out = io.StringIO()
+        file_io.save(out)
+        return out.getvalue()
+
+    def run(self, receptor: Receptor) -> None:
+        structure = receptor.parse_current_file_stream()
+        table = AtomTable.from_structure(structure)
+        selected = self.site.select_residues(table, self.cutoff)
+        if not selected.any():
+            e = f"No receptor residues within {self.cutoff} A of the binding site."
+            logging.error(e)
+            raise ValueError(e)
+
+        logging.info(
+            f"Cropping receptor to {int(selected.sum())} of {table.n_residues} residues "
+            f"within {self.cutoff} A of the binding site"
+        )
+        keep = [table.residues[i] for i in np.flatnonzero(selected)]
+        stream = io.StringIO()
+        file_io = receptor.get_biopython_file_io(receptor.file_ext.strip("."))
+        file_io.set_structure(structure)
+        file_io.save(stream, select=_ResidueSelect(keep))
+
+        text = stream.getvalue()
+        ends = self.segment_ends(table, selected)
+        if FileFormatHandler.get_file_ext_full_name(receptor.file_ext) == "PDB":
+            text = self.insert_ter_records(text, table, ends)
+        elif ends:
+            text = self.keep_sequence_gaps(text, table)
+
+        receptor.close_file_stream()
+        receptor.current_file_stream = io.StringIO(text)
@@ -0,0 +1,157 @@
+"""Complete one copy of each set of identical chains and rebuild the others.
+
+Homo-oligomers repeat the same chain, with the same missing atoms, many
+times. Only one representative per group goes through MODELLER; the
+completed representative is then superimposed onto every other copy with
+a rigid-body (Kabsch) fit of the atoms both copies share.
+"""
+
+import logging
+
+import numpy as np
+from Bio.PDB import Structure
+from Bio.PDB.Chain import Chain
+
+__all__ = [
+    "chain_signature",
+    "kabsch",
+    "ChainDeduplicator",
+]
+
+
+def _polymer_residues(chain: Chain) -> list:
+    return [residue for residue in chain if residue.id[0] == " "]
+
+
+def chain_signature(chain: Chain) -> tuple:
+    """Sequence and present atom names of the polymer residues of a chain."""
+    return tuple(
+        (residue.resname, tuple(sorted(atom.get_id() for atom in residue)))
+        for residue in _polymer_residues(chain)
+    )
+
+
+def kabsch(mobile: np.ndarray, target: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Return (rot, tran) minimizing the RMSD of `mobile @ rot + tran` to `target`.
+
+    The convention matches `Bio.PDB.Entity.transform`.
+    """
+    mobile_center = mobile.mean(axis=0)
+    target_center = target.mean(axis=0)
+    h = (mobile - mobile_center).T @ (target - target_center)
+    u, _, vt = np.linalg.svd(h)
+    if np.linalg.det(u @ vt) < 0:  # avoid reflections
+        u[:, -1] = -u[:, -1]
+    rot = u @ vt
+    return rot, target_center - mobile_center @ rot
+
+
+class ChainDeduplicator:
+    """Remove identical chains before completion and rebuild them afterwards.
+
+    Chains are identical when their polymer residues have the same names
+    and the same present atoms, i.e. the same sequence and the same
+    missing-atom pattern.
+    """
+
+    def __init__(self) -> None:
+        self.chain_order: list[str] = []
+        self.representatives: dict[str, Chain] = {}
+        self.copies: dict[str, tuple[str, Chain]] = {}  # copy id -> (representative id, chain)
+
+    def strip(self, structure: Structure) -> int:
+        """Detach duplicated chains from the first model; return how many."""
+        model = structure.get_list()[0]
+        self.chain_order = [chain.id for chain in model]
+        seen: dict[tuple, str] = {}
+        for chain in list(model):
+            signature = chain_signature(chain)
+            if not signature:
+                continue
+            if signature in seen:
+                self.copies[chain.id] = (seen[signature], chain)
+                model.detach_child(chain.id)
+            else:
+                seen[signature] = chain.id
+                self.representatives[chain.id] = chain.copy()
+
+        if self.copies:
+            logging.info(
+                f"Completing {len(self.representatives)} unique chains instead of "
+                f"{len(self.representatives) + len(self.copies)} "
+                f"(copies: {', '.join(self.copies)})"
+            )
+        return len(self.copies)
+
+    @staticmethod
+    def _fit(representative: Chain, copy: Chain) -> tuple[np.ndarray, np.ndarray]:
+        mobile, target = [], []
+        for rep_res, copy_res in zip(_polymer_residues(representative), _polymer_residues(copy)):
+            for atom in rep_res:
+                if atom.get_id() in copy_res:
+                    mobile.append(atom.coord)
+                    target.append(copy_res[atom.get_id()].coord)
+        return kabsch(np.array(mobile, dtype=np.float64), np.array(target, dtype=np.float64))
+
+    def _relabel(self, model) -> None:
+        """Give the completed chains their original IDs, matched by position.
+
+        MODELLER relabels the chains (A, B, ...) unless it transfers the
+        residue numbering.
+        """
+        kept = [chain_id for chain_id in self.chain_order if chain_id not in self.copies]
+        chains = list(model)
+        if len(chains) != len(kept):
+            e = f"Cannot rebuild the copies: {len(chains)} completed chains, expected {len(kept)}."
+            logging.error(e)
+            raise ValueError(e)
+        for chain in chains:
+            model.detach_child(chain.id)
+        for chain, chain_id in zip(chains, kept):
+            chain.id = chain_id
+            model.add(chain)
+
+    def restore(self, structure: Structure, keep_copy_numbering: bool = True) -> None:
+        """Rebuild the removed chains from their completed representatives.
+
+        The completed chains are matched to the stripped model by position,
+        not by ID.
+
+        Parameters
+        ----------
+        structure : Structure
+            completed structure, containing the representatives
+        keep_copy_numbering : bool
+            number the rebuilt polymer residues like the original copy;
+            otherwise reuse the numbering of the completed representative
+        """
+        model = structure.get_list()[0]
+        self._relabel(model)
+        for copy_id, (rep_id, copy) in self.copies.items():
+            completed = _polymer_residues(model[rep_id])
+            original = _polymer_residues(copy)
+            if len(completed) != len(original):
+                e = (
+                    f"Cannot rebuild chain {copy_id}: completed chain {rep_id} has "
+                    f"{len(completed)} residues, expected {len(original)}."
+                )
+                logging.error(e)
+                raise ValueError(e)
+
+            # fit on the original (pre-completion) coordinates of both copies
+            rot, tran = self._fit(self.representatives[rep_id], copy)
+            rot, tran = rot.astype(np.float32), tran.astype(np.float32)
+            chain = Chain(copy_id)
+            for completed_res, original_res in zip(completed, original):
+                residue = completed_res.copy()
+                residue.transform(rot, tran)
+                if keep_copy_numbering:
+                    residue.id = original_res.id
+                chain.add(residue)
+            for residue in copy:
+                if residue.id[0] != " ":  # ligands and waters of the copy itself
+                    chain.add(residue.copy())
+            model.add(chain)
+
+        order = {chain_id: i for i, chain_id in enumerate(self.chain_order)}
+        model.child_list.sort(key=lambda chain: order.get(chain.id, len(order)))
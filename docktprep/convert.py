@@ -0,0 +1,184 @@
+"""Fast mmCIF to PDB conversion of receptor streams.
+
+The `_atom_site` loop is read straight into an `AtomTable`, without
+building a Biopython structure, and written with the bulk PDB writer.
+Rows are grouped the way Biopython's structure builder groups them
+(chains and residues in order of first appearance, alternate locations of
+an atom together), so the result matches parsing the file with
+`MMCIFParser` and saving it with `PDBIO`.
+"""
+
+import logging
+
+import numpy as np
+
+from .atom_table import AtomTable
+from .pdb_writer import PDBWriter
+from .scan import WATER_NAMES, atom_site_rows
+
+__all__ = [
+    "read_mmcif_table",
+    "check_pdb_limits",
+    "mmcif_to_pdb",
+]
+
+UNASSIGNED = (".", "?")
+MAX_PDB_ATOMS = 99999
+PDB_RESSEQ_RANGE = (-999, 9999)
+
+
+def _first_occurrence(*codes: np.ndarray) -> np.ndarray:
+    """Row of the first occurrence of each row's key (integer key columns)."""
+    keys = np.stack(codes, axis=1)
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    return first[inverse.ravel()]
+
+
+def _codes(values: np.ndarray) -> np.ndarray:
+    return np.unique(values, return_inverse=True)[1].ravel()
+
+
+def read_mmcif_table(stream) -> tuple[AtomTable, dict[int, int]]:
+    """Read the atoms of an mmCIF stream; return the table and the model serial numbers.
+
+    Model ids are 0-based indices, as in `MMCIFParser`; the returned dict
+    maps them to the `pdbx_PDB_model_num` of the file.
+    """
+    index, rows = {}, []
+    for index, tokens in atom_site_rows(stream):
+        rows.append(tokens)
+    if not rows:
+        e = "No atoms found in the mmCIF _atom_site loop."
+        logging.error(e)
+        raise ValueError(e)
+
+    columns = list(zip(*rows))
+
+    def column(*names: str, default: str | None = None) -> np.ndarray:
+        for name in names:
+            if name in index:
+                return np.array(columns[index[name]], dtype=str)
+        if default is None:
+            e = f"Missing mmCIF column _atom_site.{names[0]}."
+            logging.error(e)
+            raise ValueError(e)
+        return np.full(len(rows), default)
+
+    # atoms without a residue number are skipped, as in MMCIFParser
+    seq = column("auth_seq_id", "label_seq_id")
+    keep = seq != "."
+
+    def kept(*names: str, default: str | None = None) -> np.ndarray:
+        return column(*names, default=default)[keep]
+
+    resname = kept("label_comp_id")
+    hetatm = kept("group_PDB") == "HETATM"
+    hetflag = np.where(
+        hetatm, np.where(np.isin(resname, WATER_NAMES), "W", np.char.add("H_", resname)), " "
+    )
+    altloc = kept("label_alt_id", default=".")
+    icode = kept("pdbx_PDB_ins_code", default="?")
+    altloc = np.where(np.isin(altloc, UNASSIGNED), " ", altloc)
+    icode = np.where(np.isin(icode, UNASSIGNED), " ", icode)
+    chain_id = kept("auth_asym_id")
+    resseq = seq[keep].astype(np.int64)
+    name = kept("label_atom_id")
+
+    # a new model starts whenever the model number changes
+    model_serial = kept("pdbx_PDB_model_num", default="1").astype(np.int64)
+    model_id = np.cumsum(np.r_[True, model_serial[1:] != model_serial[:-1]]) - 1
+    serials = dict(zip(model_id.tolist(), model_serial.tolist()))
+
+    # coordinates are stored as float32 by the structure builder
+    coord = np.stack(
+        [kept(f"Cartn_{axis}").astype(np.float64) for axis in "xyz"], axis=1
+    ).astype(np.float32).astype(np.float64)
+
+    # group rows like the structure builder: chains, residues, then atom names
+    chain_codes = _codes(chain_id)
+    chain_first = _first_occurrence(model_id, chain_codes)
+    residue_first = _first_occurrence(
+        model_id, chain_codes, _codes(hetflag), resseq, _codes(icode)
+    )
+    atom_first = _first_occurrence(residue_first, _codes(name))
+    order = np.lexsort((np.arange(len(name)), atom_first, residue_first, chain_first, model_id))
+    residue_index = np.cumsum(np.r_[True, np.diff(residue_first[order]) != 0]) - 1
+
+    serial = kept("id", default="0")
+    table = AtomTable(
+        coord=coord[order],
+        name=name[order],
+        fullname=name[order],
+        element=np.char.upper(kept("type_symbol", default=""))[order],
+        altloc=altloc[order],
+        serial=np.array([int(s) if s.isdigit() else 0 for s in serial[order]], dtype=np.int64),
+        occupancy=kept("occupancy").astype(np.float64)[order],
+        bfactor=kept("B_iso_or_equiv").astype(np.float64)[order],
+        resname=resname[order],
+        hetflag=hetflag[order],
+        resseq=resseq[order],
+        icode=icode[order],
+        segid=np.full(len(order), " "),
+        chain_id=chain_id[order],
+        model_id=model_id[order],
+        residue_index=residue_index,
+    )
+    return table, serials
+
+
+def check_pdb_limits(table: AtomTable) -> None:
+    """Raise a ValueError listing every value the PDB columns cannot hold."""
+    problems = []
+    atoms_per_model = np.bincount(table.model_id) if len(table) else np.zeros(0, dtype=int)
+    if atoms_per_model.size and atoms_per_model.max() > MAX_PDB_ATOMS:
+        problems.append(f"{atoms_per_model.max()} atoms in a model (max {MAX_PDB_ATOMS})")
+
+    limits = [
+        ("chain ids", table.chain_id, np.char.str_len(table.chain_id) != 1),
+        ("residue names", table.resname, np.char.str_len(table.resname) > 3),
+        ("atom names", table.name, np.char.str_len(table.name) > 4),
+        (
+            f"residue numbers outside {PDB_RESSEQ_RANGE[0]}..{PDB_RESSEQ_RANGE[1]}",
+            table.resseq,
+            (table.resseq < PDB_RESSEQ_RANGE[0]) | (table.resseq > PDB_RESSEQ_RANGE[1]),
+        ),
+    ]
+    for label, values, bad in limits:
+        if bad.any():
+            examples = ", ".join(str(v) for v in list(dict.fromkeys(values[bad].tolist()))[:5])
+            problems.append(f"{label} that do not fit the PDB columns ({examples})")
+
+    if problems:
+        e = (
+            "Cannot write the receptor in PDB format: "
+            + "; ".join(problems)
+            + ". Use an mmCIF (.cif) output instead."
+        )
+        logging.error(e)
+        raise ValueError(e)
+
+
+def mmcif_to_pdb(stream) -> str:
+    """Convert an mmCIF stream to PDB text, without building a structure."""
+    table, serials = read_mmcif_table(stream)
+    check_pdb_limits(table)
+
+    # one block per (model, chain); the TER record names the last residue of the chain
+    layout: dict[int, list] = {}
+    keys = np.stack([table.model_id, _codes(table.chain_id)], axis=1)
+    starts = np.flatnonzero(np.r_[True, np.any(keys[1:] != keys[:-1], axis=1)])
+    ends = np.r_[starts[1:], len(table)]
+    for start, end in zip(starts, ends):
+        last = end - 1
+        ter = (str(table.resname[last]), int(table.resseq[last]), str(table.icode[last]))
+        span = (int(table.residue_index[start]), int(table.residue_index[last]) + 1)
+        layout.setdefault(int(table.model_id[start]), []).append(
+            (str(table.chain_id[start]), ter, span)
+        )
+
+    return PDBWriter.format_table(
+        table,
+        np.arange(len(table)),
+        [(serials[model_id], chains) for model_id, chains in layout.items()],
+        model_flag=len(serials) > 1,
+    )
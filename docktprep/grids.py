@@ -0,0 +1,316 @@
+"""Precompute receptor interaction grids for docking.
+
+Each grid holds, for every point of a box, the interaction energy of a
+probe atom type with the whole receptor: a buffered 14-7 van der Waals
+term (MMFF94 functional form) for each probe element and a Coulomb term
+with a distance-dependent dielectric for a unit positive charge.
+
+Grids are evaluated in chunks of points. For each chunk, only receptor
+atoms inside the chunk's bounding box (expanded by the cutoff) are
+considered, and point-atom pairs come from the cell-list neighbour search,
+so the cost is proportional to the number of pairs within the cutoff.
+Slabs of the box can be evaluated by several processes, which map the
+atom table of the receptor from shared memory and write straight into
+the memory-mapped result.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+
+import numpy as np
+
+from .atom_table import AtomTable
+from .receptor_parser import FileFormatHandler
+from .shared_atoms import SharedArraysHandle, attach_atom_table, share_atom_table
+from .spatial import CellList
+
+__all__ = [
+    "GridBox",
+    "GridCalculator",
+    "load_grids",
+]
+
+GRID_FORMAT_VERSION = 1
+DEFAULT_PROBES = ("C", "N", "O", "S", "H", "elec")
+
+# approximate per-element vdW minimum-energy radius R* (A) and well depth (kcal/mol)
+VDW_PARAMETERS = {
+    "H": (2.40, 0.020),
+    "C": (3.90, 0.070),
+    "N": (3.60, 0.080),
+    "O": (3.40, 0.090),
+    "S": (4.10, 0.250),
+}
+DEFAULT_VDW_PARAMETERS = (3.90, 0.100)
+COULOMB_CONSTANT = 332.0636  # kcal A / (mol e^2)
+
+# formal charges of ionizable groups and common ions (charge spread over equivalent atoms)
+FORMAL_CHARGES = {
+    ("LYS", "NZ"): 1.0,
+    ("ARG", "NH1"): 0.5,
+    ("ARG", "NH2"): 0.5,
+    ("ASP", "OD1"): -0.5,
+    ("ASP", "OD2"): -0.5,
+    ("GLU", "OE1"): -0.5,
+    ("GLU", "OE2"): -0.5,
+    ("ZN", "ZN"): 2.0,
+    ("MG", "MG"): 2.0,
+    ("CA", "CA"): 2.0,
+    ("MN", "MN"): 2.0,
+    ("FE", "FE"): 2.0,
+    ("NA", "NA"): 1.0,
+    ("K", "K"): 1.0,
+    ("CL", "CL"): -1.0,
+}
+
+
+@dataclass
+class GridBox:
+    """Grid box given by its center and size (A) and the point spacing (A)."""
+
+    center: tuple[float, float, float]
+    size: tuple[float, float, float]
+    spacing: float = 0.375
+
+    def __post_init__(self) -> None:
+        self.center = tuple(float(c) for c in self.center)
+        self.size = tuple(float(s) for s in self.size)
+        if self.spacing <= 0 or min(self.size) <= 0:
+            e = f"Invalid grid box: size {self.size}, spacing {self.spacing}."
+            logging.error(e)
+            raise ValueError(e)
+
+    @property
+    def shape(self) -> tuple[int, int, int]:
+        return tuple(int(np.floor(s / self.spacing + 1e-9)) + 1 for s in self.size)
+
+    @property
+    def origin(self) -> np.ndarray:
+        return np.asarray(self.center) - np.asarray(self.size) / 2
+
+    def points(self, x_start: int, x_stop: int) -> np.ndarray:
+        """Coordinates of the points of the slab `x_start <= ix < x_stop` (C order)."""
+        _, ny, nz = self.shape
+        ix, iy, iz = np.meshgrid(
+            np.arange(x_start, x_stop), np.arange(ny), np.arange(nz), indexing="ij"
+        )
+        idx = np.stack([ix.ravel(), iy.ravel(), iz.ravel()], axis=1)
+        return self.origin + idx * self.spacing
+
+
+def _receptor_terms(table: AtomTable) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Per-atom vdW radius R*, well depth and partial charge of the receptor."""
+    radius = np.full(len(table), DEFAULT_VDW_PARAMETERS[0])
+    depth = np.full(len(table), DEFAULT_VDW_PARAMETERS[1])
+    for element, (r, eps) in VDW_PARAMETERS.items():
+        radius[table.element == element] = r
+        depth[table.element == element] = eps
+    charge = np.zeros(len(table))
+    for (resname, name), q in FORMAL_CHARGES.items():
+        charge[(table.resname == resname) & (table.name == name)] = q
+    return radius, depth, charge
+
+
+def _buffered_14_7(r: np.ndarray, r_star: np.ndarray, eps: np.ndarray) -> np.ndarray:
+    rho7 = (r / r_star) ** 7
+    return eps * (1.07 / (r / r_star + 0.07)) ** 7 * (1.12 / (rho7 + 0.12) - 2.0)
+
+
+def _evaluate_slab(
+    grids_file: str,
+    box: GridBox,
+    x_start: int,
+    x_stop: int,
+    receptor: SharedArraysHandle,
+    probes: tuple[str, ...],
+    cutoff: float,
+    max_energy: float,
+    chunk_points: int,
+) -> None:
+    """Evaluate the grids of one slab of the box and write them to `grids_file`."""
+    with attach_atom_table(receptor) as table:
+        radius, depth, charge = _receptor_terms(table)
+        _evaluate_chunks(grids_file, box, x_start, x_stop, table.coord, radius, depth, charge,
+                         probes=probes, cutoff=cutoff, max_energy=max_energy,
+                         chunk_points=chunk_points)
+
+
+def _evaluate_chunks(
+    grids_file: str,
+    box: GridBox,
+    x_start: int,
+    x_stop: int,
+    coord: np.ndarray,
+    radius: np.ndarray,
+    depth: np.ndarray,
+    charge: np.ndarray,
+    probes: tuple[str, ...],
+    cutoff: float,
+    max_energy: float,
+    chunk_points: int,
+) -> None:
+    grids = np.load(grids_file, mmap_mode="r+")
+    _, ny, nz = box.shape
+    rows = max(1, chunk_points // (ny * nz))
+
+    for start in range(x_start, x_stop, rows):
+        stop = min(start + rows, x_stop)
+        points = box.points(start, stop)
+        energy = np.zeros((len(probes), len(points)))
+
+        # receptor atoms that can reach this chunk
+        low, high = points.min(axis=0) - cutoff, points.max(axis=0) + cutoff
+        near = np.flatnonzero(np.all((coord >= low) & (coord <= high), axis=1))
+        if len(near):
+            index = CellList(coord[near], cell_size=cutoff)
+            q, a, d = index.query(points, cutoff)
+            a = near[a]
+            d = np.maximum(d, 0.5)  # avoid the singularity at atom centers
+            for k, probe in enumerate(probes):
+                if probe == "elec":
+                    e = COULOMB_CONSTANT * charge[a] / (4.0 * d * d)
+                else:
+                    r_probe, eps_probe = VDW_PARAMETERS.get(probe, DEFAULT_VDW_PARAMETERS)
+                    r_star = (radius[a] + r_probe) / 2
+                    eps = np.sqrt(depth[a] * eps_probe)
+                    e = _buffered_14_7(d, r_star, eps)
+                energy[k] = np.bincount(q, weights=e, minlength=len(points))
+
+        np.clip(energy, -max_energy, max_energy, out=energy)
+        grids[:, start:stop] = energy.reshape(len(probes), stop - start, ny, nz)
+    grids.flush()
+
+
+def load_grids(file: str) -> tuple[np.ndarray, dict]:
+    """Memory-map precomputed grids; return (grids, metadata)."""
+    with open(os.path.splitext(file)[0] + ".json") as f:
+        metadata = json.load(f)
+    return np.load(file, mmap_mode="r"), metadata
+
+
+class GridCalculator:
+    """Compute and cache receptor interaction grids.
+
+    Results are stored as `<key>.npy` (shape: probes x nx x ny x nz,
+    float32) plus a `<key>.json` metadata file in `cache_dir`. The key
+    hashes the receptor file contents, the box and the parameters, so an
+    unchanged receptor and box reuse the cached grids.
+
+    Parameters
+    ----------
+    box : GridBox
+        grid box
+    cache_dir : str
+        directory of the cached grids
+    probes : tuple[str, ...]
+        probe elements (vdW grids) and/or `elec` (electrostatic grid)
+    cutoff : float
+        interaction cutoff (A)
+    workers : int
+        number of processes evaluating slabs of the box
+    max_energy : float
+        grid values are clipped to +/- this value (kcal/mol)
+    chunk_points : int
+        number of grid points evaluated at once
+    """
+
+    def __init__(
+        self,
+        box: GridBox,
+        cache_dir: str,
+        probes: tuple[str, ...] = DEFAULT_PROBES,
+        cutoff: float = 8.0,
+        workers: int = 1,
+        max_energy: float = 100.0,
+        chunk_points: int = 32768,
+    ) -> None:
+        self.box = box
+        self.cache_dir = cache_dir
+        self.probes = tuple(probes)
+        self.cutoff = cutoff
+        self.workers = max(1, workers)
+        self.max_energy = max_energy
+        self.chunk_points = chunk_points
+
+    def cache_key(self, receptor_file: str) -> str:
+        sha = hashlib.sha256()
+        with open(receptor_file, "rb") as f:
+            while chunk := f.read(1 << 20):
+                sha.update(chunk)
+        params = {
+            "version": GRID_FORMAT_VERSION,
+            "box": asdict(self.box),
+            "probes": self.probes,
+            "cutoff": self.cutoff,
+            "max_energy": self.max_energy,
+        }
+        sha.update(json.dumps(params, sort_keys=True).encode())
+        return sha.hexdigest()
+
+    def _slabs(self) -> list[tuple[int, int]]:
+        nx = self.box.shape[0]
+        n_slabs = min(nx, self.workers * 4)
+        bounds = np.linspace(0, nx, n_slabs + 1).astype(int)
+        return [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+    def compute(self, receptor_file: str) -> str:
+        """Return the path of the grids of `receptor_file`, computing them if needed."""
+        key = self.cache_key(receptor_file)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        grids_file = os.path.join(self.cache_dir, f"{key}.npy")
+        if os.path.exists(grids_file):
+            logging.info(f"Reusing cached receptor grids {grids_file}")
+            return grids_file
+
+        start = time.perf_counter()
+        parser = FileFormatHandler.get_parser(FileFormatHandler.structure_ext(receptor_file))
+        table = AtomTable.from_structure(parser.get_structure("receptor", receptor_file))
+
+        # write to a temporary name: concurrent runs never see partial grids
+        tmp_file = os.path.join(
+            self.cache_dir, f".{key}.{os.getpid()}.{threading.get_ident()}.npy"
+        )
+        np.lib.format.open_memmap(
+            tmp_file, mode="w+", dtype=np.float32, shape=(len(self.probes), *self.box.shape)
+        ).flush()
+        # workers map the atom table instead of unpickling copies of the receptor
+        with share_atom_table(table) as receptor:
+            tasks = [
+                (tmp_file, self.box, a, b, receptor.handle,
+                 self.probes, self.cutoff, self.max_energy, self.chunk_points)
+                for a, b in self._slabs()
+            ]
+            if self.workers > 1:
+                with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                    for future in [pool.submit(_evaluate_slab, *task) for task in tasks]:
+                        future.result()
+            else:
+                for task in tasks:
+                    _evaluate_slab(*task)
+
+        metadata = {
+            "receptor": os.path.abspath(receptor_file),
+            "key": key,
+            "version": GRID_FORMAT_VERSION,
+            "probes": list(self.probes),
+            "center": list(self.box.center),
+            "size": list(self.box.size),
+            "spacing": self.box.spacing,
+            "shape": list(self.box.shape),
+            "origin": self.box.origin.tolist(),
+            "cutoff": self.cutoff,
+        }
+        with open(os.path.join(self.cache_dir, f"{key}.json"), "w") as f:
+            json.dump(metadata, f, indent=2)
+        os.replace(tmp_file, grids_file)
+        logging.info(
+            f"Computed {len(self.probes)} receptor grids of {self.box.shape} points "
+            f"in {time.perf_counter() - start:.2f} s: {grids_file}"
+        )
+        return grids_file
@@ -0,0 +1,251 @@
+"""MODELLER-free hydrogen placement from residue templates.
+
+Hydrogens are built from the positions of their bonded heavy atoms. Each
+template rule is evaluated for all residues of a type at once, so the
+cost is a handful of NumPy operations per rule rather than per atom.
+"""
+
+import io
+import logging
+
+import numpy as np
+from Bio.PDB.Atom import Atom
+
+from . import residue_templates
+from .atom_table import AtomTable
+from .receptor_parser import Receptor
+from .spatial import CellList
+
+__all__ = [
+    "TemplateHydrogenOperation",
+    "find_missing_heavy_atoms",
+]
+
+XH_BOND_LENGTHS = {"C": 1.09, "N": 1.01, "O": 0.96, "S": 1.34}
+TETRAHEDRAL = np.deg2rad(109.47)
+# half of the H-X-H angle of a methylene group, measured from the bisector
+_SP3_PAIR_HALF_ANGLE = np.deg2rad(54.74)
+DISULFIDE_DISTANCE = 2.5
+PEPTIDE_BOND_MAX = 2.0
+
+
+def _unit(v: np.ndarray) -> np.ndarray:
+    return v / np.linalg.norm(v, axis=-1, keepdims=True)
+
+
+def _place_sp2(x, a, b, length):
+    """One H in the plane of a trigonal center, opposite the bisector of its bonds."""
+    return [x + length * _unit(-(_unit(a - x) + _unit(b - x)))]
+
+
+def _place_sp3_1(x, a, b, c, length):
+    """One H on a tetrahedral center with three heavy neighbours."""
+    return [x + length * _unit(-(_unit(a - x) + _unit(b - x) + _unit(c - x)))]
+
+
+def _place_sp3_2(x, a, b, length):
+    """Two H on a tetrahedral center with two heavy neighbours."""
+    ua, ub = _unit(a - x), _unit(b - x)
+    bisector = _unit(-(ua + ub))
+    normal = _unit(np.cross(ua, ub))
+    cos, sin = np.cos(_SP3_PAIR_HALF_ANGLE), np.sin(_SP3_PAIR_HALF_ANGLE)
+    return [
+        x + length * (cos * bisector + sin * normal),
+        x + length * (cos * bisector - sin * normal),
+    ]
+
+
+def _place_dihedral(x, a, ref, length, angle, dihedrals):
+    """H bonded to `x` with angle H-x-a and dihedral H-x-a-ref (natural extension)."""
+    bc = _unit(x - a)
+    n = _unit(np.cross(a - ref, bc))
+    m = np.cross(n, bc)
+    positions = []
+    for dihedral in np.deg2rad(dihedrals):
+        d = (
+            -length * np.cos(angle) * bc
+            + length * np.sin(angle) * np.cos(dihedral) * m
+            + length * np.sin(angle) * np.sin(dihedral) * n
+        )
+        positions.append(x + d)
+    return positions
+
+
+def _place(kind: str, element: str, coords: list[np.ndarray]) -> list[np.ndarray]:
+    length = XH_BOND_LENGTHS.get(element, 1.0)
+    if kind == "sp2":
+        return _place_sp2(*coords, length)
+    if kind == "sp3_1":
+        return _place_sp3_1(*coords, length)
+    if kind == "sp3_2":
+        return _place_sp3_2(*coords, length)
+    if kind == "staggered":
+        return _place_dihedral(*coords, length, TETRAHEDRAL, (180.0, 60.0, -60.0))
+    if kind == "hydroxyl":
+        angle = np.deg2rad(96.0) if element == "S" else TETRAHEDRAL
+        return _place_dihedral(*coords, length, angle, (180.0,))
+    if kind == "planar_nh2":
+        return _place_dihedral(*coords, length, np.deg2rad(120.0), (180.0, 0.0))
+    if kind == "dihedral_120":
+        # amide H without a bonded previous residue, assuming a helical phi
+        return _place_dihedral(*coords, length, np.deg2rad(119.0), (120.0,))
+    raise ValueError(f"Unknown hydrogen placement rule: {kind}")
+
+
+def find_missing_heavy_atoms(table: AtomTable) -> dict[int, list[str]]:
+    """Return the missing template heavy atoms of each polymer residue.
+
+    Polymer residues without a template (non-standard residues) are reported
+    with the single entry `"?"`, since their completeness cannot be checked.
+    """
+    starts = table.residue_starts()
+    resname = table.resname[starts]
+    polymer = ~table.is_hetero[starts]
+    missing: dict[int, list[str]] = {}
+
+    for res_idx in np.flatnonzero(polymer & ~np.isin(resname, list(residue_templates.HEAVY_ATOMS))):
+        missing[int(res_idx)] = ["?"]
+
+    lookup: dict[str, np.ndarray] = {}
+    for name3, atoms in residue_templates.HEAVY_ATOMS.items():
+        residues = np.flatnonzero(polymer & (resname == name3))
+        if len(residues) == 0:
+            continue
+        for atom_name in atoms:
+            if atom_name not in lookup:
+                lookup[atom_name] = table.atom_index_by_name(atom_name)
+            for res_idx in residues[lookup[atom_name][residues] < 0]:
+                missing.setdefault(int(res_idx), []).append(atom_name)
+    return missing
+
+
+class TemplateHydrogenOperation:
+    """Add hydrogens to standard residues whose heavy atoms are complete.
+
+    Residues that already carry hydrogens and hetero residues (ligands,
+    waters) are left unchanged. Residue numbering is preserved.
+    """
+
+    def __init__(self) -> None:
+        self._lookup: dict[str, np.ndarray] = {}
+
+    def _index(self, table: AtomTable, name: str) -> np.ndarray:
+        if name not in self._lookup:
+            self._lookup[name] = table.atom_index_by_name(name)
+        return self._lookup[name]
+
+    def place_hydrogens(self, table: AtomTable) -> list[tuple[int, str, np.ndarray]]:
+        """Return (residue index, atom name, coordinates) of the hydrogens to add."""
+        self._lookup = {}
+        starts = table.residue_starts()
+        resname = table.resname[starts]
+        chain = table.chain_id[starts]
+        polymer = ~table.is_hetero[starts]
+
+        has_h = np.zeros(table.n_residues, dtype=bool)
+        has_h[table.residue_index[table.is_hydrogen]] = True
+        targets = polymer & ~has_h & np.isin(resname, list(residue_templates.HEAVY_ATOMS))
+
+        # previous polymer residue of the same chain, and whether it is bonded
+        poly_idx = np.flatnonzero(polymer)
+        first_in_chain = np.zeros(table.n_residues, dtype=bool)
+        first_in_chain[poly_idx] = np.r_[True, chain[poly_idx[1:]] != chain[poly_idx[:-1]]]
+        previous_c = np.full(table.n_residues, -1, dtype=np.int64)
+        previous_c[poly_idx[1:]] = self._index(table, "C")[poly_idx[:-1]]
+        previous_c[first_in_chain] = -1
+        n_atoms = self._index(table, "N")
+        linked = (previous_c >= 0) & (n_atoms >= 0)
+        distance = np.linalg.norm(
+            table.coord[previous_c] - table.coord[n_atoms], axis=1
+        )
+        bonded_previous = linked & (distance < PEPTIDE_BOND_MAX)
+
+        # free cysteine thiols only
+        sg = np.flatnonzero((table.name == "SG") & (table.resname == "CYS"))
+        disulfide = np.zeros(table.n_residues, dtype=bool)
+        if len(sg) > 1:
+            i, j, _ = CellList(table.coord[sg], DISULFIDE_DISTANCE).pairs()
+            disulfide[table.residue_index[sg[i]]] = True
+            disulfide[table.residue_index[sg[j]]] = True
+
+        backbone = residue_templates.BACKBONE_HYDROGENS
+        is_pro = resname == "PRO"
+        rules = [
+            (backbone["amide"], targets & ~is_pro & bonded_previous),
+            (backbone["amide_after_gap"], targets & ~is_pro & ~first_in_chain & ~bonded_previous),
+            (backbone["n_terminus"], targets & ~is_pro & first_in_chain),
+            (backbone["n_terminus_pro"], targets & is_pro & first_in_chain),
+            (residue_templates.ALPHA_HYDROGEN, targets & (resname != "GLY")),
+        ]
+        for name3, side_chain in residue_templates.SIDE_CHAIN_HYDROGENS.items():
+            of_type = targets & (resname == name3)
+            for rule in side_chain:
+                mask = of_type & ~disulfide if (name3, rule[2]) == ("CYS", "SG") else of_type
+                rules.append((rule, mask))
+
+        new_atoms = []
+        for (names, kind, center, refs), mask in rules:
+            residues = np.flatnonzero(mask)
+            if len(residues) == 0:
+                continue
+            atoms = [self._index(table, center)[residues]]
+            for ref in refs:
+                if ref.startswith("-"):
+                    atoms.append(previous_c[residues])
+                else:
+                    atoms.append(self._index(table, ref)[residues])
+            complete = np.all(np.stack(atoms) >= 0, axis=0)
+            residues = residues[complete]
+            coords = [table.coord[idx[complete]] for idx in atoms]
+            element = table.element[atoms[0][complete][0]] if len(residues) else "C"
+            for name, positions in zip(names, _place(kind, element, coords)):
+                new_atoms += [(r, name, xyz) for r, xyz in zip(residues.tolist(), positions)]
+        return new_atoms
+
+    def run(self, receptor: Receptor) -> bool:
+        """Add hydrogens to the receptor.
+
+        Returns False, leaving the receptor unchanged, when any polymer residue
+        is missing heavy atoms or has no template; these need MODELLER.
+        """
+        structure = receptor.parse_current_file_stream()
+        table = AtomTable.from_structure(structure)
+
+        missing = find_missing_heavy_atoms(table)
+        if missing:
+            logging.info(
+                f"{len(missing)} residues are missing heavy atoms or have no "
+                f"hydrogen template; template hydrogen placement is not possible"
+            )
+            return False
+
+        new_atoms = self.place_hydrogens(table)
+        new_atoms.sort(key=lambda atom: atom[0])  # stable: keeps template order
+        for res_idx, name, xyz in new_atoms:
+            residue = table.residues[res_idx]
+            parent = residue.child_list[0]
+            residue.add(
+                Atom(
+                    name,
+                    np.asarray(xyz, dtype=np.float32),
+                    parent.bfactor,
+                    1.0,
+                    " ",
+                    name,
+                    None,
+                    element="H",
+                )
+            )
+
+        n_hetero = int(np.count_nonzero(table.is_hetero[table.residue_starts()]))
+        logging.info(
+            f"Added {len(new_atoms)} hydrogens from residue templates"
+            + (f" ({n_hetero} hetero residues left unchanged)" if n_hetero else "")
+        )
+
+        receptor.close_file_stream()
+        receptor.current_file_stream = io.StringIO()
+        file_io = receptor.get_biopython_file_io(receptor.file_ext.strip("."))
+        file_io.set_structure(structure)
+        file_io.save(receptor.current_file_stream)
+        return True
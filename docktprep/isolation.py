@@ -0,0 +1,133 @@
+"""Run jobs (MODELLER) in isolated child processes, with limits scaled by receptor size.
+
+MODELLER occasionally runs for a very long time or crashes in native
+code. Run in a child process, such a job can be killed at a wall-clock
+limit, is bounded by an address-space limit (`RLIMIT_AS`), and a crash
+only takes the child down. Both limits grow linearly with the number of
+atoms above `REFERENCE_ATOMS`.
+
+Children are forked from a fork server, not from the calling process:
+forking a multi-threaded process (thread executor, lease renewal) can
+deadlock the child.
+"""
+
+import logging
+import multiprocessing
+import resource
+from dataclasses import dataclass
+from typing import Any, Callable
+
+__all__ = [
+    "IsolatedJobError",
+    "IsolatedJobTimeout",
+    "IsolatedJobCrash",
+    "IsolationLimits",
+    "count_atoms",
+    "run_isolated",
+]
+
+REFERENCE_ATOMS = 5000  # the limits apply as given up to this many atoms
+PRELOAD_MODULES = ["docktprep.receptor_parser", "docktprep.modeller_operations"]
+
+
+class IsolatedJobError(RuntimeError):
+    """The isolated job raised an exception."""
+
+    kind = "error"
+
+
+class IsolatedJobTimeout(IsolatedJobError):
+    """The isolated job was killed at its wall-clock limit."""
+
+    kind = "timeout"
+
+
+class IsolatedJobCrash(IsolatedJobError):
+    """The child process died without a result (e.g. a segfault in native code)."""
+
+    kind = "crash"
+
+
+@dataclass
+class IsolationLimits:
+    timeout: float | None = None  # s; None: no limit
+    memory_mb: float | None = None  # address space; None: no limit
+
+    @classmethod
+    def scaled(
+        cls, n_atoms: int, timeout: float | None, memory_mb: float | None
+    ) -> "IsolationLimits":
+        """Limits for a receptor of `n_atoms` atoms, given those of `REFERENCE_ATOMS` atoms."""
+        scale = max(1.0, n_atoms / REFERENCE_ATOMS)
+        return cls(
+            timeout=timeout * scale if timeout else None,
+            memory_mb=memory_mb * scale if memory_mb else None,
+        )
+
+
+def count_atoms(text: str) -> int:
+    """Number of atom records of a PDB or mmCIF text."""
+    return sum(line.startswith(("ATOM", "HETATM")) for line in text.splitlines())
+
+
+def _context() -> multiprocessing.context.BaseContext:
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    context = multiprocessing.get_context("forkserver")
+    # modules that fail to import (e.g. MODELLER not installed) are skipped
+    context.set_forkserver_preload(PRELOAD_MODULES)
+    return context
+
+
+def _run_child(conn, memory_mb: float | None, func: Callable, args: tuple) -> None:
+    if memory_mb:
+        limit = int(memory_mb * 2**20)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    try:
+        result = (True, func(*args))
+    except BaseException as e:
+        result = (False, f"{type(e).__name__}: {e}")
+    try:
+        conn.send(result)
+    finally:
+        conn.close()
+
+
+def run_isolated(func: Callable, args: tuple, limits: IsolationLimits, name: str = "job") -> Any:
+    """Return `func(*args)`, run in a child process within `limits`.
+
+    `func`, its arguments and its result must be picklable. Raises
+    `IsolatedJobTimeout` if the job exceeds its time limit (the child is
+    killed), `IsolatedJobCrash` if the child dies without a result, and
+    `IsolatedJobError` if `func` raises (e.g. MemoryError at the memory limit).
+    """
+    context = _context()
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(
+        target=_run_child, args=(sender, limits.memory_mb, func, args), daemon=True
+    )
+    process.start()
+    sender.close()
+    try:
+        if not receiver.poll(limits.timeout):
+            e = f"{name} killed after {limits.timeout:.0f} s"
+            logging.error(e)
+            raise IsolatedJobTimeout(e)
+        try:
+            ok, result = receiver.recv()
+        except EOFError:
+            process.join()
+            e = f"{name} died with exit code {process.exitcode}"
+            logging.error(e)
+            raise IsolatedJobCrash(e) from None
+    finally:
+        if process.is_alive():
+            process.kill()
+        process.join()
+        receiver.close()
+
+    if not ok:
+        e = f"{name} failed: {result}"
+        logging.error(e)
+        raise IsolatedJobError(e)
+    return result
@@ -0,0 +1,148 @@
+"""Append-only progress journal of batch runs."""
+
+import hashlib
+import json
+import logging
+import os
+import socket
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+
+__all__ = [
+    "JournalEntry",
+    "BatchJournal",
+    "file_sha256",
+    "summarize",
+    "write_metrics",
+]
+
+DONE = "done"
+FAILED = "failed"
+METRICS_NAME = "docktprep-metrics.json"
+
+
+def file_sha256(file: str, chunk_size: int = 1 << 20) -> str:
+    sha = hashlib.sha256()
+    with open(file, "rb") as f:
+        while chunk := f.read(chunk_size):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+@dataclass
+class JournalEntry:
+    input: str
+    status: str
+    attempt: int = 1
+    output: str = ""
+    sha256: str = ""
+    started: float = 0.0
+    elapsed: float = 0.0
+    timings: dict = field(default_factory=dict)
+    events: list = field(default_factory=list)  # e.g. MODELLER timeouts and fallbacks
+    error: str = ""
+
+
+class BatchJournal:
+    """Append-only journal with one line per finished attempt.
+
+    Each line starts with the status, attempt number and JSON-quoted input
+    before the full JSON record, tab separated. Resuming only needs those
+    three fields, so a scan never decodes the full records and stays fast
+    with hundreds of thousands of entries. The latest line of an input wins.
+    A truncated last line (interrupted write) is ignored.
+    """
+
+    def __init__(self, file: str) -> None:
+        self.file = file
+        self._line_started = False  # the file ends with a complete line
+
+    @staticmethod
+    def format_line(entry: JournalEntry) -> str:
+        record = json.dumps(asdict(entry), separators=(",", ":"))
+        return f"{entry.status}\t{entry.attempt}\t{json.dumps(entry.input)}\t{record}\n"
+
+    def _ends_with_newline(self) -> bool:
+        try:
+            with open(self.file, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                return f.read(1) == b"\n"
+        except FileNotFoundError:
+            return True
+        except OSError:  # empty file
+            return True
+
+    def record(self, entry: JournalEntry) -> None:
+        """Append an entry and flush it to the operating system."""
+        line = self.format_line(entry)
+        if not self._line_started:
+            # after an interrupted write: start a new line
+            if not self._ends_with_newline():
+                line = "\n" + line
+            self._line_started = True
+        with open(self.file, "a") as f:
+            f.write(line)
+            f.flush()
+
+    def scan(self) -> dict[str, tuple[str, int]]:
+        """Return the latest (status, attempt) of every input in the journal."""
+        state: dict[str, tuple[str, int]] = {}
+        if not os.path.exists(self.file):
+            return state
+
+        with open(self.file, "r") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    logging.warning(f"Ignoring truncated last line of journal {self.file}")
+                    break
+                try:
+                    status, attempt, name, record = line.split("\t", 3)
+                    if not record.endswith("}\n"):  # truncated, then followed by a new line
+                        raise ValueError(record)
+                    state[json.loads(name)] = (status, int(attempt))
+                except ValueError:
+                    logging.warning(f"Ignoring malformed journal line: {line[:80]!r}")
+        return state
+
+    def entries(self) -> list[JournalEntry]:
+        """Decode all records (slower than `scan`; for reports)."""
+        entries = []
+        if not os.path.exists(self.file):
+            return entries
+        with open(self.file, "r") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    continue
+                try:
+                    entries.append(JournalEntry(**json.loads(line.split("\t", 3)[3])))
+                except (ValueError, IndexError, TypeError):
+                    continue
+        return entries
+
+
+def summarize(entries: list[JournalEntry]) -> dict:
+    """Metrics of a run from its journal entries (the latest entry of an input wins)."""
+    latest = {entry.input: entry for entry in entries}
+    stages: dict[str, float] = {}
+    for entry in entries:
+        for stage, seconds in entry.timings.items():
+            stages[stage] = round(stages.get(stage, 0.0) + seconds, 6)
+    return {
+        "inputs": len(latest),
+        DONE: sum(entry.status == DONE for entry in latest.values()),
+        FAILED: sum(entry.status == FAILED for entry in latest.values()),
+        "attempts": len(entries),
+        "elapsed": round(sum(entry.elapsed for entry in entries), 6),
+        "stages": stages,
+        "events": dict(Counter(event for entry in entries for event in entry.events)),
+    }
+
+
+def write_metrics(journal: BatchJournal, metrics: dict) -> str:
+    """Write `metrics` atomically to `docktprep-metrics.json` next to the journal."""
+    file = os.path.join(os.path.dirname(os.path.abspath(journal.file)), METRICS_NAME)
+    tmp = f"{file}.{socket.gethostname()}-{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(metrics, f, indent=2)
+    os.replace(tmp, file)
+    return file
@@ -0,0 +1,181 @@
+"""Extract co-crystallized ligands and cofactors while the receptor is sanitized.
+
+The hetero residues of the selected model are written to one file per
+ligand instance: hetero residues with atoms closer than a covalent bond
+length (e.g. the sugars of a glycan) form one instance, while ions
+(single-atom residues) are always instances of their own. Modified amino
+acids (see `nonstd_residues`) belong to the polymer and are not ligands.
+Optionally, the waters within a cutoff of a ligand are written with it.
+
+The extraction reuses the structure parsed by `Receptor.sanitize_file`,
+so a single parse yields both the receptor and the ligand inputs.
+"""
+
+import logging
+import os
+import re
+
+import numpy as np
+from Bio.PDB import Structure
+from Bio.PDB.Chain import Chain
+from Bio.PDB.mmcifio import MMCIFIO
+from Bio.PDB.Model import Model
+from Bio.PDB.PDBIO import Select
+
+from . import nonstd_residues
+from .atom_table import AtomTable
+from .pdb_writer import PDBWriter
+from .spatial import CellList
+
+__all__ = [
+    "LigandExtractor",
+]
+
+LIGAND_BOND_CUTOFF = 2.0  # A; longer than covalent bonds, shorter than most contacts
+
+
+class _AltlocSelect(Select):
+    def __init__(self, reject_ids: set) -> None:
+        self.reject_ids = reject_ids
+
+    def accept_atom(self, atom):
+        return atom.get_serial_number() not in self.reject_ids
+
+
+def _connected_components(n: int, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    """Label of the connected component of each of `n` nodes, given edges (i, j)."""
+    parent = list(range(n))
+
+    def find(x: int) -> int:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in zip(i.tolist(), j.tolist()):
+        parent[find(a)] = find(b)
+    return np.array([find(x) for x in range(n)], dtype=np.int64)
+
+
+class LigandExtractor:
+    """Write the ligands of a parsed receptor to separate files.
+
+    Files are named `<name>_<resnames>_<chain><resseq><icode>.<fmt>` after
+    the residues of the instance and its first residue.
+
+    Parameters
+    ----------
+    output_dir : str
+        directory of the ligand files
+    name : str
+        prefix of the ligand file names (e.g. the receptor name)
+    water_cutoff : float | None
+        also write the waters with any atom within this distance (A) of
+        the ligand; None writes no waters
+    bond_cutoff : float
+        hetero residues with atoms closer than this (A) form one instance
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        name: str,
+        water_cutoff: float | None = None,
+        bond_cutoff: float = LIGAND_BOND_CUTOFF,
+    ) -> None:
+        if water_cutoff is not None and water_cutoff <= 0:
+            e = f"The ligand water cutoff must be positive, got {water_cutoff}."
+            logging.error(e)
+            raise ValueError(e)
+        self.output_dir = output_dir
+        self.name = name
+        self.water_cutoff = water_cutoff
+        self.bond_cutoff = bond_cutoff
+
+    def ligand_instances(self, table: AtomTable, atoms: np.ndarray) -> list[np.ndarray]:
+        """Residue indices of each ligand instance, among the `atoms` rows of `table`."""
+        ligand = (
+            atoms
+            & np.char.startswith(table.hetflag, "H_")
+            & ~np.isin(table.resname, list(nonstd_residues.nstds_to_std))
+        )
+        rows = np.flatnonzero(ligand)
+        if not len(rows):
+            return []
+
+        residues, local = np.unique(table.residue_index[rows], return_inverse=True)
+        # ions coordinate other residues at bond-like distances: never join them
+        single_atom = np.bincount(local) == 1
+        bondable = ~single_atom[local]
+        i, j, _ = CellList(table.coord[rows], cell_size=self.bond_cutoff).pairs()
+        bonded = bondable[i] & bondable[j] & (local[i] != local[j])
+        labels = _connected_components(len(residues), local[i[bonded]], local[j[bonded]])
+        return [residues[labels == label] for label in dict.fromkeys(labels.tolist())]
+
+    def nearby_waters(
+        self, table: AtomTable, atoms: np.ndarray, instances: list[np.ndarray]
+    ) -> list[np.ndarray]:
+        """Residue indices of the waters within `water_cutoff` of each instance."""
+        if self.water_cutoff is None or not instances:
+            return [np.empty(0, dtype=np.int64) for _ in instances]
+        instance_of = np.full(table.n_residues, -1, dtype=np.int64)
+        for k, residues in enumerate(instances):
+            instance_of[residues] = k
+        ligand_rows = np.flatnonzero(atoms & (instance_of[table.residue_index] >= 0))
+        water_rows = np.flatnonzero(atoms & table.is_water)
+
+        waters = CellList(table.coord[water_rows], cell_size=self.water_cutoff)
+        q, found, _ = waters.query(table.coord[ligand_rows], self.water_cutoff)
+        pairs = np.unique(
+            np.stack(
+                [instance_of[table.residue_index[ligand_rows[q]]],
+                 table.residue_index[water_rows[found]]],
+                axis=1,
+            ),
+            axis=0,
+        )
+        return [pairs[pairs[:, 0] == k, 1] for k in range(len(instances))]
+
+    def file_name(self, table: AtomTable, residues: np.ndarray, ext: str) -> str:
+        first = table.residues[residues[0]]
+        resnames = "-".join(table.residues[r].resname for r in residues)
+        chain_id, resseq, icode = first.get_parent().id, first.id[1], first.id[2].strip()
+        label = f"{self.name}_{resnames}_{chain_id}{resseq}{icode}"
+        return os.path.join(self.output_dir, re.sub(r"[^\w.+-]", "_", label) + ext)
+
+    def extract(self, structure: Structure, sanitizer, output_fmt: str = "pdb") -> list[str]:
+        """Write the ligands of the model selected by `sanitizer`; return the files.
+
+        Alternate locations are resolved as by the sanitizer.
+        """
+        table = AtomTable.from_structure(structure, model_id=sanitizer.model_id)
+        reject_ids = sanitizer.reject_ids if sanitizer.remove_disorder else set()
+        atoms = ~np.isin(table.serial, list(reject_ids))
+        instances = self.ligand_instances(table, atoms)
+        waters = self.nearby_waters(table, atoms, instances)
+
+        ext = f".{output_fmt.strip('.').lower()}"
+        files = []
+        if instances:
+            os.makedirs(self.output_dir, exist_ok=True)
+        for residues, nearby in zip(instances, waters):
+            ligand = Structure.Structure(self.name)
+            model = Model(0)
+            ligand.add(model)
+            for r in np.sort(np.concatenate([residues, nearby])):
+                residue = table.residues[r]
+                chain_id = residue.get_parent().id
+                if chain_id not in model:
+                    model.add(Chain(chain_id))
+                model[chain_id].add(residue.copy())
+
+            file = self.file_name(table, residues, ext)
+            file_io = MMCIFIO() if ext == ".cif" else PDBWriter()
+            file_io.set_structure(ligand)
+            file_io.save(file, select=_AltlocSelect(reject_ids))
+            files.append(file)
+            logging.info(
+                f"Extracted ligand {os.path.basename(file)} "
+                f"({len(residues)} residues, {len(nearby)} waters)"
+            )
+        return files
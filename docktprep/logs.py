@@ -1,15 +1,42 @@
 """Configure application logging."""
 
 import logging
+import os
+import sys
+import threading
+
+LOG_FORMAT = "%(asctime)s: %(levelname)s: %(message)s"
+
+_configure_lock = threading.Lock()
 
 
 def configure_logging(
     output_file: str | None = None, level: int = logging.INFO
 ) -> None:
-    """Configure application logging."""
-    logging.basicConfig(
-        filename=output_file if output_file else None,
-        filemode="w",
-        level=level,
-        format="%(asctime)s: %(levelname)s: %(message)s",
-    )
+    """Configure application logging.
+
+    Safe to call repeatedly and from several threads: the handler of a
+    destination is installed once, so a log file is truncated only by the
+    first call that opens it. As with `logging.basicConfig`, logging that
+    was configured by the application itself is left untouched.
+    """
+    target = os.path.abspath(output_file) if output_file else None
+    root = logging.getLogger()
+    with _configure_lock:
+        ours = [h for h in root.handlers if hasattr(h, "docktprep_target")]
+        if root.handlers and not ours:
+            return
+        root.setLevel(level)
+        if any(h.docktprep_target == target for h in ours):
+            return
+
+        for handler in ours:  # a new destination replaces the previous one
+            root.removeHandler(handler)
+            handler.close()
+        if target:
+            handler = logging.FileHandler(target, mode="w")
+        else:
+            handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        handler.docktprep_target = target
+        root.addHandler(handler)
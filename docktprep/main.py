@@ -1,13 +1,68 @@
 import argparse
+import importlib
+import io
+import logging
+import os
+import sys
+import time
 
-from docktprep.receptor_parser import PDBSanitizerFactory, Receptor
+from docktprep.archive import ArchiveMember, open_structure
+from docktprep.binding_site import (
+    BindingSite,
+    BindingSiteCropOperation,
+    BoxBindingSite,
+    LigandBindingSite,
+    RepairBindingSite,
+    ResidueBindingSite,
+)
+from docktprep.grids import GridBox, GridCalculator
+from docktprep.hydrogens import TemplateHydrogenOperation
+from docktprep.isolation import IsolatedJobError, IsolationLimits, count_atoms, run_isolated
+from docktprep.ligands import LigandExtractor
+from docktprep.receptor_parser import FileFormatHandler, PDBSanitizerFactory, Receptor
+from docktprep.scan import StructureScan, scan_structure
+from docktprep.store import ReceptorStore
+from docktprep.validation import ReceptorValidationError, ReceptorValidator
 
 from .logs import configure_logging
 
 
-def main():
-    args = configure_argparser()
+SUBCOMMANDS = ("batch", "scan")  # modules of docktprep, each with its own main()
+
+
+def main(argv: list[str] | None = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in SUBCOMMANDS:
+        subcommand = importlib.import_module(f"docktprep.{argv[0]}")
+        return subcommand.main(argv[1:])
+
+    args = configure_argparser(argv)
     configure_logging(args.log_file)
+    prepare_receptor(args.receptor, args.output, args)
+
+
+def prepare_receptor(
+    receptor_file: str | ArchiveMember,
+    output_file: str,
+    args: argparse.Namespace,
+    store: ReceptorStore | None = None,
+    events: list[str] | None = None,
+) -> dict[str, float]:
+    """Run the preparation pipeline on one receptor; return the time spent per stage.
+
+    `receptor_file` may also be a (gzip'd) archive member, read without extraction.
+    With a `store`, the receptor is appended to it under the name of
+    `output_file` instead of being written to `output_file`. Notable events
+    (MODELLER timeouts, crashes and fallbacks) are appended to `events`.
+    """
+    timings = {}
+    start = time.perf_counter()
+
+    def lap(stage: str) -> None:
+        nonlocal start
+        now = time.perf_counter()
+        timings[stage] = round(now - start, 6)
+        start = now
 
     # receptor parsing
     sanitizer = PDBSanitizerFactory(
@@ -16,49 +71,233 @@ def main():
         remove_water=args.remove_water,
     )
 
+    # the output format follows the output file extension
+    output_ext = FileFormatHandler.structure_ext(output_file)
     receptor = Receptor(
-        args.receptor,
+        str(receptor_file),
+        output_fmt=output_ext if output_ext in FileFormatHandler.ACCEPTED_FORMATS else "",
         sanitizer=sanitizer,
+        stream=open_structure(receptor_file),
+        ligand_extractor=ligand_extractor(output_file, args),
     )
+
     receptor.sanitize_file()
+    lap("sanitize")
+
+    # binding site cropping
+    receptor = crop_binding_site(receptor, args)
+    lap("crop")
+
+    # cheap scan of the stream passed on to MODELLER, used to skip needless runs
+    scan = scan_structure(receptor_file, stream=receptor.current_file_stream)
+    lap("scan")
 
     # modeller operations
-    receptor = modeller_operations(receptor, args)
+    receptor = modeller_operations(receptor, args, scan, events)
+    lap("modeller")
+
+    # geometry and clash validation
+    validate_receptor(receptor, args)
+    lap("validate")
 
     # write receptor to output file
-    receptor.write_and_close_file_stream(args.output)
+    if store is not None:
+        receptor.write_to_store(store, os.path.basename(output_file))
+    else:
+        receptor.write_and_close_file_stream(output_file)
+    lap("write")
 
+    # receptor interaction grids
+    compute_grids(output_file, args)
+    lap("grids")
+    return timings
+
+
+def ligand_extractor(output_file: str, args: argparse.Namespace) -> LigandExtractor | None:
+    if args.extract_ligands is None:
+        return None
+
+    # ligand files are named after the output file, which is unique in a batch
+    return LigandExtractor(
+        output_dir=args.extract_ligands or os.path.dirname(os.path.abspath(output_file)),
+        name=os.path.splitext(os.path.basename(output_file))[0],
+        water_cutoff=args.ligand_waters,
+    )
+
+
+def modeller_operations(
+    receptor: Receptor,
+    args: argparse.Namespace,
+    scan: StructureScan | None = None,
+    events: list[str] | None = None,
+):
+    add_missing_atoms, replace_nstd_res = args.add_missing_atoms, args.replace_nstd_res
+    if replace_nstd_res and scan is not None and not scan.nonstd_residues:
+        # the replacement would also have added the missing atoms, hydrogens included
+        logging.info("No non-standard residues found: only adding the missing atoms")
+        replace_nstd_res = False
+        add_missing_atoms = True
+
+    if not (add_missing_atoms or replace_nstd_res):
+        return receptor
+
+    if add_missing_atoms and not replace_nstd_res:
+        # only hydrogens missing: no need for MODELLER
+        if TemplateHydrogenOperation().run(receptor):
+            return receptor
 
-def modeller_operations(receptor: Receptor, args: argparse.Namespace):
     try:
         from docktprep import modeller_operations
     except ImportError:
         raise ImportError(f"MODELLER is required to use this feature.")
 
-    mdlops = list()
-    if args.add_missing_atoms and args.replace_nstd_res:
+    if args.modeller_isolation:
+        return isolated_modeller_operations(receptor, args, replace_nstd_res, events)
+
+    if replace_nstd_res:
         # this will also add missing atoms
-        mdlops.append(modeller_operations.ReplaceNonStdResiduesOperation())
-    elif args.add_missing_atoms:
-        mdlops.append(modeller_operations.AddMissingAtomsOperation())
-    elif args.replace_nstd_res:
-        mdlops.append(modeller_operations.ReplaceNonStdResiduesOperation())
+        mdlop = modeller_operations.ReplaceNonStdResiduesOperation(dedup_chains=args.dedup_chains)
+    else:
+        mdlop = modeller_operations.AddMissingAtomsOperation(dedup_chains=args.dedup_chains)
+    mdlop.run_modeller(receptor, transfer_res_num=args.transfer_res_num)
+    return receptor
+
+
+def isolated_modeller_operations(
+    receptor: Receptor,
+    args: argparse.Namespace,
+    replace_nstd_res: bool,
+    events: list[str] | None = None,
+    job=None,  # None: MODELLER (`modeller_operations.run_operation`)
+):
+    """Run MODELLER in a child process, with limits scaled by the receptor size.
+
+    If the job times out, crashes or fails, `args.modeller_fallback` keeps
+    the receptor as it was before MODELLER ("sanitized"), retries MODELLER
+    on the receptor cropped around the binding site or, without one, around
+    the residues to rebuild ("crop"), or raises the error ("fail").
+    """
+    if job is None:
+        from docktprep.modeller_operations import run_operation as job
+    events = events if events is not None else []
+
+    def run(text: str) -> str:
+        limits = IsolationLimits.scaled(
+            count_atoms(text), timeout=args.modeller_timeout, memory_mb=args.modeller_memory
+        )
+        return run_isolated(
+            job,
+            (text, receptor.file, receptor.file_ext.strip("."), replace_nstd_res,
+             args.dedup_chains, args.transfer_res_num),
+            limits,
+            name=f"MODELLER on {receptor.file}",
+        )
+
+    receptor.current_file_stream.seek(0)
+    try:
+        result = run(receptor.current_file_stream.read())
+    except IsolatedJobError as e:
+        events.append(f"modeller-{e.kind}")
+        if args.modeller_fallback == "fail":
+            raise
+        events.append(f"fallback-{args.modeller_fallback}")
+        if args.modeller_fallback == "sanitized":
+            logging.warning(f"{receptor.file}: keeping the receptor without the MODELLER changes")
+            receptor.current_file_stream.seek(0)
+            return receptor
 
-    for mdlop in mdlops:
-        mdlop.run_modeller(receptor, transfer_res_num=args.transfer_res_num)
+        logging.warning(f"{receptor.file}: retrying MODELLER on the cropped receptor")
+        site = binding_site(args) or RepairBindingSite()
+        BindingSiteCropOperation(site, cutoff=args.fallback_crop_cutoff).run(receptor)
+        receptor.current_file_stream.seek(0)
+        try:
+            result = run(receptor.current_file_stream.read())
+        except IsolatedJobError as e:
+            events.append(f"modeller-{e.kind}")
+            raise
 
+    receptor.close_file_stream()
+    receptor.current_file_stream = io.StringIO(result)
     return receptor
 
 
-def configure_argparser() -> argparse.ArgumentParser:
+def binding_site(args: argparse.Namespace) -> BindingSite | None:
+    if args.site_ligand:
+        return LigandBindingSite(args.site_ligand)
+    if args.site_residues:
+        return ResidueBindingSite.from_string(args.site_residues)
+    if args.site_box:
+        return BoxBindingSite(center=args.site_box[:3], size=args.site_box[3:])
+    return None
+
+
+def crop_binding_site(receptor: Receptor, args: argparse.Namespace):
+    site = binding_site(args)
+    if site is None:
+        return receptor
+
+    BindingSiteCropOperation(site, cutoff=args.site_cutoff).run(receptor)
+    return receptor
+
+
+def validate_receptor(receptor: Receptor, args: argparse.Namespace):
+    if not (args.validation_report or args.reject_invalid):
+        return None
+
+    validator = ReceptorValidator(
+        max_clashes=args.max_clashes,
+        max_bond_outliers=args.max_bond_outliers,
+        max_chain_breaks=args.max_chain_breaks,
+    )
+    report = validator.validate(receptor)
+    if args.validation_report:
+        report.write(args.validation_report)
+
+    if args.reject_invalid and not report.passed:
+        e = (
+            f"Receptor {receptor.file} failed validation: {report.n_clashes} clashes, "
+            f"{report.n_bond_outliers} bond outliers, {report.n_chain_breaks} chain breaks."
+        )
+        logging.error(e)
+        raise ReceptorValidationError(e)
+    return report
+
+
+def compute_grids(receptor_file: str, args: argparse.Namespace):
+    if not args.grid_box:
+        return None
+
+    box = GridBox(center=args.grid_box[:3], size=args.grid_box[3:], spacing=args.grid_spacing)
+    cache_dir = args.grid_cache_dir or os.path.join(
+        os.path.dirname(os.path.abspath(receptor_file)), "grids"
+    )
+    calculator = GridCalculator(
+        box, cache_dir=cache_dir, cutoff=args.grid_cutoff, workers=args.grid_workers
+    )
+    return calculator.compute(receptor_file)
+
+
+def positive_float(text: str) -> float:
+    """argparse type of the distances and cutoffs that must be positive."""
+    try:
+        value = float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid float value: {text!r}") from None
+    if not value > 0:
+        raise argparse.ArgumentTypeError(f"must be positive, got {text}")
+    return value
+
+
+def configure_argparser(argv: list[str] | None = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(
         description="DockTPrep: Prepare protein-ligand structures and create DockThor input files.",
+        epilog="Subcommands: 'docktprep batch --help' prepares many receptors at once.",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
     )
     parser.add_argument(
         "-r",
         "--receptor",
-        help="Receptor file.",
+        help="Receptor file (.pdb, .ent or .cif, optionally .gz), or ARCHIVE::MEMBER of a tar or zip archive.",
         type=str,
         required=True,
     )
@@ -75,7 +314,14 @@ def configure_argparser() -> argparse.ArgumentParser:
         help="Output file for logging.",
         default=None,
     )
+    add_pipeline_arguments(parser)
 
+    args = parser.parse_args(argv)
+    return args
+
+
+def add_pipeline_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the options of the preparation pipeline (shared by all run modes)."""
     # receptor operations
     receptor_operations = parser.add_argument_group("receptor options")
 
@@ -98,7 +344,7 @@ def configure_argparser() -> argparse.ArgumentParser:
     receptor_operations.add_argument(
         "--add-missing-atoms",
         action="store_true",
-        help="Add missing heavy and hydrogen atoms (requires MODELLER).",
+        help="Add missing heavy and hydrogen atoms (requires MODELLER unless only hydrogens are missing).",
     )
     receptor_operations.add_argument(
         "--replace-nstd-res",
@@ -110,10 +356,170 @@ def configure_argparser() -> argparse.ArgumentParser:
         action="store_true",
         help="Retains the residue numbering from the original PDB (MODELLER).",
     )
+    receptor_operations.add_argument(
+        "--dedup-chains",
+        action="store_true",
+        help="Complete identical chains once and superimpose the result onto the other copies (MODELLER).",
+    )
 
-    args = parser.parse_args()
-    return args
+    receptor_operations.add_argument(
+        "--no-modeller-isolation",
+        dest="modeller_isolation",
+        action="store_false",
+        help="Run MODELLER in this process instead of an isolated child process (no limits or fallback).",
+    )
+    receptor_operations.add_argument(
+        "--modeller-timeout",
+        type=float,
+        default=600.0,
+        metavar="SECONDS",
+        help="Wall-clock limit of a MODELLER run on up to 5000 atoms, scaled up linearly "
+        "for larger receptors (0: no limit).",
+    )
+    receptor_operations.add_argument(
+        "--modeller-memory",
+        type=float,
+        default=4096.0,
+        metavar="MB",
+        help="Address-space limit of a MODELLER run on up to 5000 atoms, scaled up linearly "
+        "for larger receptors (0: no limit).",
+    )
+    receptor_operations.add_argument(
+        "--modeller-fallback",
+        choices=("fail", "sanitized", "crop"),
+        default="fail",
+        help="When MODELLER times out, crashes or fails: fail the receptor, keep it without "
+        "the MODELLER changes, or retry on the receptor cropped around the binding site "
+        "(or, without a site, around the residues to rebuild).",
+    )
+    receptor_operations.add_argument(
+        "--fallback-crop-cutoff",
+        type=positive_float,
+        default=10.0,
+        help="Cutoff (in angstroms) of the crop of the 'crop' MODELLER fallback.",
+    )
+
+    # ligand options
+    ligand_operations = parser.add_argument_group("ligand options")
+
+    ligand_operations.add_argument(
+        "--extract-ligands",
+        type=str,
+        nargs="?",
+        const="",
+        default=None,
+        metavar="DIR",
+        help="Write the ligands and cofactors (hetero residues, one file per instance) to DIR, "
+        "or next to the output file if DIR is omitted.",
+    )
+    ligand_operations.add_argument(
+        "--ligand-waters",
+        type=positive_float,
+        default=None,
+        metavar="CUTOFF",
+        help="Also write the waters within this distance (in angstroms) of each extracted ligand.",
+    )
+
+    # binding site options
+    site_operations = parser.add_argument_group("binding site options")
+    site_definition = site_operations.add_mutually_exclusive_group()
+
+    site_definition.add_argument(
+        "--site-ligand",
+        type=str,
+        default=None,
+        help="Crop the receptor around the atoms of this ligand file (PDB, mmCIF, MOL2 or SDF).",
+    )
+    site_definition.add_argument(
+        "--site-residues",
+        type=str,
+        default=None,
+        help="Crop the receptor around these residues (e.g. 'A:45,A:52B').",
+    )
+    site_definition.add_argument(
+        "--site-box",
+        type=float,
+        nargs=6,
+        default=None,
+        metavar=("CX", "CY", "CZ", "SX", "SY", "SZ"),
+        help="Crop the receptor around a box given by its center and size.",
+    )
+    site_operations.add_argument(
+        "--site-cutoff",
+        type=positive_float,
+        default=8.0,
+        help="Keep whole residues with any atom within this distance (in angstroms) of the binding site.",
+    )
+
+    # validation options
+    validation_operations = parser.add_argument_group("validation options")
+
+    validation_operations.add_argument(
+        "--validation-report",
+        type=str,
+        default=None,
+        help="Validate the prepared receptor and write a JSON report to this file.",
+    )
+    validation_operations.add_argument(
+        "--reject-invalid",
+        action="store_true",
+        help="Fail without writing the output if the prepared receptor does not pass validation.",
+    )
+    validation_operations.add_argument(
+        "--max-clashes",
+        type=int,
+        default=25,
+        help="Maximum number of steric clashes for a receptor to pass validation.",
+    )
+    validation_operations.add_argument(
+        "--max-bond-outliers",
+        type=int,
+        default=5,
+        help="Maximum number of bond length outliers for a receptor to pass validation.",
+    )
+    validation_operations.add_argument(
+        "--max-chain-breaks",
+        type=int,
+        default=None,
+        help="Maximum number of chain breaks for a receptor to pass validation (None: no limit).",
+    )
+
+    # grid options
+    grid_operations = parser.add_argument_group("grid options")
+
+    grid_operations.add_argument(
+        "--grid-box",
+        type=float,
+        nargs=6,
+        metavar=("CX", "CY", "CZ", "SX", "SY", "SZ"),
+        default=None,
+        help="Precompute receptor interaction grids over the box with this center and size (in angstroms).",
+    )
+    grid_operations.add_argument(
+        "--grid-spacing",
+        type=float,
+        default=0.375,
+        help="Distance between grid points (in angstroms).",
+    )
+    grid_operations.add_argument(
+        "--grid-cutoff",
+        type=float,
+        default=8.0,
+        help="Interaction cutoff (in angstroms) of the grid potentials.",
+    )
+    grid_operations.add_argument(
+        "--grid-cache-dir",
+        type=str,
+        default=None,
+        help="Directory of the cached grids; None uses a grids directory next to the output file.",
+    )
+    grid_operations.add_argument(
+        "--grid-workers",
+        type=int,
+        default=1,
+        help="Number of processes computing the grids.",
+    )
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
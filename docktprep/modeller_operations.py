@@ -1,33 +1,73 @@
 import io
 import logging
 import os
-import warnings
+import threading
 from typing import Protocol
 
-from Bio.PDB import PDBExceptions
 from modeller import *
 from modeller.scripts import complete_pdb
 
 from . import nonstd_residues
+from .chain_dedup import ChainDeduplicator
 from .receptor_parser import FileFormatHandler, Receptor
-from .stdout_manager import capture_output, suppress_output
+from .stdout_manager import capture_output, log_captured_output, suppress_output
 
 __all__ = [
     "ModellerOperation",
     "CompletePDBOperation",
     "AddMissingAtomsOperation",
     "ReplaceNonStdResiduesOperation",
+    "run_operation",
 ]
 
+# MODELLER keeps process-wide state: one run at a time per process
+_modeller_lock = threading.Lock()
+
 
 class ModellerOperation(Protocol):
     def run_modeller(self, receptor: Receptor, **kwargs) -> None: ...
 
 
 class CompletePDBOperation(ModellerOperation):
-    """Complete the PDB file by adding missing atoms and residues."""
+    """Complete the PDB file by adding missing atoms and residues.
+
+    With `dedup_chains`, identical chains are completed once and the other
+    copies are rebuilt by superposition (see `chain_dedup`).
+    """
+
+    def __init__(self, dedup_chains: bool = False) -> None:
+        self.dedup_chains = dedup_chains
+
+    def strip_duplicate_chains(self, receptor: Receptor) -> ChainDeduplicator | None:
+        """Remove duplicated chains from the receptor stream, if any."""
+        structure = receptor.parse_current_file_stream()
+        dedup = ChainDeduplicator()
+        if not dedup.strip(structure):
+            return None
+        self._write_structure(receptor, structure)
+        return dedup
+
+    @staticmethod
+    def _write_structure(receptor: Receptor, structure) -> None:
+        receptor.close_file_stream()
+        receptor.current_file_stream = io.StringIO()
+        file_io = receptor.get_biopython_file_io(receptor.file_ext.strip("."))
+        file_io.set_structure(structure)
+        file_io.save(receptor.current_file_stream)
 
     def run_modeller(self, receptor: Receptor, transfer_res_num: bool = False) -> None:
+        dedup = self.strip_duplicate_chains(receptor) if self.dedup_chains else None
+        self.complete_pdb(receptor, transfer_res_num=transfer_res_num)
+        if dedup is not None:
+            structure = receptor.parse_current_file_stream()
+            dedup.restore(structure, keep_copy_numbering=transfer_res_num)
+            self._write_structure(receptor, structure)
+
+    def complete_pdb(self, receptor: Receptor, transfer_res_num: bool = False) -> None:
+        with _modeller_lock:
+            self._complete_pdb(receptor, transfer_res_num)
+
+    def _complete_pdb(self, receptor: Receptor, transfer_res_num: bool = False) -> None:
         with suppress_output():
             env = Environ()
             env.libs.topology.read(file="$(LIB)/top_heav.lib")
@@ -43,14 +83,13 @@ class CompletePDBOperation(ModellerOperation):
             mdl = complete_pdb(env, receptor_tmp, transfer_res_num=transfer_res_num)
             mdl.write(
                 file=receptor_tmp_filled,
+                # in the format of the stream: converted on output
                 model_format=FileFormatHandler.get_file_ext_full_name(
-                    receptor.output_fmt
+                    receptor.file_ext
                 ),
             )
-        if out.getvalue():
-            logging.warning(out.getvalue())
-        if err.getvalue():
-            logging.error(err.getvalue())
+        log_captured_output(out.getvalue(), logging.WARNING, prefix="MODELLER: ")
+        log_captured_output(err.getvalue(), logging.ERROR, prefix="MODELLER: ")
 
         receptor.set_file(receptor_tmp_filled)
         os.remove(receptor_tmp)
@@ -60,14 +99,20 @@ class CompletePDBOperation(ModellerOperation):
 class AddMissingAtomsOperation:
     """Add missing atoms (heavy atoms and hydrogens) to the PDB file."""
 
+    def __init__(self, dedup_chains: bool = False) -> None:
+        self.dedup_chains = dedup_chains
+
     def run_modeller(self, receptor: Receptor, transfer_res_num: bool = False) -> None:
-        complete_pdb = CompletePDBOperation()
+        complete_pdb = CompletePDBOperation(dedup_chains=self.dedup_chains)
         complete_pdb.run_modeller(receptor, transfer_res_num=transfer_res_num)
 
 
 class ReplaceNonStdResiduesOperation:
     """Replace non-standard residues with standard ones."""
 
+    def __init__(self, dedup_chains: bool = False) -> None:
+        self.dedup_chains = dedup_chains
+
     def change_hetatm_to_atom(
         self, receptor: Receptor, modified_res: dict[str, str]
     ) -> Receptor:
@@ -91,14 +136,7 @@ class ReplaceNonStdResiduesOperation:
         self, receptor: Receptor, nstds_to_std: dict[str, str]
     ) -> Receptor:
         """Prune non-backbone atoms from non-standard residues."""
-        parser = receptor.get_biopython_parser()
-        file_id = os.path.splitext(os.path.basename(receptor.file))[0]
-        receptor.current_file_stream.seek(0)
-
-        with warnings.catch_warnings(record=True) as warns:
-            warnings.simplefilter("always")
-            structure = parser.get_structure(file_id, receptor.current_file_stream)
-
+        structure = receptor.parse_current_file_stream()
         for residue in structure.get_residues():
             if residue.resname in nstds_to_std:
                 residue.resname = nstds_to_std[residue.resname]  # change to standard
@@ -106,10 +144,6 @@ class ReplaceNonStdResiduesOperation:
                     if atom.name not in ["N", "CA", "C", "O"]:
                         residue.detach_child(atom.id)
 
-        for warn in warns:
-            if warn.category == PDBExceptions.PDBConstructionWarning:
-                logging.warning(f"{self.file}: {str(warn.message).split("\n")[0]}")
-
         receptor.close_file_stream()  # close the original file stream
         receptor.current_file_stream = io.StringIO()
 
@@ -121,7 +155,7 @@ class ReplaceNonStdResiduesOperation:
     def replace_non_std_residues(
         self, receptor: Receptor, transfer_res_num: bool = False
     ) -> None:
-        complete_pdb = CompletePDBOperation()
+        complete_pdb = CompletePDBOperation(dedup_chains=self.dedup_chains)
         receptor = self.change_hetatm_to_atom(receptor, nonstd_residues.nstds_to_std)
         receptor = self.change_and_prune_non_std_residues(
             receptor, nonstd_residues.nstds_to_std
@@ -132,3 +166,27 @@ class ReplaceNonStdResiduesOperation:
 
     def run_modeller(self, receptor: Receptor, transfer_res_num: bool = False) -> None:
         self.replace_non_std_residues(receptor, transfer_res_num)
+
+
+def run_operation(
+    text: str,
+    file: str,
+    file_fmt: str,
+    replace_nstd_res: bool,
+    dedup_chains: bool = False,
+    transfer_res_num: bool = False,
+) -> str:
+    """Run a MODELLER operation on the receptor `text` (read as `file`); return the result.
+
+    The result is in the format of `text`, `file_fmt`.
+
+    Entry point of the isolated MODELLER processes (see `isolation`).
+    """
+    receptor = Receptor(file, output_fmt=file_fmt, stream=io.StringIO(text))
+    if replace_nstd_res:  # this also adds missing atoms
+        operation = ReplaceNonStdResiduesOperation(dedup_chains=dedup_chains)
+    else:
+        operation = AddMissingAtomsOperation(dedup_chains=dedup_chains)
+    operation.run_modeller(receptor, transfer_res_num=transfer_res_num)
+    receptor.current_file_stream.seek(0)
+    return receptor.current_file_stream.read()
@@ -0,0 +1,346 @@
+"""Bulk PDB writer producing the same bytes as Biopython's `PDBIO`.
+
+`PDBIO` calls the selection callbacks and a `%`-format once per atom.
+`PDBWriter` builds the atom table of the structure once, selects atoms
+with a boolean mask (vectorized when the selector provides `atom_mask`)
+and formats every fixed-width column of all ATOM/HETATM records at once
+into a preallocated byte buffer. Values that cannot be formatted exactly
+this way (rounding ties, non-finite numbers, fields wider than their
+columns) fall back to the `PDBIO` format string for their rows.
+"""
+
+import warnings
+
+import numpy as np
+from Bio import BiopythonWarning
+from Bio.Data.IUPACData import atom_weights
+from Bio.PDB import PDBIO, Structure
+from Bio.PDB.PDBExceptions import PDBIOException
+from Bio.PDB.PDBIO import _ATOM_FORMAT_STRING, _TER_FORMAT_STRING, Select
+
+from .atom_table import AtomTable
+
+__all__ = [
+    "PDBWriter",
+]
+
+LINE_WIDTH = 81  # 80 columns and the newline
+_SPACE, _DOT, _MINUS, _ZERO, _NEWLINE = 32, 46, 45, 48, 10
+_TIE_TOLERANCE = 1e-6
+_RECORD_ATOM = np.frombuffer(b"ATOM  ", dtype=np.uint8)
+_RECORD_HETATM = np.frombuffer(b"HETATM", dtype=np.uint8)
+_select = Select()
+
+
+def _format_int(values: np.ndarray, width: int) -> tuple[np.ndarray, np.ndarray]:
+    """Right-justified `%{width}i`: (n, width) character codes and a mask of values that do not fit."""
+    return _format_digits(np.abs(values), values < 0, width, 0)
+
+
+def _format_digits(
+    magnitude: np.ndarray, negative: np.ndarray, width: int, decimals: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Right-justify `magnitude / 10**decimals` (integers) with `decimals` digits."""
+    n = len(magnitude)
+    out = np.full((n, width), _SPACE, dtype=np.uint8)
+    v = magnitude.astype(np.int64)
+    pos = width - 1
+    for _ in range(decimals):
+        out[:, pos] = _ZERO + v % 10
+        v //= 10
+        pos -= 1
+    if decimals:
+        out[:, pos] = _DOT
+        pos -= 1
+
+    start = np.full(n, pos)  # leftmost column used by the number
+    for p in range(pos, -1, -1):
+        write = np.ones(n, dtype=bool) if p == pos else v > 0
+        out[write, p] = _ZERO + v[write] % 10
+        start[write] = p
+        v //= 10
+
+    overflow = (v > 0) | (negative & (start == 0))
+    signed = np.flatnonzero(negative & ~overflow)
+    out[signed, start[signed] - 1] = _MINUS
+    return out, overflow
+
+
+def _format_float(values: np.ndarray, width: int, decimals: int) -> tuple[np.ndarray, np.ndarray]:
+    """Right-justified `%{width}.{decimals}f`; also flags values that need exact rounding."""
+    values = np.asarray(values, dtype=np.float64)
+    finite = np.isfinite(values)
+    scaled = np.where(finite, values, 0.0) * 10.0**decimals
+    # float64 products are exact for float32 coordinates; near-ties of other
+    # values are left to Python's correctly rounded formatting
+    tie = np.abs(scaled - np.floor(scaled) - 0.5) < _TIE_TOLERANCE
+    too_large = np.abs(scaled) >= 10.0 ** (width - 1)
+    rounded = np.rint(np.where(too_large, 0.0, scaled))
+    out, overflow = _format_digits(np.abs(rounded), np.signbit(values), width, decimals)
+    return out, overflow | tie | too_large | ~finite
+
+
+def _char_codes(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Code points of a string array (NUL-padded) and the string lengths."""
+    values = np.asarray(values, dtype=str)
+    width = max(values.dtype.itemsize // 4, 1)
+    codes = np.zeros((len(values), width), dtype=np.uint32)
+    if values.dtype.itemsize:
+        codes = values.view(np.uint32).reshape(len(values), width)
+    return codes, (codes != 0).sum(axis=1)
+
+
+def _format_str(values: np.ndarray, width: int, left: bool) -> tuple[np.ndarray, np.ndarray]:
+    """`%-{width}s` (left) or `%{width}s`; flags longer and non-ASCII strings."""
+    codes, lengths = _char_codes(values)
+    bad = (lengths > width) | (codes >= 128).any(axis=1)
+    out = np.full((len(codes), width), _SPACE, dtype=np.uint8)
+    j = np.arange(min(codes.shape[1], width))
+    shift = np.zeros(len(codes), dtype=np.int64) if left else width - lengths
+    columns = j[None, :] + shift[:, None]
+    valid = (j[None, :] < lengths[:, None]) & (columns >= 0) & (columns < width)
+    out[np.nonzero(valid)[0], columns[valid]] = codes[:, : len(j)][valid]
+    return out, bad
+
+
+def _format_char(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    out, bad = _format_str(values, 1, left=True)
+    return out, bad | (_char_codes(values)[1] != 1)
+
+
+class PDBWriter:
+    """Drop-in replacement of `PDBIO` (`set_structure` and `save`) for PDB output.
+
+    The selector may implement `atom_mask(table, candidates)` returning a
+    per-row boolean mask of the `AtomTable`; otherwise its `accept_atom`
+    is called per atom, as `PDBIO` does. `accept_model`, `accept_chain` and
+    `accept_residue` are always called on the entities.
+    """
+
+    def __init__(self) -> None:
+        self.structure = None
+
+    def set_structure(self, structure: Structure) -> None:
+        if getattr(structure, "level", "S") != "S":
+            pdbio = PDBIO()  # wraps chains, residues, ... in a structure
+            pdbio.set_structure(structure)
+            structure = pdbio.structure
+        self.structure = structure
+
+    def save(self, file, select=_select, write_end: bool = True) -> None:
+        text = self.to_string(select, write_end)
+        if isinstance(file, str):
+            with open(file, "w") as f:
+                f.write(text)
+        else:
+            file.write(text)
+
+    def _select_rows(self, table: AtomTable, select) -> tuple[np.ndarray, list]:
+        """Return the written rows and the layout of the file.
+
+        The layout lists, per written model, its serial number and its chains
+        as (chain id, (resname, resseq, icode) of the TER record, range of
+        residue indices).
+        """
+        residue_index = {id(residue): i for i, residue in enumerate(table.residues)}
+        accepted_residues = np.zeros(len(table.residues), dtype=bool)
+        layout = []
+        for model in self.structure.get_list():
+            if not select.accept_model(model):
+                continue
+            chains = []
+            for chain in model.get_list():
+                if not select.accept_chain(chain):
+                    continue
+                if len(chain.id) > 1:
+                    raise PDBIOException(f"Chain id ('{chain.id}') exceeds PDB format limit.")
+                last = None
+                residues = chain.get_unpacked_list()
+                for residue in residues:
+                    if not select.accept_residue(residue):
+                        continue
+                    if residue.id[1] > 9999:
+                        raise PDBIOException(
+                            f"Residue number ('{residue.id[1]}') exceeds PDB format limit."
+                        )
+                    last = residue
+                    if id(residue) in residue_index:
+                        accepted_residues[residue_index[id(residue)]] = True
+                indices = [residue_index[id(r)] for r in residues if id(r) in residue_index]
+                span = (min(indices), max(indices) + 1) if indices else (0, 0)
+                ter = (last.resname, last.id[1], last.id[2]) if last is not None else None
+                chains.append((chain.id, ter, span))
+            layout.append((model.serial_num, chains))
+
+        candidates = accepted_residues[table.residue_index]
+        if hasattr(select, "atom_mask"):
+            keep = candidates & select.atom_mask(table, candidates)
+        elif type(select).accept_atom is Select.accept_atom:
+            keep = candidates
+        else:
+            keep = candidates.copy()
+            atoms = (atom for residue in table.residues for atom in residue.get_unpacked_list())
+            for row, atom in enumerate(atoms):
+                if keep[row]:
+                    keep[row] = bool(select.accept_atom(atom))
+        return np.flatnonzero(keep), layout
+
+    def to_string(self, select=_select, write_end: bool = True) -> str:
+        """Return the PDB text `save` would write."""
+        table = AtomTable.from_structure(self.structure)
+        rows, layout = self._select_rows(table, select)
+        return self.format_table(table, rows, layout, len(self.structure) > 1, write_end)
+
+    @classmethod
+    def format_table(
+        cls,
+        table: AtomTable,
+        rows: np.ndarray,
+        layout: list,
+        model_flag: bool,
+        write_end: bool = True,
+    ) -> str:
+        """Format `rows` of `table` (grouped as in `layout`) like `PDBIO`."""
+        # atom numbers restart at 1 in every model
+        model_ids = table.model_id[rows]
+        position = np.arange(len(rows))
+        new_model = np.ones(len(rows), dtype=bool)
+        new_model[1:] = model_ids[1:] != model_ids[:-1]
+        serial = position - np.maximum.accumulate(np.where(new_model, position, 0)) + 1
+        if len(rows) and serial.max() > 99999:
+            raise PDBIOException(
+                f"Atom serial number ('{serial.max()}') exceeds PDB format limit."
+            )
+
+        lines, fallback = cls._format_atoms(table, rows, serial)
+
+        out = []
+        row_residues = table.residue_index[rows]
+        for model_serial, chains in layout:
+            if model_flag:
+                out.append(f"MODEL      {model_serial}\n")
+            written = 0
+            for chain_id, (resname, resseq, icode), (r0, r1) in chains:
+                a, b = np.searchsorted(row_residues, [r0, r1])
+                if b == a:
+                    continue
+                if fallback.size and fallback[a:b].any():
+                    out += [
+                        cls._format_row(table, rows[i], serial[i]) if fallback[i]
+                        else lines[i].tobytes().decode("latin-1")
+                        for i in range(a, b)
+                    ]
+                else:
+                    out.append(lines[a:b].tobytes().decode("latin-1"))
+                written += b - a
+                out.append(_TER_FORMAT_STRING % (written + 1, resname, chain_id, resseq, icode))
+            if model_flag and written:
+                out.append("ENDMDL\n")
+        if write_end:
+            out.append("END   \n")
+        return "".join(out)
+
+    @staticmethod
+    def _check_elements(elements: np.ndarray) -> None:
+        for element in np.unique(elements):
+            if element and element.capitalize() not in atom_weights and element != "X":
+                raise PDBIOException(f"Unrecognised element {element}")
+
+    @classmethod
+    def _format_atoms(
+        cls, table: AtomTable, rows: np.ndarray, serial: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Format the ATOM/HETATM records of `rows`; also return rows needing a fallback."""
+        n = len(rows)
+        buf = np.full((n, LINE_WIDTH), _SPACE, dtype=np.uint8)
+        buf[:, -1] = _NEWLINE
+        if not n:
+            return buf, np.zeros(0, dtype=bool)
+
+        element = table.element[rows]
+        cls._check_elements(element)
+        hetero = table.hetflag[rows] != " "
+        buf[:, 0:6] = np.where(hetero[:, None], _RECORD_HETATM, _RECORD_ATOM)
+
+        # names shorter than 4 characters start in column 14 unless the element has 2 letters
+        name = np.char.strip(table.fullname[rows])
+        pad = (
+            (np.char.str_len(name) < 4)
+            & np.char.isalpha(name.astype("U1"))
+            & (np.char.str_len(element) < 2)
+        )
+        name = np.where(pad, np.char.add(" ", name), name)
+
+        occupancy = table.occupancy[rows]
+        missing_occupancy = occupancy == -1.0
+        for index in np.flatnonzero(missing_occupancy):
+            warnings.warn(
+                f"Missing occupancy in atom {cls._atom_label(table, rows[index])} written as blank",
+                BiopythonWarning,
+            )
+
+        fallback = np.zeros(n, dtype=bool)
+        columns = [
+            (slice(6, 11), _format_int(serial, 5)),
+            (slice(12, 16), _format_str(name, 4, left=True)),
+            (slice(16, 17), _format_char(table.altloc[rows])),
+            (slice(17, 20), _format_str(table.resname[rows], 3, left=False)),
+            (slice(21, 22), _format_char(table.chain_id[rows])),
+            (slice(22, 26), _format_int(table.resseq[rows], 4)),
+            (slice(26, 27), _format_char(table.icode[rows])),
+            (slice(30, 38), _format_float(table.coord[rows, 0], 8, 3)),
+            (slice(38, 46), _format_float(table.coord[rows, 1], 8, 3)),
+            (slice(46, 54), _format_float(table.coord[rows, 2], 8, 3)),
+            (slice(54, 60), _format_float(occupancy, 6, 2)),
+            (slice(60, 66), _format_float(table.bfactor[rows], 6, 2)),
+            (slice(72, 76), _format_str(table.segid[rows], 4, left=False)),
+            (slice(76, 78), _format_str(element, 2, left=False)),
+        ]
+        for columns_slice, (codes, bad) in columns:
+            buf[:, columns_slice] = codes
+            fallback |= bad
+        buf[missing_occupancy, 54:60] = _SPACE
+        return buf, fallback
+
+    @staticmethod
+    def _atom_label(table: AtomTable, row: int) -> tuple:
+        return (
+            int(table.model_id[row]),
+            str(table.chain_id[row]),
+            (str(table.hetflag[row]), int(table.resseq[row]), str(table.icode[row])),
+            (str(table.name[row]), str(table.altloc[row])),
+        )
+
+    @staticmethod
+    def _format_row(table: AtomTable, row: int, serial: int) -> str:
+        """Format one record exactly like `PDBIO`."""
+        element = str(table.element[row]).rjust(2) if table.element[row] else "  "
+        name = str(table.fullname[row]).strip()
+        if len(name) < 4 and name[:1].isalpha() and len(element.strip()) < 2:
+            name = " " + name
+        occupancy = table.occupancy[row]
+        x, y, z = (float(c) for c in table.coord[row])
+        args = (
+            "HETATM" if table.hetflag[row] != " " else "ATOM  ",
+            int(serial),
+            name,
+            str(table.altloc[row]),
+            str(table.resname[row]),
+            str(table.chain_id[row]),
+            int(table.resseq[row]),
+            str(table.icode[row]),
+            x,
+            y,
+            z,
+            " " * 6 if occupancy == -1.0 else f"{float(occupancy):6.2f}",
+            float(table.bfactor[row]),
+            str(table.segid[row]),
+            element,
+            "  ",
+        )
+        try:
+            return _ATOM_FORMAT_STRING % args
+        except Exception as err:
+            raise PDBIOException(
+                f"Error when writing atom {PDBWriter._atom_label(table, row)}: {err}"
+            ) from err
@@ -2,13 +2,20 @@ import io
 import logging
 import os
 import tempfile
-import warnings
 
-from Bio.PDB import PDBIO, PDBExceptions, PDBParser, Structure
+import numpy as np
+from Bio.PDB import PDBExceptions, PDBParser, Structure
 from Bio.PDB.mmcifio import MMCIFIO
 from Bio.PDB.MMCIFParser import MMCIFParser
 from Bio.PDB.PDBIO import Select
 
+from .archive import open_structure, split_structure_name
+from .convert import mmcif_to_pdb
+from .ligands import LigandExtractor
+from .pdb_writer import PDBWriter
+from .stdout_manager import capture_warnings
+from .store import ReceptorStore, StoreRecord
+
 
 class PDBSanitizer(Select):
     def __init__(
@@ -46,6 +53,7 @@ class PDBSanitizer(Select):
         for atom in structure.get_atoms():
             if atom.is_disordered():
                 self.disordered_atoms.append(atom)
+        self.reject_ids = set(self.disordered_atoms_to_reject_by_occupancy())
 
     def disordered_atoms_to_reject_by_occupancy(self):
         """Return a list of disordered atom ids (number) to reject based on occupancy."""
@@ -70,8 +78,7 @@ class PDBSanitizer(Select):
 
     def accept_atom(self, atom):
         """If atom is disordered, select the highest occupancy atom."""
-        reject_ids = self.disordered_atoms_to_reject_by_occupancy()
-        if atom.get_serial_number() in reject_ids and self.remove_disorder:
+        if atom.get_serial_number() in self.reject_ids and self.remove_disorder:
             logging.info(
                 f"Ignoring lower occupancy atom ({atom.get_serial_number()} {atom.get_name()})"
             )
@@ -90,6 +97,34 @@ class PDBSanitizer(Select):
             return False
         return True
 
+    def atom_mask(self, table, candidates: np.ndarray | None = None) -> np.ndarray:
+        """Vectorized `accept_atom` over the rows of an `AtomTable`.
+
+        Only the `candidates` rows (atoms of accepted models and residues)
+        are reported in the log.
+        """
+        no_rows = np.zeros(len(table), dtype=bool)
+        lower_occupancy = (
+            np.isin(table.serial, list(self.reject_ids)) if self.remove_disorder else no_rows
+        )
+        water = table.is_water if self.remove_water else no_rows
+        hetero = np.char.startswith(table.hetflag, "H_") if self.remove_hetresi else no_rows
+        rejected = lower_occupancy | water | hetero
+        if candidates is not None:
+            rejected_rows = np.flatnonzero(rejected & candidates)
+        else:
+            rejected_rows = np.flatnonzero(rejected)
+
+        for row in rejected_rows:
+            if lower_occupancy[row]:
+                message = "Ignoring lower occupancy atom"
+            elif water[row]:
+                message = "Removing WATER atom"
+            else:
+                message = "Removing HETATM atom"
+            logging.info(f"{message} ({table.serial[row]} {table.name[row]})")
+        return ~rejected
+
 
 class PDBSanitizerFactory:
     def __init__(self, **kwargs) -> None:
@@ -131,6 +166,11 @@ class FileFormatHandler:
             ext = f".{ext}"
         return ext.lower()
 
+    @staticmethod
+    def structure_ext(file: str) -> str:
+        """Normalized structure extension of `file` (e.g. `.ent` files are `.pdb`)."""
+        return FileFormatHandler.normalize_ext(split_structure_name(file)[1])
+
     @staticmethod
     def get_parser(ext: str):
         """Return Biopython parser for the given file extension."""
@@ -150,7 +190,7 @@ class FileFormatHandler:
         FileFormatHandler.validate_ext(ext)
 
         file_io_map = {
-            ".pdb": PDBIO(),
+            ".pdb": PDBWriter(),
             ".cif": MMCIFIO(),
         }
         return file_io_map[ext]
@@ -163,12 +203,23 @@ class Receptor:
         self,
         file: str,
         output_fmt: str = "",
-        sanitizer: PDBSanitizerFactory = PDBSanitizerFactory(),  # sanitizer with default args
+        sanitizer: PDBSanitizerFactory | None = None,  # None: sanitizer with default args
+        stream: io.TextIOBase | None = None,  # None: open `file`
+        ligand_extractor: LigandExtractor | None = None,  # None: ligands are not written
     ) -> None:
+        """Receptor read from `file`, or from `stream` (named by `file`).
+
+        `file` may be gzip-compressed, a `.ent` file or an archive member
+        (`<archive>::<member>`); its format is that of the structure inside.
+        With a `ligand_extractor`, `sanitize_file` also writes the ligands
+        (listed in `ligand_files`).
+        """
         self.file = file
-        self.file_ext = os.path.splitext(file)[1]
-        self.sanitizer = sanitizer
-        self.current_file_stream = self.open_file_stream()
+        self.file_ext = split_structure_name(file)[1]
+        self.sanitizer = sanitizer if sanitizer is not None else PDBSanitizerFactory()
+        self.current_file_stream = stream if stream is not None else self.open_file_stream()
+        self.ligand_extractor = ligand_extractor
+        self.ligand_files: list[str] = []
         self.output_fmt = output_fmt if output_fmt else self.file_ext.strip(".")
 
     def set_file(self, file: str):
@@ -176,9 +227,9 @@ class Receptor:
         self.file = file
         self.current_file_stream = self.open_file_stream()
 
-    def open_file_stream(self) -> io.TextIOWrapper:
+    def open_file_stream(self) -> io.TextIOBase:
         try:
-            return open(self.file, "r")
+            return open_structure(self.file)
         except FileNotFoundError as e:
             logging.error(f"File not found: {self.file}")
             raise e
@@ -186,12 +237,47 @@ class Receptor:
     def close_file_stream(self):
         self.current_file_stream.close()
 
+    def get_output_ext(self, file: str) -> str:
+        """Output format of `file`: its extension if supported, otherwise `output_fmt`."""
+        ext = FileFormatHandler.structure_ext(file)
+        if ext in FileFormatHandler.ACCEPTED_FORMATS:
+            return ext
+        return FileFormatHandler.normalize_ext(self.output_fmt)
+
     def write_and_close_file_stream(self, file: str):
-        self.current_file_stream.seek(0)
+        """Write the current stream to `file` in its output format and close the stream."""
+        text = self.output_text(self.get_output_ext(file))
         with open(file, "w") as f:
-            f.write(self.current_file_stream.read())
+            f.write(text)
         self.close_file_stream()
 
+    def write_to_store(self, store: ReceptorStore, record_id: str) -> StoreRecord:
+        """Append the current stream to `store`, in the format of `record_id`, and close it."""
+        record = store.append(record_id, self.output_text(self.get_output_ext(record_id)).encode())
+        self.close_file_stream()
+        return record
+
+    def output_text(self, output_ext: str) -> str:
+        """Return the current stream converted to `output_ext`.
+
+        mmCIF streams are converted to PDB without building a structure;
+        other conversions parse the stream once and save it with the writer
+        of the output format.
+        """
+        stream_ext = FileFormatHandler.normalize_ext(self.file_ext)
+        self.current_file_stream.seek(0)
+        if output_ext == stream_ext:
+            text = self.current_file_stream.read()
+        elif (stream_ext, output_ext) == (".cif", ".pdb"):
+            text = mmcif_to_pdb(self.current_file_stream)
+        else:
+            file_io = FileFormatHandler.get_file_io(output_ext)
+            file_io.set_structure(self.parse_current_file_stream())
+            text_stream = io.StringIO()
+            file_io.save(text_stream)
+            text = text_stream.getvalue()
+        return text
+
     def get_biopython_parser(self):
         return FileFormatHandler.get_parser(self.file_ext)
 
@@ -210,23 +296,28 @@ class Receptor:
                 self.write_and_close_file_stream(tmp_file)
             return tmp_file
 
-    def sanitize_file(self) -> None:
-        """Sanitize the receptor file using biopython.
-
-        Catches common PDB exceptions and errors. Save the sanitized file
-        to a new `current_file_stream`. Logs any warnings.
-        """
+    def parse_current_file_stream(self) -> Structure:
+        """Parse `current_file_stream` with biopython, logging construction warnings."""
         parser = self.get_biopython_parser()
-        file_id = os.path.splitext(os.path.basename(self.file))[0]
+        file_id = split_structure_name(os.path.basename(self.file))[0]
         self.current_file_stream.seek(0)
 
-        with warnings.catch_warnings(record=True) as warns:
-            warnings.simplefilter("always")
+        with capture_warnings(PDBExceptions.PDBConstructionWarning) as warns:
             structure = parser.get_structure(file_id, self.current_file_stream)
 
         for warn in warns:
             if warn.category == PDBExceptions.PDBConstructionWarning:
                 logging.warning(f"{self.file}: {str(warn.message).split("\n")[0]}")
+        return structure
+
+    def sanitize_file(self) -> None:
+        """Sanitize the receptor file using biopython.
+
+        Catches common PDB exceptions and errors. Save the sanitized file
+        to a new `current_file_stream`. Logs any warnings. With a
+        `ligand_extractor`, the ligands are written from the same parse.
+        """
+        structure = self.parse_current_file_stream()
 
         self.close_file_stream()  # close the original file stream
         self.current_file_stream = io.StringIO()
@@ -235,3 +326,6 @@ class Receptor:
         file_io.set_structure(structure)
         sanitizer = self.sanitizer.create_sanitizer(structure)
         file_io.save(self.current_file_stream, select=sanitizer)
+
+        if self.ligand_extractor is not None:
+            self.ligand_files = self.ligand_extractor.extract(structure, sanitizer, self.output_fmt)
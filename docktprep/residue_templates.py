@@ -0,0 +1,158 @@
+"""Heavy-atom and hydrogen templates of the standard amino acids.
+
+Hydrogen rules are `(names, kind, center, references)` tuples; see
+`docktprep.hydrogens` for the geometry of each kind. A reference prefixed
+with `-` belongs to the previous residue of the chain.
+"""
+
+BACKBONE_ATOMS = ("N", "CA", "C", "O")
+
+# the C-terminal OXT is optional: it is never reported as missing
+OPTIONAL_ATOMS = ("OXT",)
+
+HEAVY_ATOMS = {
+    "ALA": BACKBONE_ATOMS + ("CB",),
+    "ARG": BACKBONE_ATOMS + ("CB", "CG", "CD", "NE", "CZ", "NH1", "NH2"),
+    "ASN": BACKBONE_ATOMS + ("CB", "CG", "OD1", "ND2"),
+    "ASP": BACKBONE_ATOMS + ("CB", "CG", "OD1", "OD2"),
+    "CYS": BACKBONE_ATOMS + ("CB", "SG"),
+    "GLN": BACKBONE_ATOMS + ("CB", "CG", "CD", "OE1", "NE2"),
+    "GLU": BACKBONE_ATOMS + ("CB", "CG", "CD", "OE1", "OE2"),
+    "GLY": BACKBONE_ATOMS,
+    "HIS": BACKBONE_ATOMS + ("CB", "CG", "ND1", "CD2", "CE1", "NE2"),
+    "ILE": BACKBONE_ATOMS + ("CB", "CG1", "CG2", "CD1"),
+    "LEU": BACKBONE_ATOMS + ("CB", "CG", "CD1", "CD2"),
+    "LYS": BACKBONE_ATOMS + ("CB", "CG", "CD", "CE", "NZ"),
+    "MET": BACKBONE_ATOMS + ("CB", "CG", "SD", "CE"),
+    "PHE": BACKBONE_ATOMS + ("CB", "CG", "CD1", "CD2", "CE1", "CE2", "CZ"),
+    "PRO": BACKBONE_ATOMS + ("CB", "CG", "CD"),
+    "SER": BACKBONE_ATOMS + ("CB", "OG"),
+    "THR": BACKBONE_ATOMS + ("CB", "OG1", "CG2"),
+    "TRP": BACKBONE_ATOMS
+    + ("CB", "CG", "CD1", "CD2", "NE1", "CE2", "CE3", "CZ2", "CZ3", "CH2"),
+    "TYR": BACKBONE_ATOMS + ("CB", "CG", "CD1", "CD2", "CE1", "CE2", "CZ", "OH"),
+    "VAL": BACKBONE_ATOMS + ("CB", "CG1", "CG2"),
+}
+
+
+def _methylene(h2: str, h3: str, center: str, a: str, b: str) -> tuple:
+    return ((h2, h3), "sp3_2", center, (a, b))
+
+
+def _methyl(prefix: str, center: str, a: str, ref: str) -> tuple:
+    names = tuple(f"{prefix}{i}" for i in (1, 2, 3))
+    return (names, "staggered", center, (a, ref))
+
+
+_AROMATIC_RING = (
+    (("HD1",), "sp2", "CD1", ("CG", "CE1")),
+    (("HD2",), "sp2", "CD2", ("CG", "CE2")),
+    (("HE1",), "sp2", "CE1", ("CD1", "CZ")),
+    (("HE2",), "sp2", "CE2", ("CD2", "CZ")),
+)
+
+# amide H of a residue bonded to the previous one, and the N-terminal
+# ammonium group; applied to every residue except where noted
+BACKBONE_HYDROGENS = {
+    "amide": (("H",), "sp2", "N", ("-C", "CA")),
+    "amide_after_gap": (("H",), "dihedral_120", "N", ("CA", "C")),
+    "n_terminus": (("H1", "H2", "H3"), "staggered", "N", ("CA", "C")),
+    "n_terminus_pro": (("H2", "H3"), "sp3_2", "N", ("CA", "CD")),
+}
+ALPHA_HYDROGEN = (("HA",), "sp3_1", "CA", ("N", "C", "CB"))
+
+SIDE_CHAIN_HYDROGENS = {
+    "ALA": (_methyl("HB", "CB", "CA", "N"),),
+    "ARG": (
+        _methylene("HB2", "HB3", "CB", "CA", "CG"),
+        _methylene("HG2", "HG3", "CG", "CB", "CD"),
+        _methylene("HD2", "HD3", "CD", "CG", "NE"),
+        (("HE",), "sp2", "NE", ("CD", "CZ")),
+        (("HH11", "HH12"), "planar_nh2", "NH1", ("CZ", "NE")),
+        (("HH21", "HH22"), "planar_nh2", "NH2", ("CZ", "NE")),
+    ),
+    "ASN": (
+        _methylene("HB2", "HB3", "CB", "CA", "CG"),
+        (("HD21", "HD22"), "planar_nh2", "ND2", ("CG", "OD1")),
+    ),
+    "ASP": (_methylene("HB2", "HB3", "CB", "CA", "CG"),),
+    "CYS": (
+        _methylene("HB2", "HB3", "CB", "CA", "SG"),
+        (("HG",), "hydroxyl", "SG", ("CB", "CA")),  # skipped in disulfides
+    ),
+    "GLN": (
+        _methylene("HB2", "HB3", "CB", "CA", "CG"),
+        _methylene("HG2", "HG3", "CG", "CB", "CD"),
+        (("HE21", "HE22"), "planar_nh2", "NE2", ("CD", "OE1")),
+    ),
+    "GLU": (
+        _methylene("HB2", "HB3", "CB", "CA", "CG"),
+        _methylene("HG2", "HG3", "CG", "CB", "CD"),
+    ),
+    "GLY": ((("HA2", "HA3"), "sp3_2", "CA", ("N", "C")),),
+    # neutral, delta-protonated histidine (as in the MODELLER/CHARMM topology)
+    "HIS": (
+        _methylene("HB2", "HB3", "CB", "CA", "CG"),
+        (("HD1",), "sp2", "ND1", ("CG", "CE1")),
+        (("HD2",), "sp2", "CD2", ("CG", "NE2")),
+        (("HE1",), "sp2", "CE1", ("ND1", "NE2")),
+    ),
+    "ILE": (
+        (("HB",), "sp3_1", "CB", ("CA", "CG1", "CG2")),
+        _methylene("HG12", "HG13", "CG1", "CB", "CD1"),
+        _methyl("HG2", "CG2", "CB", "CA"),
+        _methyl("HD1", "CD1", "CG1", "CB"),
+    ),
+    "LEU": (
+        _methylene("HB2", "HB3", "CB", "CA", "CG"),
+        (("HG",), "sp3_1", "CG", ("CB", "CD1", "CD2")),
+        _methyl("HD1", "CD1", "CG", "CB"),
+        _methyl("HD2", "CD2", "CG", "CB"),
+    ),
+    "LYS": (
+        _methylene("HB2", "HB3", "CB", "CA", "CG"),
+        _methylene("HG2", "HG3", "CG", "CB", "CD"),
+        _methylene("HD2", "HD3", "CD", "CG", "CE"),
+        _methylene("HE2", "HE3", "CE", "CD", "NZ"),
+        _methyl("HZ", "NZ", "CE", "CD"),
+    ),
+    "MET": (
+        _methylene("HB2", "HB3", "CB", "CA", "CG"),
+        _methylene("HG2", "HG3", "CG", "CB", "SD"),
+        _methyl("HE", "CE", "SD", "CG"),
+    ),
+    "PHE": (_methylene("HB2", "HB3", "CB", "CA", "CG"),)
+    + _AROMATIC_RING
+    + ((("HZ",), "sp2", "CZ", ("CE1", "CE2")),),
+    "PRO": (
+        _methylene("HB2", "HB3", "CB", "CA", "CG"),
+        _methylene("HG2", "HG3", "CG", "CB", "CD"),
+        _methylene("HD2", "HD3", "CD", "CG", "N"),
+    ),
+    "SER": (
+        _methylene("HB2", "HB3", "CB", "CA", "OG"),
+        (("HG",), "hydroxyl", "OG", ("CB", "CA")),
+    ),
+    "THR": (
+        (("HB",), "sp3_1", "CB", ("CA", "OG1", "CG2")),
+        (("HG1",), "hydroxyl", "OG1", ("CB", "CA")),
+        _methyl("HG2", "CG2", "CB", "CA"),
+    ),
+    "TRP": (
+        _methylene("HB2", "HB3", "CB", "CA", "CG"),
+        (("HD1",), "sp2", "CD1", ("CG", "NE1")),
+        (("HE1",), "sp2", "NE1", ("CD1", "CE2")),
+        (("HE3",), "sp2", "CE3", ("CD2", "CZ3")),
+        (("HZ2",), "sp2", "CZ2", ("CE2", "CH2")),
+        (("HZ3",), "sp2", "CZ3", ("CE3", "CH2")),
+        (("HH2",), "sp2", "CH2", ("CZ2", "CZ3")),
+    ),
+    "TYR": (_methylene("HB2", "HB3", "CB", "CA", "CG"),)
+    + _AROMATIC_RING
+    + ((("HH",), "hydroxyl", "OH", ("CZ", "CE1")),),
+    "VAL": (
+        (("HB",), "sp3_1", "CB", ("CA", "CG1", "CG2")),
+        _methyl("HG1", "CG1", "CB", "CA"),
+        _methyl("HG2", "CG2", "CB", "CA"),
+    ),
+}
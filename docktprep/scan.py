@@ -0,0 +1,337 @@
+"""Single-pass pre-scan of PDB and mmCIF files.
+
+Reads only the coordinate records (the `_atom_site` loop of mmCIF files)
+of the first model, without building a structure, and summarizes what
+the preparation pipeline needs to know: models, atoms and residues per
+chain, alternate locations, waters and hetero residues, non-standard
+residues and missing heavy atoms.
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Iterator, TextIO
+
+from . import nonstd_residues, residue_templates
+from .archive import ArchiveMember, open_structure, split_structure_name
+
+__all__ = [
+    "StructureScan",
+    "scan_structure",
+    "scan_files",
+    "atom_site_rows",
+]
+
+SCAN_FORMATS = (".pdb", ".ent", ".cif")
+WATER_NAMES = ("HOH", "WAT")
+HYDROGEN_ELEMENTS = ("H", "D")
+BLANK_VALUES = ("", " ", ".", "?")
+
+_MODEL_RECORD = re.compile(r"^MODEL\s+(\d+)", re.M)
+_CIF_TOKEN = re.compile(r"'[^']*'(?=\s|$)|\"[^\"]*\"(?=\s|$)|\S+")
+
+
+@dataclass
+class StructureScan:
+    """Summary of a structure file; atom and residue counts refer to the first model."""
+
+    file: str
+    format: str = ""
+    models: list = field(default_factory=list)
+    n_atoms: int = 0
+    n_residues: int = 0
+    chains: dict = field(default_factory=dict)  # chain -> {"atoms": n, "residues": n}
+    n_altloc_atoms: int = 0
+    n_hydrogens: int = 0
+    n_hetatm: int = 0
+    n_waters: int = 0
+    het_residues: dict = field(default_factory=dict)  # residue name -> count (no waters)
+    nonstd_residues: dict = field(default_factory=dict)  # residue name -> count
+    n_missing_atoms: int = 0
+
+    @property
+    def n_models(self) -> int:
+        return len(self.models)
+
+    @property
+    def n_chains(self) -> int:
+        return len(self.chains)
+
+    @property
+    def n_nonstd(self) -> int:
+        return sum(self.nonstd_residues.values())
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+
+class _ScanAccumulator:
+    """Per-atom bookkeeping shared by the PDB and mmCIF readers."""
+
+    def __init__(self) -> None:
+        self.residues: dict[tuple, list] = {}  # key -> [chain, resname, hetflag, atom names]
+        self.chain_atoms: Counter = Counter()
+        self.n_altloc_atoms = 0
+        self.n_hydrogens = 0
+        self.n_hetatm = 0
+
+    def add(self, chain, residue_key, resname, hetatm, name, altloc, element) -> None:
+        self.chain_atoms[chain] += 1
+        residue = self.residues.get(residue_key)
+        if residue is None:
+            hetflag = ("W" if resname in WATER_NAMES else "H") if hetatm else " "
+            residue = self.residues[residue_key] = [chain, resname, hetflag, set()]
+        residue[3].add(name)
+        if hetatm:
+            self.n_hetatm += 1
+        if altloc not in BLANK_VALUES:
+            self.n_altloc_atoms += 1
+        if (element or name[:1]).upper() in HYDROGEN_ELEMENTS:
+            self.n_hydrogens += 1
+
+    def summarize(self, scan: StructureScan) -> StructureScan:
+        scan.n_atoms = sum(self.chain_atoms.values())
+        scan.n_residues = len(self.residues)
+        chain_residues = Counter(chain for chain, *_ in self.residues.values())
+        scan.chains = {
+            chain: {"atoms": n, "residues": chain_residues[chain]}
+            for chain, n in self.chain_atoms.items()
+        }
+        scan.n_altloc_atoms = self.n_altloc_atoms
+        scan.n_hydrogens = self.n_hydrogens
+        scan.n_hetatm = self.n_hetatm
+
+        het, nonstd = Counter(), Counter()
+        for chain, resname, hetflag, names in self.residues.values():
+            if hetflag == "W":
+                scan.n_waters += 1
+            elif hetflag == "H":
+                het[resname] += 1
+            if resname in nonstd_residues.nstds_to_std:
+                nonstd[resname] += 1
+            template = residue_templates.HEAVY_ATOMS.get(resname)
+            if template:
+                scan.n_missing_atoms += len(set(template) - names)
+        scan.het_residues = dict(het)
+        scan.nonstd_residues = dict(nonstd)
+        return scan
+
+
+def _scan_pdb(f, scan: StructureScan) -> None:
+    atoms = _ScanAccumulator()
+    models = []
+    for line in f:
+        record = line[:6]
+        if record == "ATOM  " or record == "HETATM":
+            # residue key: residue name, chain, sequence number, insertion code, record
+            atoms.add(
+                line[21],
+                (line[17:27], record),
+                line[17:20].strip(),
+                record == "HETATM",
+                line[12:16].strip(),
+                line[16],
+                line[76:78].strip(),
+            )
+        elif record == "MODEL ":
+            models.append(int(line[6:].split()[0]))
+        elif record == "ENDMDL":
+            # only the model numbers are needed from the other models
+            models += [int(m) for m in _MODEL_RECORD.findall(f.read())]
+            break
+    scan.models = models or [1]
+    atoms.summarize(scan)
+
+
+def _unquote(token: str) -> str:
+    return token[1:-1] if token[:1] in ("'", '"') else token
+
+
+def atom_site_rows(f) -> Iterator[tuple[dict[str, int], list[str]]]:
+    """Yield (column index, values) for each row of the `_atom_site` loop of an mmCIF file.
+
+    Quoted values are unquoted; rows may span several lines. Reading stops
+    at the end of the loop.
+    """
+    columns: list[str] = []
+    in_loop = in_rows = False
+    pending: list[str] = []
+
+    for line in f:
+        if not in_rows:
+            if line.startswith("loop_"):
+                in_loop, columns = True, []
+            elif in_loop and line.startswith("_atom_site."):
+                columns.append(line.split(".", 1)[1].strip())
+            elif columns and not line.startswith("_"):
+                in_rows = True
+                index = {name: i for i, name in enumerate(columns)}
+            else:
+                in_loop = in_loop and line.startswith("_")
+                continue
+            if not in_rows:
+                continue
+
+        if line.startswith(("#", "loop_", "_", "data_")):
+            return
+        if "'" in line or '"' in line:
+            tokens = [_unquote(token) for token in _CIF_TOKEN.findall(line)]
+        else:
+            tokens = line.split()
+        if pending or len(tokens) < len(columns):  # a row may span several lines
+            pending += tokens
+            if len(pending) < len(columns):
+                continue
+            tokens, pending = pending, []
+        yield index, tokens
+
+
+def _cif_value(values: list[str], index: dict[str, int], *names: str) -> str:
+    for name in names:
+        i = index.get(name)
+        if i is not None:
+            return values[i]
+    return ""
+
+
+def _scan_mmcif(f, scan: StructureScan) -> None:
+    atoms = _ScanAccumulator()
+    models: dict[str, None] = {}
+    first_model = None
+
+    for index, tokens in atom_site_rows(f):
+        model = _cif_value(tokens, index, "pdbx_PDB_model_num")
+        models[model] = None
+        if first_model is None:
+            first_model = model
+        if model != first_model:
+            continue
+
+        chain = _cif_value(tokens, index, "auth_asym_id", "label_asym_id")
+        resname = _cif_value(tokens, index, "label_comp_id", "auth_comp_id")
+        hetatm = _cif_value(tokens, index, "group_PDB") == "HETATM"
+        seq = _cif_value(tokens, index, "auth_seq_id", "label_seq_id")
+        icode = _cif_value(tokens, index, "pdbx_PDB_ins_code")
+        atoms.add(
+            chain,
+            (chain, seq, icode, resname, hetatm),
+            resname,
+            hetatm,
+            _cif_value(tokens, index, "label_atom_id", "auth_atom_id"),
+            _cif_value(tokens, index, "label_alt_id"),
+            _cif_value(tokens, index, "type_symbol"),
+        )
+
+    scan.models = [int(m) if m.isdigit() else m for m in models] or [1]
+    atoms.summarize(scan)
+
+
+def scan_structure(file: str | ArchiveMember, stream: TextIO | None = None) -> StructureScan:
+    """Scan a PDB or mmCIF file or archive member (optionally gzip-compressed) in one pass.
+
+    An open `stream` of the file is scanned from its start and left open.
+    """
+    ext = split_structure_name(str(file))[1].lower()
+    if ext not in SCAN_FORMATS:
+        e = f"Cannot scan {file}: unsupported format {ext!r}."
+        logging.error(e)
+        raise ValueError(e)
+
+    scan = StructureScan(file=str(file), format="cif" if ext == ".cif" else "pdb")
+    if stream is not None:
+        stream.seek(0)
+        _scan_stream(stream, scan)
+        stream.seek(0)
+    else:
+        with open_structure(file, encoding="latin-1") as f:
+            _scan_stream(f, scan)
+    return scan
+
+
+def _scan_stream(f, scan: StructureScan) -> None:
+    if scan.format == "cif":
+        _scan_mmcif(f, scan)
+    else:
+        _scan_pdb(f, scan)
+
+
+def _scan_or_error(file: str) -> dict:
+    try:
+        return scan_structure(file).to_dict()
+    except (OSError, ValueError) as e:
+        return {"file": file, "error": f"{type(e).__name__}: {e}"}
+
+
+def collect_scan_inputs(paths: list[str]) -> list[str]:
+    """Expand directories into the (possibly gzipped) structure files they contain."""
+    inputs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                inputs += [
+                    os.path.join(root, f)
+                    for f in files
+                    if split_structure_name(f)[1].lower() in SCAN_FORMATS
+                ]
+        else:
+            inputs.append(path)
+    return sorted(dict.fromkeys(inputs))
+
+
+def scan_files(files: list[str], workers: int = 1):
+    """Yield the scan records (dicts) of `files`, in order; failures carry an `error`."""
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            yield from pool.map(_scan_or_error, files, chunksize=32)
+    else:
+        yield from map(_scan_or_error, files)
+
+
+def configure_scan_argparser(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="docktprep scan",
+        description="DockTPrep: summarize structure files without parsing them (JSON lines).",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "paths",
+        nargs="+",
+        help="Structure files (.pdb, .ent, .cif, optionally .gz), ARCHIVE::MEMBER names and/or directories.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default=None,
+        help="Output file (JSON lines); None writes to the standard output.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of worker processes.",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None):
+    args = configure_scan_argparser(argv)
+    out = open(args.output, "w") if args.output else sys.stdout
+    n_errors = 0
+    try:
+        for record in scan_files(collect_scan_inputs(args.paths), workers=args.workers):
+            n_errors += "error" in record
+            out.write(json.dumps(record) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 1 if n_errors else 0
@@ -0,0 +1,193 @@
+"""Cost-aware (largest-first) scheduling of batch jobs under a memory budget."""
+
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, BrokenExecutor, Future, wait
+from dataclasses import dataclass, field
+from typing import Callable
+
+from .archive import ArchiveMember
+from .scan import scan_structure
+
+__all__ = [
+    "ReceptorCost",
+    "estimate_cost",
+    "BatchScheduler",
+    "ScheduleReport",
+    "default_memory_budget",
+]
+
+# cost model, in arbitrary work units (roughly: one unit per parsed atom)
+MODELLER_ATOM_FACTOR = 4.0
+MISSING_ATOM_COST = 50.0
+NONSTD_RESIDUE_COST = 500.0
+CHAIN_COST = 100.0
+
+# memory model (MB)
+BASE_MEMORY_MB = 60.0
+ATOM_MEMORY_MB = 0.002
+MODELLER_ATOM_MEMORY_MB = 0.02
+
+
+def default_memory_budget(fraction: float = 0.8) -> float:
+    """Return `fraction` of the physical memory of the node, in MB."""
+    try:
+        total = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return float("inf")
+    return fraction * total / 2**20
+
+
+@dataclass
+class ReceptorCost:
+    input: str
+    n_atoms: int = 0
+    n_chains: int = 0
+    n_nonstd: int = 0
+    n_missing_atoms: int = 0
+
+    def work(self, modeller: bool = False) -> float:
+        """Estimated work units to prepare the receptor."""
+        atom_factor = 1.0 + (MODELLER_ATOM_FACTOR if modeller else 0.0)
+        return (
+            self.n_atoms * atom_factor
+            + self.n_missing_atoms * MISSING_ATOM_COST
+            + self.n_nonstd * NONSTD_RESIDUE_COST
+            + self.n_chains * CHAIN_COST
+        )
+
+    def memory_mb(self, modeller: bool = False) -> float:
+        """Estimated peak memory (MB) to prepare the receptor."""
+        per_atom = ATOM_MEMORY_MB + (MODELLER_ATOM_MEMORY_MB if modeller else 0.0)
+        return BASE_MEMORY_MB + self.n_atoms * per_atom
+
+
+def estimate_cost(file: str | ArchiveMember) -> ReceptorCost:
+    """Estimate the preparation cost of a receptor from a cheap pre-scan."""
+    cost = ReceptorCost(input=str(file))
+    try:
+        scan = scan_structure(file)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Cannot pre-scan {file}: {e}")
+        return cost
+
+    cost.n_atoms = scan.n_atoms
+    cost.n_chains = scan.n_chains
+    cost.n_nonstd = scan.n_nonstd
+    cost.n_missing_atoms = scan.n_missing_atoms
+    return cost
+
+
+@dataclass
+class ScheduleReport:
+    n_jobs: int = 0
+    makespan: float = 0.0
+    ideal_makespan: float = 0.0
+    total_job_time: float = 0.0
+    longest_job: float = 0.0
+    peak_memory_mb: float = 0.0
+    job_times: dict = field(default_factory=dict, repr=False)
+    unsubmitted: list = field(default_factory=list, repr=False)  # after the executor broke
+
+    @property
+    def efficiency(self) -> float:
+        return self.ideal_makespan / self.makespan if self.makespan else 1.0
+
+
+@dataclass
+class Job:
+    input: str
+    attempt: int
+    cost: ReceptorCost
+    work: float = 0.0
+    memory_mb: float = 0.0
+
+
+class BatchScheduler:
+    """Dispatch jobs longest-first while respecting a memory budget.
+
+    At most `workers` jobs run at once, and a job only starts if the
+    estimated memory of the running jobs plus its own fits in
+    `memory_budget_mb`. When the next large job does not fit, smaller jobs
+    that do are started instead (backfilling); a job larger than the whole
+    budget runs alone.
+
+    Parameters
+    ----------
+    workers : int
+        maximum number of concurrent jobs
+    memory_budget_mb : float
+        memory available to the jobs of this node (MB)
+    largest_first : bool
+        dispatch in decreasing cost order (otherwise in input order)
+    """
+
+    def __init__(
+        self, workers: int, memory_budget_mb: float, largest_first: bool = True
+    ) -> None:
+        self.workers = max(1, workers)
+        self.memory_budget_mb = memory_budget_mb
+        self.largest_first = largest_first
+
+    def order(self, jobs: list[Job]) -> list[Job]:
+        if self.largest_first:
+            return sorted(jobs, key=lambda job: job.work, reverse=True)
+        return list(jobs)
+
+    def run(
+        self,
+        jobs: list[Job],
+        submit: Callable[[Job], Future],
+        on_done: Callable[[Job, Future], None],
+    ) -> ScheduleReport:
+        """Run all jobs; `submit` starts a job and `on_done` handles its result.
+
+        If the executor breaks (e.g. a worker process died), no more jobs
+        are submitted: the running ones are handled and the others are
+        returned in `report.unsubmitted`.
+        """
+        queue = self.order(jobs)
+        running: dict[Future, tuple[Job, float]] = {}
+        memory_in_use = 0.0
+        report = ScheduleReport(n_jobs=len(jobs))
+        start = time.perf_counter()
+
+        while queue or running:
+            while queue and len(running) < self.workers:
+                room = self.memory_budget_mb - memory_in_use
+                pick = next((i for i, job in enumerate(queue) if job.memory_mb <= room), None)
+                if pick is None and not running:
+                    pick = 0  # too large for the budget: run it alone
+                if pick is None:
+                    break
+                try:
+                    future = submit(queue[pick])
+                except BrokenExecutor:
+                    report.unsubmitted, queue = queue, []
+                    break
+                job = queue.pop(pick)
+                memory_in_use += job.memory_mb
+                report.peak_memory_mb = max(report.peak_memory_mb, memory_in_use)
+                running[future] = (job, time.perf_counter())
+
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job, job_start = running.pop(future)
+                memory_in_use -= job.memory_mb
+                elapsed = time.perf_counter() - job_start
+                report.job_times[job.input] = elapsed
+                on_done(job, future)
+
+        report.makespan = time.perf_counter() - start
+        report.total_job_time = sum(report.job_times.values())
+        report.longest_job = max(report.job_times.values(), default=0.0)
+        report.ideal_makespan = max(report.total_job_time / self.workers, report.longest_job)
+        logging.info(
+            f"Scheduled {report.n_jobs} jobs: makespan {report.makespan:.2f} s, "
+            f"ideal {report.ideal_makespan:.2f} s ({100 * report.efficiency:.0f}% efficiency), "
+            f"peak estimated memory {report.peak_memory_mb:.0f} MB"
+        )
+        return report
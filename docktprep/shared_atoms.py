@@ -0,0 +1,175 @@
+"""Zero-copy hand-off of atom arrays to worker processes.
+
+Named NumPy arrays are packed into a single POSIX shared memory segment.
+Workers receive a small picklable handle and map the segment instead of
+unpickling copies of the receptor. String columns of an `AtomTable` are
+stored as integer codes; the (short) table of distinct values travels
+with the handle.
+
+Only the process that created a segment unlinks it: explicitly through
+`close()` or the context manager, or when the owner object is garbage
+collected. A crashing worker therefore cannot leak or prematurely remove
+a segment, and segments of an owner that is killed are removed by its
+`multiprocessing` resource tracker.
+"""
+
+import sys
+import threading
+import weakref
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from multiprocessing import resource_tracker, shared_memory
+from typing import Iterator
+
+import numpy as np
+
+from .atom_table import AtomTable
+
+__all__ = [
+    "SharedArrays",
+    "SharedArraysHandle",
+    "attach_arrays",
+    "share_atom_table",
+    "attach_atom_table",
+]
+
+ALIGNMENT = 64
+_attach_lock = threading.Lock()
+_attaching = threading.local()  # segment being attached by the thread
+_register = resource_tracker.register
+
+
+@dataclass(frozen=True)
+class SharedArraysHandle:
+    """Picklable description of a shared segment: name, array layout, string tables."""
+
+    segment: str
+    layout: tuple[tuple[str, str, tuple[int, ...], int], ...]  # name, dtype, shape, offset
+    strings: dict = field(default_factory=dict)
+
+
+def _release(segment: shared_memory.SharedMemory) -> None:
+    try:
+        segment.close()
+    except BufferError:  # views still alive: the mapping goes away with them
+        pass
+    try:
+        segment.unlink()
+    except FileNotFoundError:
+        pass
+
+
+class SharedArrays:
+    """Owner of named arrays copied into one shared memory segment.
+
+    Parameters
+    ----------
+    arrays : dict[str, np.ndarray]
+        arrays to share
+    strings : dict
+        extra string tables passed along in the handle
+    """
+
+    def __init__(self, arrays: dict[str, np.ndarray], strings: dict | None = None) -> None:
+        layout = []
+        offset = 0
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            offset = -(-offset // ALIGNMENT) * ALIGNMENT
+            layout.append((name, array.dtype.str, array.shape, offset))
+            offset += array.nbytes
+
+        self._segment = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        self._finalizer = weakref.finalize(self, _release, self._segment)
+        self.handle = SharedArraysHandle(self._segment.name, tuple(layout), dict(strings or {}))
+        self.arrays = _views(self._segment, self.handle)
+        for name, array in arrays.items():
+            self.arrays[name][...] = array
+
+    def close(self) -> None:
+        """Release and unlink the segment (attached workers keep their mapping)."""
+        self.arrays = {}
+        self._finalizer()
+
+    def __enter__(self) -> "SharedArrays":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _views(segment: shared_memory.SharedMemory, handle: SharedArraysHandle) -> dict:
+    return {
+        name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=segment.buf, offset=offset)
+        for name, dtype, shape, offset in handle.layout
+    }
+
+
+def _register_unless_attaching(name: str, rtype: str) -> None:
+    if rtype == "shared_memory" and name == getattr(_attaching, "name", None):
+        return
+    _register(name, rtype)
+
+
+def _open_segment(name: str) -> shared_memory.SharedMemory:
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+
+    # before 3.13, attaching registers the segment with the resource tracker,
+    # which would unlink it when the worker exits: skip the registration of
+    # the segment this thread attaches (other registrations go through)
+    with _attach_lock:
+        if resource_tracker.register is not _register_unless_attaching:
+            resource_tracker.register = _register_unless_attaching
+    _attaching.name = f"/{name}"  # the registered name has the POSIX leading slash
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        _attaching.name = None
+
+
+@contextmanager
+def attach_arrays(handle: SharedArraysHandle) -> Iterator[dict[str, np.ndarray]]:
+    """Map the arrays of a shared segment (read-only views, no copy)."""
+    segment = _open_segment(handle.segment)
+    try:
+        arrays = _views(segment, handle)
+        for array in arrays.values():
+            array.flags.writeable = False
+        yield arrays
+    finally:
+        arrays = None
+        try:
+            segment.close()
+        except BufferError:  # views escaped the block: unmapped when they are freed
+            pass
+
+
+def share_atom_table(table: AtomTable) -> SharedArrays:
+    """Copy the columns of `table` into shared memory (Biopython residues are not shared)."""
+    arrays = {}
+    strings = {}
+    for name in table.__dataclass_fields__:
+        if name == "residues":
+            continue
+        column = getattr(table, name)
+        if column.dtype.kind == "U":
+            values, codes = np.unique(column, return_inverse=True)
+            strings[name] = values.tolist()
+            arrays[name] = codes.astype(np.int32)
+        else:
+            arrays[name] = column
+    return SharedArrays(arrays, strings)
+
+
+@contextmanager
+def attach_atom_table(handle: SharedArraysHandle) -> Iterator[AtomTable]:
+    """Attach to a shared atom table; numeric columns are views of the segment."""
+    with attach_arrays(handle) as arrays:
+        columns = {}
+        for name, array in arrays.items():
+            if name in handle.strings:
+                columns[name] = np.array(handle.strings[name], dtype=str)[array]
+            else:
+                columns[name] = array
+        yield AtomTable(**columns)
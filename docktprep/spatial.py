@@ -0,0 +1,187 @@
+"""Cell-list spatial index over NumPy coordinates."""
+
+import numpy as np
+
+# cell coordinates are packed into one int64 key; offsets keep them positive
+_KEY_BITS = 21
+_KEY_OFFSET = 1 << (_KEY_BITS - 1)
+
+_NEIGHBOR_OFFSETS = np.array(
+    [(i, j, k) for i in (-1, 0, 1) for j in (-1, 0, 1) for k in (-1, 0, 1)],
+    dtype=np.int64,
+)
+# half shell: each unordered pair of neighbouring cells is visited once
+_HALF_OFFSETS = np.array(
+    [o for o in _NEIGHBOR_OFFSETS.tolist() if tuple(o) > (0, 0, 0)] + [[0, 0, 0]],
+    dtype=np.int64,
+)
+
+
+def _pack(cells: np.ndarray) -> np.ndarray:
+    cells = cells + _KEY_OFFSET
+    return (cells[:, 0] << (2 * _KEY_BITS)) | (cells[:, 1] << _KEY_BITS) | cells[:, 2]
+
+
+def _expand_blocks(
+    left_start: np.ndarray,
+    left_count: np.ndarray,
+    right_start: np.ndarray,
+    right_count: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Return all (left, right) index pairs of the cartesian product of each block pair."""
+    sizes = left_count * right_count
+    total = int(sizes.sum())
+    if total == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    block = np.repeat(np.arange(len(sizes)), sizes)
+    local = np.arange(total) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    width = right_count[block]
+    return left_start[block] + local // width, right_start[block] + local % width
+
+
+class CellList:
+    """Bin points into cubic cells to find neighbours within a cutoff.
+
+    Pairs are generated block-wise with NumPy, one neighbouring cell offset
+    at a time, so memory stays proportional to the number of candidate
+    pairs of a single offset. `cell_size` bounds the largest usable cutoff.
+    Cell coordinates are packed into 21 bits per axis: the points may span
+    at most about a million cells along each axis.
+
+    Parameters
+    ----------
+    coords : np.ndarray
+        (N, 3) array of point coordinates
+    cell_size : float
+        edge length of the cells (largest supported cutoff)
+    """
+
+    def __init__(self, coords: np.ndarray, cell_size: float) -> None:
+        if cell_size <= 0:
+            raise ValueError(f"Cell size must be positive, got {cell_size}.")
+        self.coords = np.ascontiguousarray(coords, dtype=np.float64).reshape(-1, 3)
+        self.cell_size = float(cell_size)
+        self.origin = (
+            self.coords.min(axis=0) if len(self.coords) else np.zeros(3, dtype=float)
+        )
+        extent = self.coords.max(axis=0) - self.origin if len(self.coords) else np.zeros(3)
+        # the cells of the points and their neighbours must fit in the packed keys
+        self.n_cells = int(np.floor(extent.max() / self.cell_size)) + 1
+        if self.n_cells >= _KEY_OFFSET - 2:
+            raise ValueError(
+                f"Cell size {self.cell_size} is too small for points spanning {extent.max():.1f}: "
+                f"{self.n_cells} cells per axis, at most {_KEY_OFFSET - 3}."
+            )
+
+        keys = _pack(self.cell_of(self.coords))
+        self.order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[self.order]
+        self.cell_keys, self.cell_start, self.cell_count = np.unique(
+            sorted_keys, return_index=True, return_counts=True
+        )
+        self.sorted_coords = self.coords[self.order]
+        self._cells = self.cell_of(self.sorted_coords[self.cell_start])
+
+    def __len__(self) -> int:
+        return len(self.coords)
+
+    def cell_of(self, points: np.ndarray) -> np.ndarray:
+        """Return the integer cell coordinates of `points`."""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        return np.floor((points - self.origin) / self.cell_size).astype(np.int64)
+
+    def _lookup(self, keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Return (found mask, cell index) for packed cell keys."""
+        idx = np.searchsorted(self.cell_keys, keys)
+        idx = np.minimum(idx, len(self.cell_keys) - 1)
+        return self.cell_keys[idx] == keys, idx
+
+    def _check_cutoff(self, cutoff: float | None) -> float:
+        cutoff = self.cell_size if cutoff is None else float(cutoff)
+        if cutoff > self.cell_size:
+            raise ValueError(
+                f"Cutoff {cutoff} exceeds the cell size {self.cell_size} of the index."
+            )
+        return cutoff
+
+    def pairs(self, cutoff: float | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Find all point pairs closer than `cutoff`.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray, np.ndarray]
+            indices `i < j` into the original coordinates and their distances
+        """
+        cutoff = self._check_cutoff(cutoff)
+        out_i, out_j, out_d = [], [], []
+        if len(self.coords) == 0:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0, dtype=np.float64)
+
+        for offset in _HALF_OFFSETS:
+            found, other = self._lookup(_pack(self._cells + offset))
+            this = np.flatnonzero(found)
+            other = other[found]
+            left, right = _expand_blocks(
+                self.cell_start[this],
+                self.cell_count[this],
+                self.cell_start[other],
+                self.cell_count[other],
+            )
+            if not offset.any():
+                keep = left < right  # same cell: each pair once, no self pairs
+                left, right = left[keep], right[keep]
+            dist = np.linalg.norm(
+                self.sorted_coords[left] - self.sorted_coords[right], axis=1
+            )
+            keep = dist <= cutoff
+            out_i.append(self.order[left[keep]])
+            out_j.append(self.order[right[keep]])
+            out_d.append(dist[keep])
+
+        i, j = np.concatenate(out_i), np.concatenate(out_j)
+        swap = i > j
+        i[swap], j[swap] = j[swap], i[swap]
+        return i, j, np.concatenate(out_d)
+
+    def query(
+        self, points: np.ndarray, cutoff: float | None = None
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Find indexed points closer than `cutoff` to any of `points`.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray, np.ndarray]
+            query point indices, indexed point indices and their distances
+        """
+        cutoff = self._check_cutoff(cutoff)
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        out_q, out_a, out_d = [], [], []
+        if len(self.coords) == 0 or len(points) == 0:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0, dtype=np.float64)
+
+        # cells beyond the indexed ones have no neighbours: keep their keys in range
+        query_cells = np.clip(self.cell_of(points), -2, self.n_cells + 1)
+        ones = np.ones(len(points), dtype=np.int64)
+        for offset in _NEIGHBOR_OFFSETS:
+            found, cell = self._lookup(_pack(query_cells + offset))
+            q = np.flatnonzero(found)
+            cell = cell[found]
+            left, right = _expand_blocks(
+                q, ones[q], self.cell_start[cell], self.cell_count[cell]
+            )
+            dist = np.linalg.norm(points[left] - self.sorted_coords[right], axis=1)
+            keep = dist <= cutoff
+            out_q.append(left[keep])
+            out_a.append(self.order[right[keep]])
+            out_d.append(dist[keep])
+
+        return np.concatenate(out_q), np.concatenate(out_a), np.concatenate(out_d)
+
+    def within(self, points: np.ndarray, cutoff: float | None = None) -> np.ndarray:
+        """Return a boolean mask of indexed points closer than `cutoff` to `points`."""
+        mask = np.zeros(len(self.coords), dtype=bool)
+        mask[self.query(points, cutoff)[1]] = True
+        return mask
@@ -1,13 +1,126 @@
+import ctypes
+import logging
 import os
 import sys
+import threading
+import warnings
 from contextlib import contextmanager
 from io import StringIO
 
+MAX_CAPTURE_BYTES = 1024 * 1024  # per stream
+MAX_LOG_RECORD_CHARS = 4096
+
+# fd 1/2 are process-wide; nested or concurrent captures must not interleave
+_fd_lock = threading.RLock()
+
+
+def _reset_fd_lock() -> None:
+    # a worker forked while another thread held the lock must not inherit it
+    global _fd_lock
+    _fd_lock = threading.RLock()
+
+
+os.register_at_fork(after_in_child=_reset_fd_lock)
+
+# warning collectors of each thread (innermost last), see `capture_warnings`
+_warning_collectors = threading.local()
+_warnings_hook_lock = threading.Lock()
+_warnings_hook_users = 0  # captures running with the hook installed
+_warnings_hook_filters: list[tuple] = []  # filters added for them
+
+
+def _flush_all() -> None:
+    """Flush Python and C stdio buffers so pending output lands in the right fd."""
+    for stream in (sys.stdout, sys.stderr, sys.__stdout__, sys.__stderr__):
+        try:
+            stream.flush()
+        except (AttributeError, ValueError, OSError):
+            pass
+    try:
+        ctypes.CDLL(None).fflush(None)
+    except (OSError, AttributeError, TypeError):
+        pass
+
+
+class _FDCapture:
+    """Redirect a file descriptor into a pipe drained by a background thread.
+
+    The drain thread keeps the pipe empty, so writers in native code never
+    block on a full pipe buffer. At most `max_bytes` are kept; the rest is
+    counted and discarded.
+    """
+
+    def __init__(self, fd: int, max_bytes: int = MAX_CAPTURE_BYTES) -> None:
+        self.fd = fd
+        self.max_bytes = max_bytes
+        self.chunks: list[bytes] = []
+        self.kept_bytes = 0
+        self.dropped_bytes = 0
+        self.saved_fd: int | None = None
+        self.thread: threading.Thread | None = None
+        self.lock = threading.Lock()  # the drain thread may outlive `stop`
+        self.stopped = False
+
+    def start(self) -> None:
+        self.saved_fd = os.dup(self.fd)
+        read_fd, write_fd = os.pipe()
+        os.dup2(write_fd, self.fd)
+        os.close(write_fd)
+        self.thread = threading.Thread(
+            target=self._drain, args=(read_fd,), name=f"fd{self.fd}-drain", daemon=True
+        )
+        self.thread.start()
+
+    def _drain(self, read_fd: int) -> None:
+        try:
+            while chunk := os.read(read_fd, 65536):
+                with self.lock:
+                    if self.stopped:
+                        continue  # keep draining: output after `stop` is discarded
+                    room = self.max_bytes - self.kept_bytes
+                    if room > 0:
+                        self.chunks.append(chunk[:room])
+                        self.kept_bytes += min(room, len(chunk))
+                    self.dropped_bytes += max(0, len(chunk) - max(room, 0))
+        finally:
+            os.close(read_fd)
+
+    def stop(self, timeout: float = 5.0) -> str:
+        """Restore the original fd and return the captured text."""
+        if self.saved_fd is not None:
+            os.dup2(self.saved_fd, self.fd)  # closes the last write end of the pipe
+            os.close(self.saved_fd)
+            self.saved_fd = None
+        if self.thread is not None:
+            # a child process that inherited the fd may keep the pipe open
+            self.thread.join(timeout)
+        with self.lock:
+            self.stopped = True
+            text = b"".join(self.chunks).decode(errors="replace")
+            dropped_bytes = self.dropped_bytes
+        if dropped_bytes:
+            text += f"\n[... {dropped_bytes} bytes truncated]\n"
+        return text
+
+
+def _fd_available(fd: int) -> bool:
+    try:
+        os.fstat(fd)
+        return True
+    except OSError:
+        return False
+
 
 @contextmanager
 def suppress_output():
-    """Suppress stdout and stderr."""
-    with open(os.devnull, "w") as devnull:
+    """Suppress stdout and stderr, including output written directly to fds 1/2."""
+    with _fd_lock, open(os.devnull, "w") as devnull:
+        _flush_all()
+        saved_fds = {}
+        for fd in (1, 2):
+            if _fd_available(fd):
+                saved_fds[fd] = os.dup(fd)
+                os.dup2(devnull.fileno(), fd)
         old_stdout = sys.stdout
         old_stderr = sys.stderr
         try:
@@ -17,15 +130,125 @@ def suppress_output():
         finally:
             sys.stdout = old_stdout
             sys.stderr = old_stderr
+            _flush_all()
+            for fd, saved in saved_fds.items():
+                os.dup2(saved, fd)
+                os.close(saved)
 
 
 @contextmanager
-def capture_output():
-    """Capture stdout and stderr."""
+def capture_output(max_bytes: int = MAX_CAPTURE_BYTES):
+    """Capture stdout and stderr, including output written directly to fds 1/2.
+
+    Yields two `StringIO` objects that are filled when the context exits.
+    Each stream keeps at most `max_bytes` of output.
+    """
     new_stdout, new_stderr = StringIO(), StringIO()
-    old_stdout, old_stderr = sys.stdout, sys.stderr
+    with _fd_lock:
+        _flush_all()
+        captures = [_FDCapture(fd, max_bytes) for fd in (1, 2) if _fd_available(fd)]
+        for capture in captures:
+            capture.start()
+        old_stdout, old_stderr = sys.stdout, sys.stderr
+        py_stdout, py_stderr = StringIO(), StringIO()
+        try:
+            sys.stdout, sys.stderr = py_stdout, py_stderr
+            yield new_stdout, new_stderr
+        finally:
+            sys.stdout, sys.stderr = old_stdout, old_stderr
+            _flush_all()
+            fd_text = {capture.fd: capture.stop() for capture in captures}
+            new_stdout.write(py_stdout.getvalue()[:max_bytes] + fd_text.get(1, ""))
+            new_stderr.write(py_stderr.getvalue()[:max_bytes] + fd_text.get(2, ""))
+
+
+def log_captured_output(
+    text: str,
+    level: int = logging.INFO,
+    max_record_chars: int = MAX_LOG_RECORD_CHARS,
+    prefix: str = "",
+) -> None:
+    """Forward captured text to the logger as records of bounded size."""
+    text = text.strip()
+    for start in range(0, len(text), max_record_chars):
+        logging.log(level, f"{prefix}{text[start:start + max_record_chars]}")
+
+
+def _collect_warning(message, category, filename, lineno, file=None, line=None):
+    collectors = getattr(_warning_collectors, "stack", None)
+    if collectors:
+        captured, wanted = collectors[-1]
+        if issubclass(category, wanted):
+            captured.append(
+                warnings.WarningMessage(message, category, filename, lineno, file, line)
+            )
+            return
+    _collect_warning.forward(message, category, filename, lineno, file, line)
+
+
+def _install_warnings_hook(category: type[Warning]) -> None:
+    """Route warnings through `_collect_warning` and never deduplicate `category`.
+
+    Installed on demand: code such as `catch_warnings` may have restored
+    the previous hook since the last capture. Each call is undone by one
+    of `_uninstall_warnings_hook`.
+    """
+    global _warnings_hook_users
+    with _warnings_hook_lock:
+        _warnings_hook_users += 1
+        if warnings.showwarning is not _collect_warning:
+            _collect_warning.forward = warnings.showwarning
+            warnings.showwarning = _collect_warning
+        entry = ("always", None, category, None, 0)
+        if entry not in warnings.filters:
+            warnings.filterwarnings("always", category=category)
+            _warnings_hook_filters.append(entry)
+
+
+def _uninstall_warnings_hook() -> None:
+    """Restore the previous hook and filters once the last capture has exited."""
+    global _warnings_hook_users
+    with _warnings_hook_lock:
+        _warnings_hook_users -= 1
+        if _warnings_hook_users:
+            return
+        if warnings.showwarning is _collect_warning:
+            warnings.showwarning = _collect_warning.forward
+        while _warnings_hook_filters:
+            entry = _warnings_hook_filters.pop()
+            if entry in warnings.filters:
+                warnings.filters.remove(entry)
+                # invalidate the "already shown" registries, as filterwarnings does
+                getattr(warnings, "_filters_mutated", lambda: None)()
+
+
+@contextmanager
+def capture_warnings(category: type[Warning] = Warning):
+    """Capture the warnings of `category` raised by the current thread.
+
+    Yields a list of `warnings.WarningMessage` objects, complete when the
+    context exits. Unlike `warnings.catch_warnings`, which swaps
+    process-wide state, captures of different threads may run concurrently;
+    warnings of threads without a capture are shown as usual.
+    """
+    captured: list[warnings.WarningMessage] = []
+    if getattr(sys.flags, "context_aware_warnings", False):
+        # warning filters are per context (Python 3.14+): catch_warnings is thread-safe
+        with warnings.catch_warnings(record=True) as log:
+            warnings.simplefilter("always", category)
+            yield captured
+        for w in log:
+            if issubclass(w.category, category):
+                captured.append(w)
+            else:
+                warnings.showwarning(w.message, w.category, w.filename, w.lineno, w.file, w.line)
+        return
+
+    _install_warnings_hook(category)
+    stack = _warning_collectors.__dict__.setdefault("stack", [])
+    stack.append((captured, category))
     try:
-        sys.stdout, sys.stderr = new_stdout, new_stderr
-        yield new_stdout, new_stderr
+        yield captured
     finally:
-        sys.stdout, sys.stderr = old_stdout, old_stderr
+        stack.pop()
+        _uninstall_warnings_hook()
@@ -0,0 +1,252 @@
+"""Packed output store: prepared receptors appended to a few large shard files.
+
+Writing one file per receptor puts a metadata operation (create, and
+later an open per read) on the filesystem for every receptor, which
+overloads the metadata servers of parallel filesystems at the scale of
+hundreds of thousands of receptors. A store instead appends the records
+to a fixed number of shards:
+
+    DIR/store.json          the number of shards
+    DIR/shard-0000.dat      the records, back to back
+    DIR/shard-0000.idx      one line per record: id, offset, length, sha256
+
+The shard of a record is a hash of its id. An append takes an exclusive
+`flock` on the shard's data file, writes the record at the end of the
+file and then its index line, so concurrent workers (processes, threads
+or nodes) never interleave. A record written without its index line (an
+interrupted append) is ignored. On network filesystems, `flock` must be
+supported across nodes (e.g. NFS, or Lustre mounted with `-o flock`).
+
+`StoreReader` loads the indexes once and reads any record with a slice
+of the memory-mapped shard: no open() or seek per record. When a record
+id is appended several times, the latest record wins.
+"""
+
+import fcntl
+import glob
+import hashlib
+import io
+import json
+import logging
+import mmap
+import os
+import socket
+import threading
+import zlib
+from dataclasses import dataclass
+
+__all__ = [
+    "ReceptorStore",
+    "StoreReader",
+    "StoreRecord",
+    "open_store",
+]
+
+DEFAULT_SHARDS = 16
+META_NAME = "store.json"
+
+_store_cache: dict[tuple, "ReceptorStore"] = {}
+_store_lock = threading.Lock()
+
+
+def _shard_name(directory: str, shard: int, ext: str) -> str:
+    return os.path.join(directory, f"shard-{shard:04d}{ext}")
+
+
+@dataclass(frozen=True)
+class StoreRecord:
+    id: str
+    shard: int
+    offset: int
+    length: int
+    sha256: str
+
+    def index_line(self) -> str:
+        return f"{json.dumps(self.id)}\t{self.offset}\t{self.length}\t{self.sha256}\n"
+
+
+class ReceptorStore:
+    """Append-only writer of a packed output store.
+
+    Parameters
+    ----------
+    directory : str
+        directory of the store, created if needed
+    shards : int
+        number of shard files of a new store; an existing store keeps its own
+    """
+
+    def __init__(self, directory: str, shards: int = DEFAULT_SHARDS) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        meta_file = os.path.join(directory, META_NAME)
+        if not os.path.exists(meta_file):
+            # linked into place: when several workers create the store, one wins
+            tmp = f"{meta_file}.{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}"
+            with open(tmp, "w") as f:
+                json.dump({"shards": shards}, f)
+            try:
+                os.link(tmp, meta_file)
+            except FileExistsError:
+                pass
+            finally:
+                os.remove(tmp)
+        with open(meta_file) as f:
+            self.shards = json.load(f)["shards"]
+
+        self._fds: dict[int, tuple[int, int]] = {}
+        # flock does not exclude threads sharing a file descriptor
+        self._locks = [threading.Lock() for _ in range(self.shards)]
+        self._local = threading.local()
+
+    def shard_of(self, record_id: str) -> int:
+        return zlib.crc32(record_id.encode()) % self.shards
+
+    def _open_shard(self, shard: int) -> tuple[int, int]:
+        if shard not in self._fds:
+            flags = os.O_RDWR | os.O_APPEND | os.O_CREAT
+            self._fds[shard] = (
+                os.open(_shard_name(self.directory, shard, ".dat"), flags, 0o644),
+                os.open(_shard_name(self.directory, shard, ".idx"), flags, 0o644),
+            )
+        return self._fds[shard]
+
+    @staticmethod
+    def _write_all(fd: int, data: bytes) -> None:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+
+    def append(self, record_id: str, data: bytes) -> StoreRecord:
+        """Append a record; return its location in the store."""
+        shard = self.shard_of(record_id)
+        sha256 = hashlib.sha256(data).hexdigest()
+        with self._locks[shard]:
+            data_fd, index_fd = self._open_shard(shard)
+            fcntl.flock(data_fd, fcntl.LOCK_EX)
+            try:
+                offset = os.lseek(data_fd, 0, os.SEEK_END)
+                self._write_all(data_fd, data)
+                record = StoreRecord(record_id, shard, offset, len(data), sha256)
+                line = record.index_line().encode()
+                index_size = os.fstat(index_fd).st_size
+                if index_size and os.pread(index_fd, 1, index_size - 1) != b"\n":
+                    line = b"\n" + line  # after an interrupted append: start a new line
+                self._write_all(index_fd, line)
+            finally:
+                fcntl.flock(data_fd, fcntl.LOCK_UN)
+        self._local.last_record = record
+        return record
+
+    def last_record(self) -> StoreRecord | None:
+        """The record last appended by the calling thread."""
+        return getattr(self._local, "last_record", None)
+
+    def close(self) -> None:
+        for data_fd, index_fd in self._fds.values():
+            os.close(data_fd)
+            os.close(index_fd)
+        self._fds.clear()
+
+
+def open_store(directory: str, shards: int = DEFAULT_SHARDS) -> ReceptorStore:
+    """Writer of the store in `directory`, opened once per process.
+
+    Forked workers open their own: a lock held through a file descriptor
+    inherited from the parent would not exclude the parent or its siblings.
+    """
+    key = (os.path.abspath(directory), os.getpid())
+    with _store_lock:
+        store = _store_cache.get(key)
+        if store is None:
+            store = _store_cache[key] = ReceptorStore(directory, shards)
+        return store
+
+
+class StoreReader:
+    """Random access to the records of a packed output store.
+
+    Parameters
+    ----------
+    directory : str
+        directory of the store; a missing store is empty
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.index: dict[str, StoreRecord] = {}
+        self._maps: dict[int, mmap.mmap] = {}
+        self.reload()
+
+    def reload(self) -> None:
+        """Read the indexes again, to see the records appended since."""
+        index = {}
+        for index_file in sorted(glob.glob(os.path.join(self.directory, "shard-*.idx"))):
+            shard = int(os.path.basename(index_file)[len("shard-"):-len(".idx")])
+            with open(index_file, "r") as f:
+                data = f.read()
+            lines = data.split("\n")
+            if lines[-1]:
+                logging.warning(f"Ignoring truncated last line of store index {index_file}")
+            for line in lines[:-1]:
+                try:
+                    name, offset, length, sha256 = line.split("\t")
+                    record_id = json.loads(name)
+                    index[record_id] = StoreRecord(record_id, shard, int(offset), int(length), sha256)
+                except ValueError:
+                    logging.warning(f"Ignoring malformed store index line: {line[:80]!r}")
+        self.index = index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, record_id: str) -> bool:
+        return record_id in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def _map(self, record: StoreRecord) -> mmap.mmap:
+        mapped = self._maps.get(record.shard)
+        if mapped is None or len(mapped) < record.offset + record.length:
+            if mapped is not None:
+                mapped.close()  # the shard has grown since it was mapped
+            with open(_shard_name(self.directory, record.shard, ".dat"), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[record.shard] = mapped
+        return mapped
+
+    def record(self, record_id: str) -> StoreRecord:
+        try:
+            return self.index[record_id]
+        except KeyError:
+            e = f"No record {record_id} in store {self.directory}."
+            logging.error(e)
+            raise KeyError(e) from None
+
+    def read(self, record_id: str, verify: bool = False) -> bytes:
+        """Return the contents of a record; with `verify`, check its sha256."""
+        record = self.record(record_id)
+        if not record.length:
+            return b""
+        data = self._map(record)[record.offset : record.offset + record.length]
+        if verify and hashlib.sha256(data).hexdigest() != record.sha256:
+            e = f"Corrupt record {record_id} in store {self.directory}: sha256 mismatch."
+            logging.error(e)
+            raise ValueError(e)
+        return data
+
+    def open(self, record_id: str, encoding: str = "utf-8") -> io.StringIO:
+        """Open a record as a text stream (e.g. to parse the receptor)."""
+        return io.StringIO(self.read(record_id).decode(encoding))
+
+    def close(self) -> None:
+        for mapped in self._maps.values():
+            mapped.close()
+        self._maps.clear()
+
+    def __enter__(self) -> "StoreReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
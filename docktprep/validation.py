@@ -0,0 +1,266 @@
+"""Geometry and clash validation of prepared receptors."""
+
+import json
+import logging
+import time
+from dataclasses import asdict, dataclass, field
+
+import numpy as np
+
+from .atom_table import AtomTable
+from .receptor_parser import Receptor
+from .spatial import CellList
+
+__all__ = [
+    "ReceptorValidationError",
+    "ValidationReport",
+    "ReceptorValidator",
+]
+
+# Bondi van der Waals radii (angstroms); unknown elements use DEFAULT_VDW_RADIUS
+VDW_RADII = {"H": 1.10, "D": 1.10, "C": 1.70, "N": 1.55, "O": 1.52, "S": 1.80, "P": 1.80, "SE": 1.90}
+DEFAULT_VDW_RADIUS = 1.80
+COVALENT_RADII = {"H": 0.31, "D": 0.31, "C": 0.76, "N": 0.71, "O": 0.66, "S": 1.05, "P": 1.07, "SE": 1.20}
+DEFAULT_COVALENT_RADIUS = 1.20
+
+# ideal lengths of the bonds checked in polymer residues (Engh & Huber)
+BACKBONE_BONDS = {
+    ("N", "CA"): 1.458,
+    ("CA", "C"): 1.525,
+    ("C", "O"): 1.231,
+    ("CA", "CB"): 1.530,
+}
+PEPTIDE_BOND = 1.329
+CHAIN_BREAK_DISTANCE = 2.0
+MAX_XH_BOND = 1.45  # S-H is the longest X-H bond (1.34 A)
+
+_POLAR = ("N", "O")
+
+
+class ReceptorValidationError(ValueError):
+    """Raised when a prepared receptor fails validation."""
+
+
+@dataclass
+class ValidationReport:
+    receptor: str
+    n_atoms: int
+    n_clashes: int = 0
+    n_bond_outliers: int = 0
+    n_chain_breaks: int = 0
+    passed: bool = True
+    elapsed: float = 0.0
+    clashes: list = field(default_factory=list)
+    bond_outliers: list = field(default_factory=list)
+    chain_breaks: list = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def write(self, file: str) -> None:
+        with open(file, "w") as f:
+            f.write(self.to_json(indent=2))
+
+
+def _atom_labels(table: AtomTable, idx: np.ndarray) -> list[str]:
+    return [
+        f"{table.chain_id[i]}:{table.resname[i]}{table.resseq[i]}{table.icode[i].strip()}:{table.name[i]}"
+        for i in idx
+    ]
+
+
+def _radii(elements: np.ndarray, table: dict, default: float) -> np.ndarray:
+    radii = np.full(len(elements), default, dtype=np.float64)
+    for element, radius in table.items():
+        radii[elements == element] = radius
+    return radii
+
+
+class ReceptorValidator:
+    """Check steric clashes, bond lengths and chain breaks of a receptor.
+
+    All checks are NumPy kernels over an `AtomTable`; non-bonded contacts
+    come from a cell-list neighbour search, so the cost grows linearly with
+    the number of atoms.
+
+    Parameters
+    ----------
+    clash_overlap : float
+        minimum van der Waals overlap (angstroms) counted as a clash
+    hbond_overlap : float
+        extra overlap allowed between polar atoms (hydrogen bonds)
+    bond_tolerance : float
+        maximum deviation (angstroms) from the ideal bond length
+    max_clashes, max_bond_outliers, max_chain_breaks : int | None
+        limits for the receptor to pass; `None` disables a limit
+    max_listed : int
+        number of worst offenders listed in the report for each check
+    """
+
+    def __init__(
+        self,
+        clash_overlap: float = 0.4,
+        hbond_overlap: float = 0.6,
+        bond_tolerance: float = 0.1,
+        max_clashes: int | None = 25,
+        max_bond_outliers: int | None = 5,
+        max_chain_breaks: int | None = None,
+        max_listed: int = 20,
+    ) -> None:
+        self.clash_overlap = clash_overlap
+        self.hbond_overlap = hbond_overlap
+        self.bond_tolerance = bond_tolerance
+        self.max_clashes = max_clashes
+        self.max_bond_outliers = max_bond_outliers
+        self.max_chain_breaks = max_chain_breaks
+        self.max_listed = max_listed
+
+    def find_clashes(self, table: AtomTable) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return atom pairs (i, j) whose van der Waals spheres overlap and the overlap."""
+        element = table.element
+        vdw = _radii(element, VDW_RADII, DEFAULT_VDW_RADIUS)
+        cov = _radii(element, COVALENT_RADII, DEFAULT_COVALENT_RADIUS)
+        cutoff = 2 * vdw.max() - self.clash_overlap
+        i, j, d = CellList(table.coord, cell_size=cutoff).pairs(cutoff)
+
+        res_i, res_j = table.residue_index[i], table.residue_index[j]
+        same_chain = table.chain_id[i] == table.chain_id[j]
+        # intra-residue and sequence-adjacent contacts are fixed by covalent geometry
+        adjacent = same_chain & (np.abs(res_i - res_j) <= 1)
+        # alternate locations of the same atom never coexist
+        altlocs = (table.altloc[i] != " ") & (table.altloc[j] != " ") & (
+            table.altloc[i] != table.altloc[j]
+        )
+        # residues linked by disulfides or covalently attached hetero groups
+        link = (d < cov[i] + cov[j] + 0.4) & (
+            table.is_hetero[i] | table.is_hetero[j] | ((element[i] == "S") & (element[j] == "S"))
+        )
+        pair_key = res_i * table.n_residues + res_j
+        bonded = np.isin(pair_key, pair_key[link])
+        keep = ~(adjacent | altlocs | bonded)
+        i, j, d = i[keep], j[keep], d[keep]
+
+        polar_i = np.isin(element[i], _POLAR)
+        polar_j = np.isin(element[j], _POLAR)
+        hydrogen_i = np.isin(element[i], ("H", "D"))
+        hydrogen_j = np.isin(element[j], ("H", "D"))
+        hbond = (polar_i & polar_j) | (hydrogen_i & polar_j) | (hydrogen_j & polar_i)
+        allowed = self.clash_overlap + np.where(hbond, self.hbond_overlap, 0.0)
+
+        overlap = vdw[i] + vdw[j] - d
+        clash = overlap >= allowed
+        return i[clash], j[clash], overlap[clash]
+
+    def find_bond_outliers(self, table: AtomTable) -> list[tuple[int, int, float, float]]:
+        """Return (i, j, length, ideal) of polymer bonds deviating from ideal lengths."""
+        polymer = ~table.is_hetero
+        outliers = []
+        atoms = {
+            name: table.atom_index_by_name(name, polymer)
+            for name in {n for bond in BACKBONE_BONDS for n in bond}
+        }
+        for (a, b), ideal in BACKBONE_BONDS.items():
+            ia, ib = atoms[a], atoms[b]
+            both = (ia >= 0) & (ib >= 0)
+            ia, ib = ia[both], ib[both]
+            length = np.linalg.norm(table.coord[ia] - table.coord[ib], axis=1)
+            bad = np.abs(length - ideal) > self.bond_tolerance
+            outliers += [(x, y, l, ideal) for x, y, l in zip(ia[bad], ib[bad], length[bad])]
+
+        # peptide bonds shorter than a chain break
+        c, n, length = self._peptide_bonds(table, atoms["C"], atoms["N"])
+        bad = (np.abs(length - PEPTIDE_BOND) > self.bond_tolerance) & (
+            length <= CHAIN_BREAK_DISTANCE
+        )
+        outliers += [(x, y, l, PEPTIDE_BOND) for x, y, l in zip(c[bad], n[bad], length[bad])]
+
+        # hydrogens detached from their residue
+        hydrogens = np.flatnonzero(table.is_hydrogen & polymer)
+        if len(hydrogens):
+            heavy = np.flatnonzero(~table.is_hydrogen)
+            index = CellList(table.coord[heavy], cell_size=MAX_XH_BOND)
+            q, a, d = index.query(table.coord[hydrogens], MAX_XH_BOND)
+            same = table.residue_index[hydrogens[q]] == table.residue_index[heavy[a]]
+            bonded = np.zeros(len(hydrogens), dtype=bool)
+            bonded[q[same]] = True
+            outliers += [(h, h, float("nan"), MAX_XH_BOND) for h in hydrogens[~bonded]]
+        return outliers
+
+    @staticmethod
+    def _peptide_bonds(table: AtomTable, c_atoms: np.ndarray, n_atoms: np.ndarray):
+        """Return (C(i), N(i+1), distance) for sequence-consecutive polymer residues."""
+        starts = table.residue_starts()
+        chain = table.chain_id[starts]
+        c, n = c_atoms[:-1], n_atoms[1:]
+        linked = (c >= 0) & (n >= 0) & (chain[:-1] == chain[1:])
+        c, n = c[linked], n[linked]
+        return c, n, np.linalg.norm(table.coord[c] - table.coord[n], axis=1)
+
+    def find_chain_breaks(self, table: AtomTable) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return (C(i), N(i+1), distance) where consecutive residues are not bonded."""
+        polymer = ~table.is_hetero
+        c, n, length = self._peptide_bonds(
+            table,
+            table.atom_index_by_name("C", polymer),
+            table.atom_index_by_name("N", polymer),
+        )
+        gap = length > CHAIN_BREAK_DISTANCE
+        return c[gap], n[gap], length[gap]
+
+    def validate_table(self, table: AtomTable, receptor_id: str = "") -> ValidationReport:
+        start = time.perf_counter()
+        report = ValidationReport(receptor=receptor_id, n_atoms=len(table))
+        if len(table) == 0:
+            report.passed = False
+            return report
+
+        ci, cj, overlap = self.find_clashes(table)
+        worst = np.argsort(-overlap)[: self.max_listed]
+        report.n_clashes = len(overlap)
+        report.clashes = [
+            {"atoms": _atom_labels(table, [ci[k], cj[k]]), "overlap": round(float(overlap[k]), 3)}
+            for k in worst
+        ]
+
+        outliers = self.find_bond_outliers(table)
+        outliers.sort(key=lambda o: -abs(o[2] - o[3]) if o[2] == o[2] else -np.inf)
+        report.n_bond_outliers = len(outliers)
+        report.bond_outliers = [
+            {
+                "atoms": _atom_labels(table, sorted({i, j})),
+                "length": None if length != length else round(float(length), 3),
+                "ideal": ideal,
+            }
+            for i, j, length, ideal in outliers[: self.max_listed]
+        ]
+
+        bc, bn, gap = self.find_chain_breaks(table)
+        report.n_chain_breaks = len(gap)
+        report.chain_breaks = [
+            {"atoms": _atom_labels(table, [c, n]), "distance": round(float(d), 3)}
+            for c, n, d in list(zip(bc, bn, gap))[: self.max_listed]
+        ]
+
+        limits = (
+            (report.n_clashes, self.max_clashes),
+            (report.n_bond_outliers, self.max_bond_outliers),
+            (report.n_chain_breaks, self.max_chain_breaks),
+        )
+        report.passed = all(limit is None or n <= limit for n, limit in limits)
+        report.elapsed = time.perf_counter() - start
+        return report
+
+    def validate(self, receptor: Receptor) -> ValidationReport:
+        """Validate the current state of the receptor."""
+        structure = receptor.parse_current_file_stream()
+        table = AtomTable.from_structure(structure)
+        report = self.validate_table(table, receptor_id=receptor.file)
+        logging.info(
+            f"Validation of {receptor.file}: {report.n_clashes} clashes, "
+            f"{report.n_bond_outliers} bond outliers, {report.n_chain_breaks} chain breaks "
+            f"({'passed' if report.passed else 'failed'}, {report.elapsed:.3f} s)"
+        )
+        return report
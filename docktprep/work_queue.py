@@ -0,0 +1,514 @@
+"""Distribute a batch over several nodes through a queue directory on a shared filesystem.
+
+Every node runs the same `docktprep batch --queue DIR` command. The first
+one to arrive fills the queue; all of them then claim items from it until
+it is drained. Only atomic renames within the queue directory are used,
+so no broker or lock server is needed, only a POSIX filesystem shared by
+the nodes (e.g. NFS) and mounted at the same path on all of them:
+
+    DIR/todo/.created                       the queue marker, never removed
+    DIR/todo/<rank>.<attempt>               an item waiting to be claimed
+    DIR/claimed/<rank>.<attempt>.<worker>   an item being prepared by a worker
+    DIR/lost/<rank>.<attempt>.<worker>      an item whose last attempt expired
+    DIR/results/<worker>.jsonl              the journal of each worker
+    DIR/workers/<worker>                    the clock of each worker
+
+A worker claims an item by renaming it from todo/ to claimed/: when
+several workers race for an item, exactly one rename succeeds. The mtime
+of the claimed file is the worker's lease, renewed while the item is
+prepared. The leases of a crashed node are no longer renewed: once a lease
+is older than the lease time, any worker moves the item back to todo/ and
+counts the attempt as failed (or moves it to lost/ after its last attempt).
+Lease ages are measured with the filesystem's clock (the mtime of a file
+the worker has just touched), so clock skew between nodes does not matter.
+
+Items are ranked by decreasing estimated cost, so the largest receptors
+are claimed first across all nodes. Each worker appends to its own
+journal (appends from several nodes to one file are not atomic on network
+filesystems); the journals are merged into the batch journal, with the
+metrics of the run, once the queue is drained.
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import socket
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+
+from .archive import resolve_source
+from .batch import (
+    JOURNAL_NAME,
+    check_unique_outputs,
+    make_executor,
+    output_path,
+    pending_items,
+    prepare_item,
+)
+from .journal import DONE, FAILED, BatchJournal, JournalEntry, summarize, write_metrics
+from .scheduler import BatchScheduler, Job, default_memory_budget, estimate_cost
+
+__all__ = [
+    "WorkItem",
+    "WorkQueue",
+    "merge_results",
+    "run_queue",
+]
+
+LEASE_SECONDS = 600.0
+BACKFILL_WINDOW = 64  # items looked at for one that fits in the memory left
+CONFIG_NAME = "config.json"
+CREATED_NAME = ".created"  # in todo/: the queue exists even once todo/ is drained
+
+# options that may differ between the nodes sharing a queue
+NODE_OPTIONS = {
+    "inputs", "members", "queue", "workers", "executor", "memory_budget", "log_file", "poll_interval"
+}
+
+
+@dataclass
+class WorkItem:
+    rank: str
+    attempt: int
+    input: str
+    memory_mb: float = 0.0
+    path: str = ""
+
+
+def _write_atomic(file: str, data: str) -> None:
+    tmp = f"{file}.{socket.gethostname()}-{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(data)
+    os.replace(tmp, file)
+
+
+class WorkQueue:
+    """Queue of batch inputs in a directory shared by the nodes of a cluster.
+
+    Parameters
+    ----------
+    directory : str
+        queue directory (on a filesystem shared by the nodes)
+    worker : str | None
+        name of this worker, unique in the cluster; None uses `<host>-<pid>`
+    lease_seconds : float
+        claims not renewed for this long are released (their worker is presumed dead)
+    """
+
+    def __init__(
+        self, directory: str, worker: str | None = None, lease_seconds: float = LEASE_SECONDS
+    ) -> None:
+        self.directory = directory
+        self.worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.todo_dir = os.path.join(directory, "todo")
+        self.claimed_dir = os.path.join(directory, "claimed")
+        self.lost_dir = os.path.join(directory, "lost")
+        self.results_dir = os.path.join(directory, "results")
+        self.workers_dir = os.path.join(directory, "workers")
+        self.journal = BatchJournal(os.path.join(self.results_dir, f"{self.worker}.jsonl"))
+        self._listing: list[str] = []
+
+    def exists(self) -> bool:
+        return os.path.exists(os.path.join(self.todo_dir, CREATED_NAME))
+
+    def _waiting(self) -> list[str]:
+        """Names of the items waiting in todo/, in claim order."""
+        return sorted(name for name in os.listdir(self.todo_dir) if name != CREATED_NAME)
+
+    def create(self, items: list[tuple[str, int, float]], config: dict | None = None) -> bool:
+        """Fill the queue with (input, attempt, memory_mb) items, in claim order.
+
+        The items are written to a staging directory renamed into place, so
+        the queue appears complete or not at all. The rename fails once the
+        queue exists: todo/ keeps its marker, so it is never empty. Returns
+        False if another worker created the queue first (its items are used
+        instead).
+        """
+        for directory in (self.claimed_dir, self.lost_dir, self.results_dir, self.workers_dir):
+            os.makedirs(directory, exist_ok=True)
+        staging = os.path.join(self.directory, f".staging-{self.worker}")
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        open(os.path.join(staging, CREATED_NAME), "w").close()
+        for rank, (input_file, attempt, memory_mb) in enumerate(items):
+            with open(os.path.join(staging, f"{rank:08d}.{attempt}"), "w") as f:
+                json.dump({"input": input_file, "memory_mb": memory_mb}, f)
+
+        try:
+            os.rename(staging, self.todo_dir)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            logging.info(f"Queue {self.directory} was created by another worker")
+            return False
+        if config is not None:
+            _write_atomic(os.path.join(self.directory, CONFIG_NAME), json.dumps(config, indent=2))
+        logging.info(f"Created queue {self.directory} with {len(items)} items")
+        return True
+
+    def config(self) -> dict | None:
+        try:
+            with open(os.path.join(self.directory, CONFIG_NAME)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _read(self, path: str) -> WorkItem | None:
+        rank, attempt = os.path.basename(path).split(".")[:2]
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        return WorkItem(rank, int(attempt), data["input"], data["memory_mb"], path)
+
+    def claim(self, memory_room: float = float("inf")) -> WorkItem | None:
+        """Claim the first item estimated to fit in `memory_room` (MB).
+
+        Returns None if the queue is empty or no item near its head fits.
+        """
+        for refresh in (False, True):
+            if refresh or not self._listing:
+                self._listing = self._waiting()
+            for name in self._listing[:BACKFILL_WINDOW]:
+                item = self._read(os.path.join(self.todo_dir, name))
+                if item is not None and item.memory_mb > memory_room:
+                    continue
+                self._listing.remove(name)
+                if item is None:
+                    continue  # claimed by another worker
+                claimed = os.path.join(self.claimed_dir, f"{name}.{self.worker}")
+                try:
+                    os.rename(item.path, claimed)
+                except FileNotFoundError:
+                    continue
+                os.utime(claimed)  # the rename keeps the old mtime: start the lease
+                item.path = claimed
+                return item
+            if self._listing:
+                return None  # nothing near the head fits
+        return None
+
+    def renew(self, item: WorkItem) -> bool:
+        """Renew the lease of a claimed item; False if the lease was lost."""
+        try:
+            os.utime(item.path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def complete(self, item: WorkItem) -> None:
+        try:
+            os.remove(item.path)
+        except FileNotFoundError:
+            logging.warning(f"{item.input}: finished after its lease expired")
+
+    def requeue(self, item: WorkItem) -> None:
+        """Put a claimed item back in the queue for its next attempt."""
+        try:
+            os.rename(item.path, os.path.join(self.todo_dir, f"{item.rank}.{item.attempt + 1}"))
+        except FileNotFoundError:
+            logging.warning(f"{item.input}: finished after its lease expired")
+
+    def now(self) -> float:
+        """Current time of the filesystem clock."""
+        clock = os.path.join(self.workers_dir, self.worker)
+        with open(clock, "a"):
+            pass
+        os.utime(clock)
+        return os.stat(clock).st_mtime
+
+    def reap(self, max_attempts: int) -> list[JournalEntry]:
+        """Release the items with expired leases; return their failed attempts."""
+        now = self.now()
+        entries = []
+        for name in os.listdir(self.claimed_dir):
+            path = os.path.join(self.claimed_dir, name)
+            try:
+                age = now - os.stat(path).st_mtime
+            except FileNotFoundError:
+                continue
+            if age <= self.lease_seconds:
+                continue
+
+            rank, attempt, worker = name.split(".", 2)
+            attempt = int(attempt)
+            if attempt < max_attempts:
+                target = os.path.join(self.todo_dir, f"{rank}.{attempt + 1}")
+            else:
+                target = os.path.join(self.lost_dir, name)
+            try:
+                os.rename(path, target)
+            except FileNotFoundError:
+                continue  # completed, or released by another worker
+            item = self._read(target)
+            error = f"LeaseExpired: {worker} did not renew its lease for {age:.0f} s"
+            logging.warning(f"{item.input}: {error}")
+            entries.append(
+                JournalEntry(
+                    input=item.input, status=FAILED, attempt=attempt, started=time.time(), error=error
+                )
+            )
+        return entries
+
+    def drained(self) -> bool:
+        """True once every item has been prepared (none waiting or claimed)."""
+        return not self._waiting() and not os.listdir(self.claimed_dir)
+
+    def results(self) -> dict[str, list[JournalEntry]]:
+        """Journal entries of each worker."""
+        return {
+            os.path.splitext(name)[0]: BatchJournal(os.path.join(self.results_dir, name)).entries()
+            for name in sorted(os.listdir(self.results_dir))
+            if name.endswith(".jsonl")
+        }
+
+
+class _LeaseKeeper(threading.Thread):
+    """Renew the leases of the items running on this node in the background."""
+
+    def __init__(self, queue: WorkQueue, interval: float) -> None:
+        super().__init__(name="docktprep-leases", daemon=True)
+        self.queue = queue
+        self.interval = interval
+        self.items: dict[str, WorkItem] = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def add(self, item: WorkItem) -> None:
+        with self.lock:
+            self.items[item.path] = item
+
+    def discard(self, item: WorkItem) -> None:
+        with self.lock:
+            self.items.pop(item.path, None)
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            with self.lock:
+                items = list(self.items.values())
+            for item in items:
+                if not self.queue.renew(item):
+                    logging.warning(f"{item.input}: lease lost, another worker may prepare it again")
+                    self.discard(item)
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.join()
+
+
+def merge_results(queue: WorkQueue, journal: BatchJournal) -> dict:
+    """Merge the worker journals into `journal`; write and return the run metrics.
+
+    The journal is rewritten atomically with the entries of earlier runs
+    followed by those of the queue, so merging again (as every node does
+    once the queue is drained) gives the same result. The metrics are
+    written to `docktprep-metrics.json` next to the journal.
+    """
+    results = queue.results()
+    merged = sorted((e for entries in results.values() for e in entries), key=lambda e: e.started)
+    lines = [BatchJournal.format_line(entry) for entry in merged]
+
+    previous = []
+    if os.path.exists(journal.file):
+        with open(journal.file) as f:
+            previous = [line for line in f if line.endswith("\n")]
+    queued = set(lines)
+    _write_atomic(journal.file, "".join([line for line in previous if line not in queued] + lines))
+
+    metrics = summarize(merged)
+    metrics["wall_time"] = round(
+        max((e.started + e.elapsed for e in merged), default=0.0)
+        - min((e.started for e in merged), default=0.0),
+        6,
+    )
+    metrics["workers"] = {
+        worker: {
+            DONE: sum(entry.status == DONE for entry in entries),
+            FAILED: sum(entry.status == FAILED for entry in entries),
+            "elapsed": round(sum(entry.elapsed for entry in entries), 6),
+        }
+        for worker, entries in results.items()
+    }
+    write_metrics(journal, metrics)
+    logging.info(f"Merged {len(merged)} entries of {len(results)} workers into {journal.file}")
+    return metrics
+
+
+def _shared_config(args: argparse.Namespace) -> dict:
+    return json.loads(
+        json.dumps({k: v for k, v in sorted(vars(args).items()) if k not in NODE_OPTIONS})
+    )
+
+
+def fill_queue(
+    queue: WorkQueue, inputs: list[str], journal: BatchJournal, args: argparse.Namespace
+) -> bool:
+    """Create the queue with the inputs not completed in `journal`, largest first."""
+    check_unique_outputs(inputs, args.output_dir, args.output_ext)
+    pending = pending_items(inputs, journal, args.output_dir, args)
+    modeller = args.add_missing_atoms or args.replace_nstd_res
+    with make_executor(args.executor, args.workers) as pool:
+        sources = [resolve_source(input_file) for input_file, _ in pending]
+        costs = list(pool.map(estimate_cost, sources, chunksize=16))
+    jobs = [
+        Job(
+            input=input_file,
+            attempt=attempt,
+            cost=cost,
+            work=cost.work(modeller),
+            memory_mb=cost.memory_mb(modeller),
+        )
+        for (input_file, attempt), cost in zip(pending, costs)
+    ]
+    # the memory budget is applied by each node when it claims items
+    scheduler = BatchScheduler(
+        workers=args.workers,
+        memory_budget_mb=float("inf"),
+        largest_first=args.schedule == "largest-first",
+    )
+    items = [(job.input, job.attempt, job.memory_mb) for job in scheduler.order(jobs)]
+    return queue.create(items, config=_shared_config(args))
+
+
+def run_queue(inputs: list[str], args: argparse.Namespace) -> dict[str, int]:
+    """Prepare the items of the shared queue `args.queue` with the workers of this node.
+
+    The queue is created from `inputs` (minus the inputs completed in the
+    batch journal) if it does not exist yet; otherwise `inputs` are ignored
+    and this node joins the queue. Returns once the queue is drained, after
+    merging the worker journals, with the number of items that this node
+    finished as done or failed.
+    """
+    os.makedirs(args.output_dir, exist_ok=True)
+    journal = BatchJournal(args.journal or os.path.join(args.output_dir, JOURNAL_NAME))
+    queue = WorkQueue(args.queue, lease_seconds=args.lease)
+    if not queue.exists():
+        os.makedirs(args.queue, exist_ok=True)
+        fill_queue(queue, inputs, journal, args)
+    shared = queue.config()
+    if shared is not None:
+        ours = _shared_config(args)
+        differ = sorted(k for k in shared.keys() | ours.keys() if shared.get(k) != ours.get(k))
+        if differ:
+            logging.warning(
+                f"Options {', '.join(differ)} differ from those the queue {args.queue} "
+                "was created with: nodes may prepare receptors differently"
+            )
+
+    max_attempts = args.max_retries + 1
+    workers = max(1, args.workers)
+    memory_budget = args.memory_budget or default_memory_budget()
+    summary = {DONE: 0, FAILED: 0}
+    running: dict[Future, WorkItem] = {}
+    leases = _LeaseKeeper(queue, interval=args.lease / 3)
+    leases.start()
+    pool = make_executor(args.executor, workers)
+
+    def record(item: WorkItem, entry: JournalEntry) -> None:
+        queue.journal.record(entry)
+        leases.discard(item)
+        if entry.status == FAILED and item.attempt < max_attempts:
+            queue.requeue(item)
+        else:
+            queue.complete(item)
+        summary[entry.status] += 1
+
+    # claimed items that were running when a worker died (the culprit is
+    # unknown: they are rerun one at a time), or not yet submitted
+    suspects: list[WorkItem] = []
+    held: list[WorkItem] = []
+    alone: set[Future] = set()
+    try:
+        last_reap = float("-inf")
+        broken = False
+        while True:
+            if time.monotonic() - last_reap >= args.poll_interval:
+                for entry in queue.reap(max_attempts):
+                    queue.journal.record(entry)
+                last_reap = time.monotonic()
+
+            if broken and not running:
+                # a worker died (e.g. killed by the OOM killer): start a new pool
+                pool.shutdown(wait=False)
+                pool = make_executor(args.executor, workers)
+                broken = False
+            memory_in_use = sum(item.memory_mb for item in running.values())
+            while not broken and len(running) < workers:
+                suspect = bool(suspects)
+                if suspect:
+                    if running:
+                        break
+                    item = suspects.pop(0)
+                elif held:
+                    item = held.pop(0)
+                else:
+                    item = queue.claim(memory_budget - memory_in_use if running else float("inf"))
+                    if item is None:
+                        break
+                    leases.add(item)
+                output_file = output_path(item.input, args.output_dir, args.output_ext)
+                try:
+                    source = resolve_source(item.input)
+                except (OSError, ValueError) as e:
+                    entry = JournalEntry(
+                        input=item.input, status=FAILED, attempt=item.attempt, started=time.time(),
+                        output=output_file, error=f"{type(e).__name__}: {e}",
+                    )
+                    record(item, entry)
+                    continue
+                try:
+                    future = pool.submit(prepare_item, source, output_file, args, item.attempt)
+                except BrokenProcessPool:
+                    broken = True
+                    (suspects if suspect else held).insert(0, item)
+                    break
+                running[future] = item
+                memory_in_use += item.memory_mb
+                if workers == 1 or suspect:
+                    alone.add(future)
+                if suspect:
+                    break
+
+            if not (running or suspects or held):
+                if queue.drained():
+                    break
+                time.sleep(args.poll_interval)
+                continue
+            if not running:
+                continue
+
+            done, _ = wait(running, timeout=args.poll_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = running.pop(future)
+                try:
+                    entry = future.result()
+                except BrokenProcessPool as e:
+                    broken = True
+                    if future not in alone:
+                        # not charged: it may be innocent; rerun it alone to find out
+                        logging.warning(f"A worker died while {item.input} was running: rerunning it alone")
+                        suspects.append(item)
+                        continue
+                    entry = JournalEntry(
+                        input=item.input, status=FAILED, attempt=item.attempt, started=time.time(),
+                        error=f"BrokenProcessPool: {e}",
+                    )
+                finally:
+                    alone.discard(future)
+                record(item, entry)
+    finally:
+        leases.stop()
+        pool.shutdown()
+
+    metrics = merge_results(queue, journal)
+    logging.info(
+        f"Queue drained: {summary[DONE]} done and {summary[FAILED]} failed on this node; "
+        f"{metrics[DONE]} done and {metrics[FAILED]} failed in total"
+    )
+    return summary
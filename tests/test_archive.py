@@ -0,0 +1,68 @@
+import gzip
+import io
+import pickle
+import tarfile
+import zipfile
+
+import pytest
+
+from docktprep.archive import ArchiveIndex, open_structure, resolve_source
+from docktprep.batch import collect_inputs, configure_batch_argparser, run_batch
+from docktprep.receptor_parser import Receptor
+
+STRUCTURES = {"1az5": "tests/data/1az5.pdb", "9ins": "tests/data/9ins.pdb"}
+
+
+def read(file):
+    with open(file) as f:
+        return f.read()
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    """A tar of gzip'd `.ent` members in divided directories, and a deflated zip."""
+    tar_file, zip_file = tmp_path / "mirror.tar", tmp_path / "mirror.zip"
+    with tarfile.open(tar_file, "w") as tar, zipfile.ZipFile(zip_file, "w", zipfile.ZIP_DEFLATED) as z:
+        for code, file in STRUCTURES.items():
+            data = gzip.compress(read(file).encode())
+            info = tarfile.TarInfo(f"pdb/{code[1:3]}/pdb{code}.ent.gz")
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+            z.write(file, f"structures/{code}.pdb")
+        info = tarfile.TarInfo("README")
+        tar.addfile(info, io.BytesIO(b""))
+    return tar_file, zip_file
+
+
+def test_members_are_read_by_offset(mirror):
+    tar_file, zip_file = mirror
+    tar_index, zip_index = ArchiveIndex(str(tar_file)), ArchiveIndex(str(zip_file))
+    assert [m.name for m in tar_index.select()] == ["pdb/az/pdb1az5.ent.gz", "pdb/in/pdb9ins.ent.gz"]
+    assert [m.name for m in tar_index.select(["pdb/az/*"])] == ["pdb/az/pdb1az5.ent.gz"]
+    assert len(zip_index) == 2
+
+    member = pickle.loads(pickle.dumps(tar_index.member("pdb/az/pdb1az5.ent.gz")))
+    assert open_structure(member).read() == read(STRUCTURES["1az5"])
+    assert open_structure(f"{zip_file}::structures/9ins.pdb").read() == read(STRUCTURES["9ins"])
+    with pytest.raises(FileNotFoundError):
+        resolve_source(f"{tar_file}::pdb/xx/missing.ent.gz")
+
+    receptor = Receptor(str(member), stream=open_structure(member))
+    assert receptor.file_ext == ".pdb"
+    receptor.sanitize_file()
+    assert receptor.current_file_stream.getvalue().startswith("ATOM")
+
+
+def test_batch_prepares_archive_members(tmp_path, mirror):
+    tar_file, _ = mirror
+    inputs = collect_inputs([str(tar_file)], members=["pdb/*/*.ent.gz"])
+    assert inputs == [f"{tar_file}::pdb/az/pdb1az5.ent.gz", f"{tar_file}::pdb/in/pdb9ins.ent.gz"]
+
+    outputs = {}
+    for name, batch_inputs in (("archive", inputs), ("files", list(STRUCTURES.values()))):
+        args = configure_batch_argparser(["-i", "unused", "-d", str(tmp_path / name), "--workers", "2"])
+        assert run_batch(batch_inputs, args) == {"done": 2, "failed": 0}
+        outputs[name] = {
+            p.name.removeprefix("pdb"): p.read_text() for p in (tmp_path / name).glob("*.pdb")
+        }
+    assert outputs["archive"] == outputs["files"]
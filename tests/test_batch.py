@@ -0,0 +1,109 @@
+import os
+import shutil
+import time
+
+import pytest
+
+from docktprep import main
+from docktprep.batch import collect_inputs, configure_batch_argparser, run_batch
+from docktprep.journal import BatchJournal, JournalEntry
+from docktprep.main import prepare_receptor
+from docktprep.work_queue import run_queue
+
+
+def batch_args(output_dir, *options):
+    return configure_batch_argparser(
+        ["-i", "unused", "-d", str(output_dir), "--workers", "2", "--max-retries", "1", *options]
+    )
+
+
+def test_journal_scan_latest_entry_wins(tmp_path):
+    journal = BatchJournal(str(tmp_path / "journal.jsonl"))
+    journal.record(JournalEntry(input="a\tb.pdb", status="failed", attempt=1))
+    journal.record(JournalEntry(input="a\tb.pdb", status="done", attempt=2))
+    journal.record(JournalEntry(input="c.pdb", status="failed", attempt=1))
+    with open(journal.file, "a") as f:
+        f.write("done\t1\t")  # interrupted write
+
+    assert journal.scan() == {"a\tb.pdb": ("done", 2), "c.pdb": ("failed", 1)}
+    assert len(journal.entries()) == 3
+
+    # a resumed run starts a new line after the interrupted write
+    resumed = BatchJournal(journal.file)
+    resumed.record(JournalEntry(input="c.pdb", status="done", attempt=2))
+    resumed.record(JournalEntry(input="d.pdb", status="done", attempt=1))
+    assert resumed.scan() == {"a\tb.pdb": ("done", 2), "c.pdb": ("done", 2), "d.pdb": ("done", 1)}
+    assert len(resumed.entries()) == 5
+
+
+def test_batch_resumes_and_retries(tmp_path):
+    inputs_dir = tmp_path / "inputs"
+    inputs_dir.mkdir()
+    for name in ("1az5.pdb", "9ins.pdb"):
+        shutil.copy(f"tests/data/{name}", inputs_dir)
+    inputs = collect_inputs([str(inputs_dir)])
+    output_dir = tmp_path / "out"
+
+    # every input fails: retried once, then given up
+    summary = run_batch(inputs, batch_args(output_dir, "--sel-model", "5"))
+    assert summary == {"done": 0, "failed": 2}
+    journal = BatchJournal(str(output_dir / "docktprep-journal.jsonl"))
+    assert sorted(journal.scan().values()) == [("failed", 2), ("failed", 2)]
+    assert run_batch(inputs, batch_args(output_dir)) == {"done": 0, "failed": 0}
+
+    # a fresh journal prepares everything; a rerun skips completed inputs
+    args = batch_args(output_dir, "--journal", str(tmp_path / "new.jsonl"))
+    assert run_batch(inputs, args) == {"done": 2, "failed": 0}
+    assert run_batch(inputs, args) == {"done": 0, "failed": 0}
+    entries = BatchJournal(args.journal).entries()
+    assert all(len(e.sha256) == 64 and "sanitize" in e.timings for e in entries)
+
+
+def test_thread_executor_matches_process_executor(tmp_path):
+    inputs = ["tests/data/1az5.pdb", "tests/data/9ins.pdb", "tests/data/1BKX.cif"]
+    outputs = {}
+    for executor in ("process", "thread"):
+        output_dir = tmp_path / executor
+        args = batch_args(output_dir, "--executor", executor, "--output-ext", "pdb")
+        assert run_batch(inputs, args) == {"done": 3, "failed": 0}
+        outputs[executor] = {p.name: p.read_text() for p in output_dir.glob("*.pdb")}
+    assert len(outputs["thread"]) == 3
+    assert outputs["thread"] == outputs["process"]
+
+
+def crash_on_9ins(input_file, output_file, args, **kwargs):
+    if "9ins" in os.path.basename(str(input_file)):
+        time.sleep(0.5)  # while the other worker prepares its input
+        os._exit(1)  # a worker dies, e.g. in native code
+    time.sleep(0.3)
+    return prepare_receptor(input_file, output_file, args, **kwargs)
+
+
+@pytest.mark.parametrize("queue", [False, True])
+def test_batch_survives_a_dying_worker(tmp_path, monkeypatch, queue):
+    inputs_dir = tmp_path / "inputs"
+    inputs_dir.mkdir()
+    shutil.copy("tests/data/9ins.pdb", inputs_dir / "09ins.pdb")  # dispatched first
+    for i in range(6):
+        shutil.copy("tests/data/1az5.pdb", inputs_dir / f"1az5_{i}.pdb")
+    inputs = collect_inputs([str(inputs_dir)])
+    monkeypatch.setattr(main, "prepare_receptor", crash_on_9ins)
+
+    if queue:
+        args = batch_args(tmp_path / "out", "--schedule", "input-order", "--queue", str(tmp_path / "queue"))
+        summary = run_queue(inputs, args)
+    else:
+        summary = run_batch(inputs, batch_args(tmp_path / "out", "--schedule", "input-order"))
+    state = BatchJournal(str(tmp_path / "out" / "docktprep-journal.jsonl")).scan()
+    assert sorted(state) == sorted(inputs)
+    assert state[str(inputs_dir / "09ins.pdb")] == ("failed", 2)
+    # only the input whose worker died is charged its attempts
+    assert summary["done"] == 6
+    assert all(status == ("done", 1) for name, status in state.items() if "1az5" in name)
+
+
+def test_thread_workers_need_modeller_isolation(tmp_path):
+    options = ["--add-missing-atoms", "--executor", "thread"]
+    with pytest.raises(SystemExit):
+        batch_args(tmp_path, *options, "--no-modeller-isolation")
+    assert batch_args(tmp_path, *options).modeller_isolation
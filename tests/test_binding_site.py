@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+from Bio.PDB.MMCIF2Dict import MMCIF2Dict
+
+from docktprep.atom_table import AtomTable
+from docktprep.binding_site import (
+    BindingSiteCropOperation,
+    BoxBindingSite,
+    ResidueBindingSite,
+)
+from docktprep.main import configure_argparser
+from docktprep.receptor_parser import Receptor
+
+
+def sanitized_receptor(file="tests/data/1az5.pdb"):
+    receptor = Receptor(file)
+    receptor.sanitize_file()
+    return receptor
+
+
+def test_crop_keeps_whole_residues_and_numbering():
+    receptor = sanitized_receptor()
+    before = AtomTable.from_structure(receptor.parse_current_file_stream())
+    BindingSiteCropOperation(ResidueBindingSite.from_string("A:25"), cutoff=6.0).run(
+        receptor
+    )
+    after = AtomTable.from_structure(receptor.parse_current_file_stream())
+
+    assert 0 < after.n_residues < before.n_residues
+    kept = set(zip(after.chain_id, after.resseq))
+    assert ("A", 25) in kept
+    for chain_id, resseq in kept:  # residues are complete
+        n_before = ((before.chain_id == chain_id) & (before.resseq == resseq)).sum()
+        n_after = ((after.chain_id == chain_id) & (after.resseq == resseq)).sum()
+        assert n_before == n_after
+    receptor.close_file_stream()
+
+
+def test_crop_writes_ter_at_chain_breaks():
+    receptor = sanitized_receptor()
+    BindingSiteCropOperation(ResidueBindingSite.from_string("A:25"), cutoff=6.0).run(
+        receptor
+    )
+    text = receptor.current_file_stream.getvalue()
+    residues_a = sorted(
+        {int(l[22:26]) for l in text.splitlines() if l.startswith("ATOM") and l[21] == "A"}
+    )
+    n_gaps = int((np.diff(residues_a) > 1).sum())
+    ter_a = [l for l in text.splitlines() if l.startswith("TER") and l[21] == "A"]
+    assert len(ter_a) == n_gaps + 1
+    serials = [int(l[6:11]) for l in text.splitlines() if l.startswith(("ATOM", "HETATM", "TER"))]
+    assert serials == list(range(1, len(serials) + 1))
+    receptor.close_file_stream()
+
+
+def label_seq_ids(stream):
+    stream.seek(0)
+    data = MMCIF2Dict(stream)
+    return {
+        int(seq): int(label_seq)
+        for seq, label_seq in zip(data["_atom_site.auth_seq_id"], data["_atom_site.label_seq_id"])
+        if label_seq != "."
+    }
+
+
+def test_crop_keeps_sequence_gaps_in_mmcif():
+    receptor = sanitized_receptor("tests/data/1BKX.cif")
+    before = label_seq_ids(receptor.current_file_stream)
+    BindingSiteCropOperation(ResidueBindingSite.from_string("A:100"), cutoff=6.0).run(
+        receptor
+    )
+    after = label_seq_ids(receptor.current_file_stream)
+    assert 0 < len(after) < len(before)
+    assert max(after.values()) > len(after)  # the crop opened gaps
+    assert all(before[resseq] == label for resseq, label in after.items())
+    receptor.close_file_stream()
+
+
+def test_crop_cutoff_must_be_positive():
+    with pytest.raises(ValueError):
+        BindingSiteCropOperation(ResidueBindingSite.from_string("A:25"), cutoff=0.0)
+    with pytest.raises(SystemExit):
+        configure_argparser(["-r", "unused", "-o", "unused", "--site-cutoff", "0"])
+
+
+def test_crop_box_without_residues_raises():
+    receptor = sanitized_receptor()
+    site = BoxBindingSite(center=[1000.0, 1000.0, 1000.0], size=[5.0, 5.0, 5.0])
+    with pytest.raises(ValueError):
+        BindingSiteCropOperation(site, cutoff=4.0).run(receptor)
+    receptor.close_file_stream()
+
+
+def test_invalid_residue_selector():
+    with pytest.raises(ValueError):
+        ResidueBindingSite.from_string("A45")
@@ -0,0 +1,78 @@
+import numpy as np
+from Bio.PDB import PDBParser
+from Bio.PDB.Atom import Atom
+
+from docktprep.chain_dedup import ChainDeduplicator, kabsch
+
+
+def rotation(angle):
+    c, s = np.cos(angle), np.sin(angle)
+    return np.array([[c, -s, 0], [s, c, 0], [0, 0, 1]], dtype=np.float32)
+
+
+def homodimer():
+    structure = PDBParser(QUIET=True).get_structure("1az5", "tests/data/1az5.pdb")
+    model = structure[0]
+    copy = model["A"].copy()
+    copy.id = "B"
+    copy.transform(rotation(2.0), np.array([10.0, -5.0, 3.0], dtype=np.float32))
+    model.add(copy)
+    return structure
+
+
+def test_kabsch_recovers_rigid_transform():
+    rng = np.random.default_rng(0)
+    mobile = rng.normal(size=(50, 3))
+    rot, tran = rotation(0.7).astype(np.float64), np.array([1.0, 2.0, 3.0])
+    fit_rot, fit_tran = kabsch(mobile, mobile @ rot + tran)
+    assert np.allclose(fit_rot, rot) and np.allclose(fit_tran, tran)
+
+
+def test_duplicate_chain_is_rebuilt_from_representative():
+    structure = homodimer()
+    original_b = structure[0]["B"].copy()
+
+    dedup = ChainDeduplicator()
+    assert dedup.strip(structure) == 1
+    assert [chain.id for chain in structure[0]] == ["A"]
+
+    # stand-in for MODELLER: add an atom to the first residue of the representative
+    first = next(structure[0]["A"].get_residues())
+    first.add(Atom("XX", first["CA"].coord + 1.0, 0.0, 1.0, " ", " XX ", None, "C"))
+
+    dedup.restore(structure)
+    assert [chain.id for chain in structure[0]] == ["A", "B"]
+    rebuilt = structure[0]["B"]
+    assert [r.id for r in rebuilt] == [r.id for r in original_b]
+    for residue in original_b:
+        for atom in residue:
+            assert np.allclose(rebuilt[residue.id][atom.get_id()].coord, atom.coord, atol=1e-3)
+    first_b = next(rebuilt.get_residues())
+    assert np.isclose(np.linalg.norm(first_b["XX"].coord - first_b["CA"].coord), np.sqrt(3), atol=1e-3)
+
+
+def test_copies_are_rebuilt_after_chains_are_relabelled():
+    structure = homodimer()  # A, B (copy of A)
+    model = structure[0]
+    for chain_id in ("C", "D"):  # C: A without its last residue; D: copy of C
+        chain = model["A"].copy()
+        chain.detach_child([residue for residue in chain if residue.id[0] == " "][-1].id)
+        chain.id = chain_id
+        chain.transform(rotation(1.0 if chain_id == "C" else -1.0), np.full(3, 20.0, dtype=np.float32))
+        model.add(chain)
+    original_d = model["D"].copy()
+
+    dedup = ChainDeduplicator()
+    assert dedup.strip(structure) == 2
+    # stand-in for MODELLER without transfer_res_num: chains A, C come back as A, B
+    chain_c = model["C"]
+    model.detach_child("C")
+    chain_c.id = "B"
+    model.add(chain_c)
+
+    dedup.restore(structure, keep_copy_numbering=False)
+    assert [chain.id for chain in model] == ["A", "B", "C", "D"]
+    assert len(model["C"]) == len(model["D"]) == len(original_d)
+    for rebuilt, residue in zip(model["D"], original_d):
+        for atom in residue:
+            assert np.allclose(rebuilt[atom.get_id()].coord, atom.coord, atol=1e-3)
@@ -0,0 +1,47 @@
+import io
+import warnings
+
+import pytest
+from Bio.PDB import PDBIO, MMCIFParser
+
+from docktprep.batch import check_unique_outputs, output_path
+from docktprep.convert import mmcif_to_pdb
+from docktprep.main import main
+
+
+def test_mmcif_fast_path_matches_biopython():
+    text = open("tests/data/1BKX.cif").read()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        structure = MMCIFParser(QUIET=True).get_structure("1bkx", io.StringIO(text))
+    expected = io.StringIO()
+    pdbio = PDBIO()
+    pdbio.set_structure(structure)
+    pdbio.save(expected)
+    assert mmcif_to_pdb(io.StringIO(text)) == expected.getvalue()
+
+
+def test_output_format_follows_output_extension(tmp_path):
+    main(["-r", "tests/data/1BKX.cif", "-o", str(tmp_path / "from_cif.pdb")])
+    main(["-r", "tests/data/1bkx.pdb", "-o", str(tmp_path / "from_pdb.pdb")])
+    assert (tmp_path / "from_cif.pdb").read_text() == (tmp_path / "from_pdb.pdb").read_text()
+
+    main(["-r", "tests/data/1bkx.pdb", "-o", str(tmp_path / "from_pdb.cif")])
+    structure = MMCIFParser(QUIET=True).get_structure("x", str(tmp_path / "from_pdb.cif"))
+    assert len(list(structure.get_atoms())) == 2832
+
+
+def test_pdb_column_overflow_is_reported(tmp_path):
+    # auth_asym_id of the first residue
+    text = open("tests/data/1BKX.cif").read().replace(" 12  GLN A ", " 12  GLN AB ")
+    receptor = tmp_path / "long_chain.cif"
+    receptor.write_text(text)
+    with pytest.raises(ValueError, match="chain ids .*AB.*mmCIF"):
+        main(["-r", str(receptor), "-o", str(tmp_path / "out.pdb")])
+    assert not (tmp_path / "out.pdb").exists()
+
+
+def test_batch_output_extension():
+    assert output_path("in/1BKX.cif", "out", "pdb") == "out/1BKX.pdb"
+    with pytest.raises(ValueError, match="both be written"):
+        check_unique_outputs(["a/x.pdb", "b/x.cif"], "out", "pdb")
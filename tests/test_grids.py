@@ -0,0 +1,67 @@
+import numpy as np
+
+from docktprep.atom_table import AtomTable
+from docktprep.grids import (
+    COULOMB_CONSTANT,
+    VDW_PARAMETERS,
+    GridBox,
+    GridCalculator,
+    _buffered_14_7,
+    _receptor_terms,
+    load_grids,
+)
+from docktprep.main import main
+from docktprep.receptor_parser import FileFormatHandler
+
+RECEPTOR = "tests/data/1az5.pdb"
+
+
+def brute_force(box, probe, cutoff, max_energy):
+    table = AtomTable.from_structure(FileFormatHandler.get_parser(".pdb").get_structure("r", RECEPTOR))
+    radius, depth, charge = _receptor_terms(table)
+    points = box.points(0, box.shape[0])
+    d = np.linalg.norm(points[:, None] - table.coord[None], axis=2)
+    within = d <= cutoff
+    d = np.maximum(d, 0.5)
+    if probe == "elec":
+        e = COULOMB_CONSTANT * charge / (4.0 * d * d)
+    else:
+        r_probe, eps_probe = VDW_PARAMETERS[probe]
+        e = _buffered_14_7(d, (radius + r_probe) / 2, np.sqrt(depth * eps_probe))
+    return np.clip(np.where(within, e, 0.0).sum(axis=1), -max_energy, max_energy)
+
+
+def test_grids_match_brute_force_and_are_cached(tmp_path):
+    box = GridBox(center=(10.0, 20.0, 5.0), size=(4.0, 3.0, 3.0), spacing=0.5)
+    calculator = GridCalculator(box, cache_dir=str(tmp_path), probes=("C", "elec"), chunk_points=50)
+    grids_file = calculator.compute(RECEPTOR)
+    grids, metadata = load_grids(grids_file)
+
+    assert grids.shape == (2, *box.shape)
+    assert metadata["probes"] == ["C", "elec"]
+    for k, probe in enumerate(("C", "elec")):
+        expected = brute_force(box, probe, calculator.cutoff, calculator.max_energy)
+        np.testing.assert_allclose(grids[k].ravel(), expected, rtol=1e-5, atol=1e-5)
+
+    # same receptor and box: reuse; different box: new key
+    assert calculator.compute(RECEPTOR) == grids_file
+    other = GridCalculator(GridBox((10.0, 20.0, 5.0), (4.0, 3.0, 3.0), 0.4), str(tmp_path))
+    assert other.cache_key(RECEPTOR) != calculator.cache_key(RECEPTOR)
+
+
+def test_multiprocess_grids_match_serial(tmp_path):
+    box = GridBox(center=(10.0, 20.0, 5.0), size=(6.0, 4.0, 4.0), spacing=0.5)
+    serial = GridCalculator(box, cache_dir=str(tmp_path / "serial"))
+    parallel = GridCalculator(box, cache_dir=str(tmp_path / "parallel"), workers=2)
+    a, _ = load_grids(serial.compute(RECEPTOR))
+    b, _ = load_grids(parallel.compute(RECEPTOR))
+    np.testing.assert_array_equal(a, b)
+
+
+def test_grids_of_an_ent_output(tmp_path):
+    output = tmp_path / "1az5.ent"
+    main(["-r", RECEPTOR, "-o", str(output), "--grid-box", "10", "20", "5", "2", "2", "2"])
+    assert output.read_text().startswith(("ATOM", "HETATM", "REMARK", "HEADER"))
+    (grids_file,) = (tmp_path / "grids").glob("*.npy")
+    grids, metadata = load_grids(str(grids_file))
+    assert metadata["receptor"] == str(output) and np.isfinite(grids).all()
@@ -0,0 +1,51 @@
+import numpy as np
+
+from docktprep.atom_table import AtomTable
+from docktprep.hydrogens import TemplateHydrogenOperation, find_missing_heavy_atoms
+from docktprep.receptor_parser import Receptor
+from docktprep.validation import ReceptorValidator
+
+
+def sanitized_receptor(file):
+    receptor = Receptor(file)
+    receptor.sanitize_file()
+    return receptor
+
+
+def test_missing_heavy_atoms_are_detected():
+    receptor = sanitized_receptor("tests/data/1az5.pdb")
+    table = AtomTable.from_structure(receptor.parse_current_file_stream())
+    missing = find_missing_heavy_atoms(table)
+    assert ["CG", "CD", "CE", "NZ"] in missing.values()
+
+    before = receptor.current_file_stream.getvalue()
+    assert not TemplateHydrogenOperation().run(receptor)
+    assert receptor.current_file_stream.getvalue() == before
+    receptor.close_file_stream()
+
+
+def test_template_hydrogens_geometry():
+    receptor = sanitized_receptor("tests/data/9ins.pdb")
+    assert TemplateHydrogenOperation().run(receptor)
+    table = AtomTable.from_structure(receptor.parse_current_file_stream())
+
+    # N-terminal glycine: ammonium group and two alpha hydrogens
+    gly1 = (table.chain_id == "A") & (table.resseq == 1) & table.is_hydrogen
+    assert sorted(table.name[gly1]) == ["H1", "H2", "H3", "HA2", "HA3"]
+    assert table.is_hydrogen.sum() > 350
+
+    report = ReceptorValidator().validate_table(table)
+    assert report.n_bond_outliers == 0
+
+    # insulin cysteines all form disulfides, so no thiol hydrogens
+    cys_hg = (table.resname == "CYS") & (table.name == "HG")
+    assert not cys_hg.any()
+
+    # every hydrogen is ~1 A away from the nearest heavy atom of its residue
+    hydrogens = np.flatnonzero(table.is_hydrogen)
+    heavy = np.flatnonzero(~table.is_hydrogen)
+    dist = np.linalg.norm(
+        table.coord[hydrogens][:, None] - table.coord[heavy][None], axis=-1
+    )
+    assert np.all((dist.min(axis=1) > 0.9) & (dist.min(axis=1) < 1.4))
+    receptor.close_file_stream()
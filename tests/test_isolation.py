@@ -0,0 +1,87 @@
+import os
+import time
+
+import pytest
+
+from docktprep.isolation import (
+    IsolatedJobCrash,
+    IsolatedJobError,
+    IsolatedJobTimeout,
+    IsolationLimits,
+    count_atoms,
+    run_isolated,
+)
+from docktprep.main import configure_argparser, isolated_modeller_operations
+from docktprep.receptor_parser import PDBSanitizerFactory, Receptor
+
+
+def crash_on_large(text, *args):
+    """Stands in for MODELLER: crashes on large receptors, marks the others."""
+    if count_atoms(text) > 500:
+        os.abort()
+    return "REMARK   1 MODELLED\n" + text
+
+
+def slow(text, *args):
+    time.sleep(60)
+
+
+def check_format(text, file, file_fmt, *args):
+    """Stands in for MODELLER: fails unless asked for the format of `text`."""
+    if (file_fmt == "cif") != text.startswith("data_"):
+        raise ValueError(f"{file_fmt} requested for {file}")
+    return text
+
+
+def test_limits_are_enforced():
+    assert run_isolated(divmod, (7, 2), IsolationLimits()) == (3, 1)
+    with pytest.raises(IsolatedJobTimeout):
+        run_isolated(time.sleep, (60,), IsolationLimits(timeout=0.5))
+    with pytest.raises(IsolatedJobCrash):
+        run_isolated(os.abort, (), IsolationLimits())
+    with pytest.raises(IsolatedJobError, match="MemoryError"):
+        run_isolated(bytearray, (2**34,), IsolationLimits(memory_mb=4096))
+
+    limits = IsolationLimits.scaled(20000, timeout=10.0, memory_mb=1000.0)
+    assert (limits.timeout, limits.memory_mb) == (40.0, 4000.0)
+    assert IsolationLimits.scaled(100, timeout=10.0, memory_mb=0).memory_mb is None
+
+
+@pytest.mark.parametrize("fallback", ["fail", "sanitized", "crop"])
+def test_modeller_fallbacks(fallback):
+    receptor = Receptor("tests/data/1az5.pdb", sanitizer=PDBSanitizerFactory(remove_water=True))
+    receptor.sanitize_file()
+    sanitized = receptor.current_file_stream.getvalue()
+    args = configure_argparser(
+        ["-r", "unused", "-o", "unused", "--modeller-fallback", fallback, "--modeller-timeout", "1"]
+    )
+
+    events = []
+    if fallback == "fail":
+        with pytest.raises(IsolatedJobCrash):
+            isolated_modeller_operations(receptor, args, False, events, job=crash_on_large)
+        assert events == ["modeller-crash"]
+        return
+
+    isolated_modeller_operations(receptor, args, False, events, job=crash_on_large)
+    assert events == ["modeller-crash", f"fallback-{fallback}"]
+    result = receptor.current_file_stream.read()
+    if fallback == "crop":
+        # cropped around the truncated LYS and PHE side chains, then modelled
+        assert result.startswith("REMARK   1 MODELLED")
+        assert 0 < count_atoms(result) < count_atoms(sanitized)
+        return
+
+    assert result == sanitized
+    events = []
+    isolated_modeller_operations(Receptor("tests/data/9ins.pdb"), args, False, events, job=slow)
+    assert events == ["modeller-timeout", "fallback-sanitized"]
+
+
+def test_modeller_keeps_the_stream_format():
+    args = configure_argparser(["-r", "unused", "-o", "unused.pdb", "--modeller-fallback", "fail"])
+    receptor = Receptor("tests/data/1BKX.cif", output_fmt="pdb")
+    text = receptor.current_file_stream.read()
+    isolated_modeller_operations(receptor, args, False, job=check_format)
+    assert receptor.current_file_stream.read() == text
+    assert receptor.output_text(".pdb").startswith(("ATOM", "HETATM", "REMARK", "HEADER"))
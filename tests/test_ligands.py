@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from docktprep.ligands import LigandExtractor
+from docktprep.main import configure_argparser
+from docktprep.receptor_parser import PDBSanitizerFactory, Receptor
+
+
+def hetatm(serial, name, resname, chain, resseq, xyz, element):
+    x, y, z = xyz
+    return (
+        f"HETATM{serial:5d} {name:<4} {resname:>3} {chain}{resseq:4d}    "
+        f"{x:8.3f}{y:8.3f}{z:8.3f}  1.00 10.00          {element:>2}\n"
+    )
+
+
+def test_ligands_are_extracted_from_the_sanitize_pass(tmp_path):
+    extractor = LigandExtractor(str(tmp_path), "1bkx", water_cutoff=8.0)
+    receptor = Receptor(
+        "tests/data/1bkx.pdb",
+        sanitizer=PDBSanitizerFactory(remove_hetresi=True, remove_water=True),
+        ligand_extractor=extractor,
+    )
+    receptor.sanitize_file()
+    assert "AMP" not in receptor.current_file_stream.getvalue()
+
+    # modified residues (TPO, SEP) belong to the polymer
+    assert receptor.ligand_files == [str(tmp_path / "1bkx_AMP_A351.pdb")]
+    lines = open(receptor.ligand_files[0]).read().splitlines()
+    ligand = [line for line in lines if line[17:20] == "AMP"]
+    waters = {line[22:26] for line in lines if line[17:20] == "HOH"}
+    assert len(ligand) == 19
+
+    coords = lambda rows: np.array([[float(r[30:38]), float(r[38:46]), float(r[46:54])] for r in rows])
+    with open("tests/data/1bkx.pdb") as f:
+        all_waters = [line for line in f if line.startswith("HETATM") and line[17:20] == "HOH"]
+    dist = np.linalg.norm(coords(all_waters)[:, None] - coords(ligand)[None], axis=2)
+    assert waters == {all_waters[i][22:26] for i in np.flatnonzero(dist.min(axis=1) <= 8.0)}
+    assert waters
+
+
+def test_bonded_residues_form_one_instance_and_ions_stay_apart(tmp_path):
+    pdb = tmp_path / "glycan.pdb"
+    pdb.write_text(
+        hetatm(1, "C1", "NAG", "B", 1, (0.0, 0.0, 0.0), "C")
+        + hetatm(2, "O4", "NAG", "B", 1, (1.4, 0.0, 0.0), "O")
+        + hetatm(3, "C1", "NAG", "B", 2, (2.8, 0.0, 0.0), "C")
+        + hetatm(4, "C2", "NAG", "B", 2, (3.5, 1.2, 0.0), "C")
+        + hetatm(5, "ZN", "ZN", "B", 3, (1.4, 2.0, 0.0), "ZN")
+        + hetatm(6, "C1", "GOL", "B", 4, (10.0, 0.0, 0.0), "C")
+        + hetatm(7, "C2", "GOL", "B", 4, (11.5, 0.0, 0.0), "C")
+    )
+    receptor = Receptor(str(pdb), ligand_extractor=LigandExtractor(str(tmp_path / "lig"), "x"))
+    receptor.sanitize_file()
+    names = sorted(f.rsplit("/", 1)[1] for f in receptor.ligand_files)
+    assert names == ["x_GOL_B4.pdb", "x_NAG-NAG_B1.pdb", "x_ZN_B3.pdb"]
+
+
+def test_water_cutoff_must_be_positive(tmp_path):
+    with pytest.raises(ValueError):
+        LigandExtractor(str(tmp_path), "receptor", water_cutoff=0.0)
+    with pytest.raises(SystemExit):
+        configure_argparser(["-r", "unused", "-o", "unused", "--extract-ligands", "--ligand-waters", "0"])
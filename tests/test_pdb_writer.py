@@ -0,0 +1,80 @@
+import io
+import logging
+import warnings
+
+import numpy as np
+import pytest
+from Bio.PDB import PDBIO, MMCIFParser, PDBParser
+from Bio.PDB.PDBExceptions import PDBIOException
+from Bio.PDB.PDBIO import Select
+
+from docktprep.pdb_writer import PDBWriter
+from docktprep.receptor_parser import PDBSanitizerFactory
+
+DATA = ["tests/data/1az5.pdb", "tests/data/1bkx.pdb", "tests/data/9ins.pdb", "tests/data/1BKX.cif"]
+
+
+def load(file):
+    parser = MMCIFParser(QUIET=True) if file.endswith(".cif") else PDBParser(QUIET=True)
+    return parser.get_structure("test", file)
+
+
+def write(writer_class, structure, select=None):
+    writer = writer_class()
+    writer.set_structure(structure)
+    stream = io.StringIO()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        writer.save(stream, **({"select": select()} if select else {}))
+    return stream.getvalue()
+
+
+class EvenResidues(Select):
+    def accept_residue(self, residue):
+        return residue.id[1] % 2 == 0
+
+    def accept_atom(self, atom):
+        return atom.get_id() != "CB"
+
+
+@pytest.mark.parametrize("file", DATA)
+def test_output_is_identical_to_pdbio(file):
+    logging.disable(logging.INFO)
+    try:
+        structure = load(file)
+        selects = [
+            None,
+            EvenResidues,
+            lambda: PDBSanitizerFactory().create_sanitizer(structure),
+            lambda: PDBSanitizerFactory(remove_water=False).create_sanitizer(structure),
+        ]
+        for select in selects:
+            assert write(PDBWriter, structure, select) == write(PDBIO, structure, select)
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def test_fallback_rows_and_models_match_pdbio():
+    structure = load("tests/data/1az5.pdb")
+    model = structure[0]
+    second = model.copy()
+    second.id, second.serial_num = 1, 2
+    structure.add(second)
+
+    atoms = list(model.get_atoms())
+    atoms[0].coord = np.array([12345.678, -1234.5677, 0.0625], dtype=np.float32)  # too wide, tie
+    atoms[1].coord = np.array([-0.0001, 1.0, np.nan], dtype=np.float32)
+    atoms[2].bfactor = 0.125
+    atoms[3].occupancy = None
+    atoms[4].get_parent().resname = "LONG"
+
+    assert write(PDBWriter, structure) == write(PDBIO, structure)
+
+
+def test_format_limits_raise():
+    structure = load("tests/data/1az5.pdb")
+    next(structure.get_residues()).id = (" ", 10000, " ")
+    writer = PDBWriter()
+    writer.set_structure(structure)
+    with pytest.raises(PDBIOException):
+        writer.save(io.StringIO())
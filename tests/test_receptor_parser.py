@@ -1,5 +1,7 @@
 import io
+import logging
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from copy import copy
 
 import pytest
@@ -55,3 +57,25 @@ def test_write_file_stream():
             assert f.read() == current_file_stream.read()
 
     receptor.close_file_stream()
+
+
+def test_concurrent_sanitize_matches_sequential(caplog):
+    def sanitize(file):
+        receptor = Receptor(file)
+        receptor.sanitize_file()
+        text = receptor.current_file_stream.getvalue()
+        receptor.close_file_stream()
+        return text
+
+    files = ["tests/data/1az5.pdb", "tests/data/9ins.pdb", "tests/data/1BKX.cif"] * 4
+    expected = [sanitize(f) for f in files]
+    caplog.clear()
+    with caplog.at_level(logging.WARNING):
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            assert list(pool.map(sanitize, files)) == expected
+
+    # construction warnings are reported once per parse, for the right file
+    warned = [r.message.split(":")[0] for r in caplog.records]
+    assert warned.count("tests/data/9ins.pdb") == 2 * 4
+    assert set(warned) == {"tests/data/9ins.pdb"}
+    assert Receptor(files[0]).sanitizer is not Receptor(files[0]).sanitizer
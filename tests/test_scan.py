@@ -0,0 +1,64 @@
+import gzip
+import json
+import logging
+import shutil
+
+from docktprep.main import configure_argparser, main, modeller_operations
+from docktprep.receptor_parser import PDBSanitizerFactory, Receptor
+from docktprep.scan import scan_structure
+
+
+def test_scan_pdb_and_mmcif_agree():
+    pdb = scan_structure("tests/data/1bkx.pdb")
+    cif = scan_structure("tests/data/1BKX.cif")
+    for scan in (pdb, cif):
+        assert (scan.n_atoms, scan.n_residues, scan.n_chains) == (2832, 352, 1)
+        assert scan.nonstd_residues == {"TPO": 1, "SEP": 1}
+        assert scan.het_residues == {"TPO": 1, "SEP": 1, "AMP": 1}
+        assert scan.n_waters == 12
+    assert pdb.chains == cif.chains
+
+
+def test_scan_altlocs_models_and_gzip(tmp_path):
+    scan = scan_structure("tests/data/9ins.pdb")
+    assert scan.chains == {"A": {"atoms": 209, "residues": 54}, "B": {"atoms": 323, "residues": 78}}
+    assert scan.n_altloc_atoms == 96
+
+    # two models: counts refer to the first one
+    lines = [l for l in open("tests/data/1az5.pdb") if l.startswith(("ATOM", "HETATM"))]
+    models = tmp_path / "models.pdb.gz"
+    with gzip.open(models, "wt") as f:
+        for number in (1, 2):
+            f.write(f"MODEL     {number:4d}\n" + "".join(lines) + "ENDMDL\n")
+    scan = scan_structure(str(models))
+    assert scan.models == [1, 2]
+    assert scan.n_atoms == 940
+    assert scan.n_missing_atoms == 10
+
+
+def test_scan_subcommand_writes_json_lines(tmp_path):
+    shutil.copy("tests/data/1az5.pdb", tmp_path)
+    shutil.copy("tests/data/1BKX.cif", tmp_path)
+    out = tmp_path / "scan.jsonl"
+    assert main(["scan", str(tmp_path), "-o", str(out), "--workers", "2"]) == 0
+    records = {json.loads(line)["file"]: json.loads(line) for line in open(out)}
+    assert records[str(tmp_path / "1az5.pdb")]["n_atoms"] == 940
+    assert records[str(tmp_path / "1BKX.cif")]["format"] == "cif"
+
+    assert main(["scan", str(tmp_path / "missing.pdb"), "-o", str(out), "--workers", "1"]) == 1
+    assert "error" in json.loads(open(out).read())
+
+
+def test_scan_skips_needless_modeller_runs(caplog):
+    args = configure_argparser(["-r", "unused", "-o", "unused.pdb", "--replace-nstd-res"])
+    caplog.set_level(logging.INFO)
+    receptor = Receptor("tests/data/9ins.pdb", sanitizer=PDBSanitizerFactory(remove_water=True))
+    receptor.sanitize_file()
+    scan = scan_structure("tests/data/9ins.pdb", stream=receptor.current_file_stream)
+    assert scan.n_hydrogens == 0
+
+    # no non-standard residues: only the missing atoms (here hydrogens) are added, without MODELLER
+    receptor = modeller_operations(receptor, args, scan)
+    assert "only adding the missing atoms" in caplog.text
+    completed = scan_structure("tests/data/9ins.pdb", stream=receptor.current_file_stream)
+    assert completed.n_hydrogens > 0 and completed.n_missing_atoms == 0
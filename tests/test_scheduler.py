@@ -0,0 +1,62 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from docktprep.scheduler import BatchScheduler, Job, ReceptorCost, estimate_cost
+
+
+def make_jobs(works, memory_mb=100.0):
+    return [
+        Job(input=f"job{i}", attempt=1, cost=ReceptorCost(f"job{i}"), work=w, memory_mb=memory_mb)
+        for i, w in enumerate(works)
+    ]
+
+
+def run_jobs(scheduler, jobs):
+    started, lock = [], threading.Lock()
+    concurrent = {"now": 0, "max": 0}
+
+    def work(job):
+        with lock:
+            started.append(job.input)
+            concurrent["now"] += 1
+            concurrent["max"] = max(concurrent["max"], concurrent["now"])
+        time.sleep(job.work / 1000)
+        with lock:
+            concurrent["now"] -= 1
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        report = scheduler.run(jobs, submit=lambda job: pool.submit(work, job), on_done=lambda *_: None)
+    return started, concurrent["max"], report
+
+
+def test_largest_jobs_are_dispatched_first():
+    jobs = make_jobs([5, 50, 10, 40])
+    started, _, report = run_jobs(BatchScheduler(workers=1, memory_budget_mb=1e9), jobs)
+    assert started == ["job1", "job3", "job2", "job0"]
+    assert report.n_jobs == 4
+    assert report.makespan >= report.ideal_makespan > 0
+
+
+def test_memory_budget_limits_concurrency():
+    jobs = make_jobs([20] * 6, memory_mb=100.0)
+    _, max_running, report = run_jobs(BatchScheduler(workers=4, memory_budget_mb=250.0), jobs)
+    assert max_running == 2
+    assert report.peak_memory_mb <= 250.0
+
+    # a job larger than the whole budget still runs, alone
+    jobs = make_jobs([5], memory_mb=1000.0)
+    _, max_running, _ = run_jobs(BatchScheduler(workers=4, memory_budget_mb=250.0), jobs)
+    assert max_running == 1
+
+
+def test_estimate_cost_prescan():
+    cost = estimate_cost("tests/data/1az5.pdb")
+    assert cost.n_atoms > 800
+    assert cost.n_chains == 1
+    assert cost.n_missing_atoms == 10  # truncated LYS and PHE side chains
+    assert cost.work(modeller=True) > cost.work()
+
+    cif = estimate_cost("tests/data/1BKX.cif")
+    pdb = estimate_cost("tests/data/1bkx.pdb")
+    assert (cif.n_atoms, cif.n_chains) == (pdb.n_atoms, pdb.n_chains)
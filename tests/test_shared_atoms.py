@@ -0,0 +1,48 @@
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from docktprep.atom_table import AtomTable
+from docktprep.receptor_parser import FileFormatHandler
+from docktprep.shared_atoms import attach_atom_table, share_atom_table
+
+
+def load_table():
+    structure = FileFormatHandler.get_parser(".pdb").get_structure("r", "tests/data/1az5.pdb")
+    return AtomTable.from_structure(structure)
+
+
+def summarize(handle):
+    with attach_atom_table(handle) as table:
+        return len(table), float(table.coord.sum()), int((table.name == "CA").sum())
+
+
+def crash(handle):
+    with attach_atom_table(handle):
+        os._exit(1)
+
+
+def test_workers_attach_without_copy_and_owner_unlinks():
+    table = load_table()
+    ctx = multiprocessing.get_context("spawn")  # fresh interpreter and resource tracker
+    with share_atom_table(table) as shared:
+        with attach_atom_table(shared.handle) as attached:
+            assert np.array_equal(attached.resname, table.resname)
+            assert not attached.coord.flags.owndata and not attached.coord.flags.writeable
+
+        with ctx.Pool(2) as pool:
+            results = pool.map(summarize, [shared.handle] * 2)
+            assert results[0] == (len(table), float(table.coord.sum()), int((table.name == "CA").sum()))
+            # a worker crashing while attached does not remove the segment
+            process = ctx.Process(target=crash, args=(shared.handle,))
+            process.start()
+            process.join()
+            assert process.exitcode == 1
+            assert summarize(shared.handle) == results[0]
+        name = shared.handle.segment
+
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
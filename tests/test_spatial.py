@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from docktprep.spatial import CellList
+
+
+def brute_force_pairs(coords, cutoff):
+    dist = np.linalg.norm(coords[:, None] - coords[None], axis=-1)
+    i, j = np.nonzero(np.triu(dist <= cutoff, k=1))
+    return set(zip(i.tolist(), j.tolist()))
+
+
+def test_cell_list_pairs_match_brute_force():
+    rng = np.random.default_rng(0)
+    coords = rng.uniform(-10, 10, size=(500, 3))
+    i, j, d = CellList(coords, cell_size=3.0).pairs()
+    assert set(zip(i.tolist(), j.tolist())) == brute_force_pairs(coords, 3.0)
+    assert np.allclose(d, np.linalg.norm(coords[i] - coords[j], axis=1))
+
+
+def test_cell_list_query_matches_brute_force():
+    rng = np.random.default_rng(1)
+    coords = rng.uniform(0, 20, size=(400, 3))
+    points = rng.uniform(-5, 25, size=(30, 3))
+    mask = CellList(coords, cell_size=4.0).within(points, 2.5)
+    dist = np.linalg.norm(coords[:, None] - points[None], axis=-1)
+    assert np.array_equal(mask, (dist <= 2.5).any(axis=1))
+
+
+def test_cell_list_keys_do_not_wrap():
+    coords = np.array([[0.0, 0.0, 0.0], [50.0, 0.0, 0.0]])
+    with pytest.raises(ValueError):
+        CellList(coords, cell_size=1e-5)
+    # query points far outside the indexed cells find nothing
+    index = CellList(coords, cell_size=1.0)
+    far = np.array([[50.0 + 2.0**21, 0.0, 0.0], [-(2.0**22), 0.0, 0.0]])
+    assert len(index.query(far)[0]) == 0
@@ -0,0 +1,69 @@
+import logging
+import os
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+from docktprep.stdout_manager import (
+    capture_output,
+    capture_warnings,
+    log_captured_output,
+    suppress_output,
+)
+
+
+def test_capture_output_fd_level():
+    with capture_output() as (out, err):
+        print("python stdout")
+        os.write(1, b"native stdout\n")
+        os.write(2, b"native stderr\n")
+    assert "python stdout" in out.getvalue()
+    assert "native stdout" in out.getvalue()
+    assert "native stderr" in err.getvalue()
+
+
+def test_capture_output_is_bounded():
+    with capture_output(max_bytes=10) as (out, _):
+        os.write(1, b"x" * 100_000)  # larger than a pipe buffer
+    assert out.getvalue().startswith("x" * 10 + "\n")
+    assert "99990 bytes truncated" in out.getvalue()
+
+
+def test_suppress_output_fd_level(capfd):
+    with suppress_output():
+        os.write(1, b"hidden\n")
+    os.write(1, b"visible\n")
+    assert capfd.readouterr().out == "visible\n"
+
+
+def test_log_captured_output_splits_records(caplog):
+    with caplog.at_level(logging.INFO):
+        log_captured_output("a" * 25, max_record_chars=10)
+    assert [len(r.message) for r in caplog.records] == [10, 10, 5]
+
+
+def test_capture_warnings_is_per_thread():
+    barrier = threading.Barrier(4)
+
+    def warn_and_capture(i):
+        with capture_warnings(UserWarning) as warns:
+            barrier.wait()  # all captures active at once
+            warnings.warn(f"thread {i}", UserWarning)
+            barrier.wait()
+        return [str(w.message) for w in warns]
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        captured = list(pool.map(warn_and_capture, range(4)))
+    assert captured == [[f"thread {i}"] for i in range(4)]
+
+
+def test_capture_warnings_restores_the_warning_state():
+    showwarning, filters = warnings.showwarning, list(warnings.filters)
+    with capture_warnings(UserWarning) as outer:
+        with capture_warnings(DeprecationWarning) as inner:
+            warnings.warn("inner", DeprecationWarning)
+        assert warnings.showwarning is not showwarning  # still capturing
+        warnings.warn("outer", UserWarning)
+    assert [str(w.message) for w in inner + outer] == ["inner", "outer"]
+    assert warnings.showwarning is showwarning
+    assert warnings.filters == filters
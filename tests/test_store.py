@@ -0,0 +1,56 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+from docktprep.batch import configure_batch_argparser, run_batch
+from docktprep.journal import BatchJournal
+from docktprep.store import StoreReader, open_store
+
+INPUTS = ["tests/data/1az5.pdb", "tests/data/9ins.pdb", "tests/data/1BKX.cif"]
+
+
+def append_records(directory, worker, n=50):
+    store = open_store(directory, shards=3)
+    return [store.append(f"{worker}-{i}", f"{worker}:{i}\n".encode() * i).id for i in range(n)]
+
+
+def test_concurrent_appends(tmp_path):
+    directory = str(tmp_path / "store")
+    with ProcessPoolExecutor(2) as processes, ThreadPoolExecutor(2) as threads:
+        futures = [processes.submit(append_records, directory, f"p{k}") for k in range(2)]
+        futures += [threads.submit(append_records, directory, f"t{k}") for k in range(2)]
+        ids = [record_id for future in futures for record_id in future.result()]
+
+    with open(tmp_path / "store" / "shard-0000.idx", "a") as f:
+        f.write('"p0-1"\t0\t')  # interrupted append
+    with StoreReader(directory) as reader:
+        assert sorted(reader) == sorted(ids)
+        for record_id in ids:
+            worker, i = record_id.split("-")
+            assert reader.read(record_id, verify=True) == f"{worker}:{i}\n".encode() * int(i)
+
+        store = open_store(directory)
+        assert store.shards == 3
+        store.append("p0-1", b"again")
+        assert reader.read("p0-2") == b"p0:2\np0:2\n"
+        reader.reload()
+        assert reader.open("p0-1").read() == "again"
+        with pytest.raises(KeyError):
+            reader.read("missing")
+
+
+def test_batch_writes_to_the_store(tmp_path):
+    for mode, options in (("files", []), ("store", ["--output-store", str(tmp_path / "store")])):
+        args = configure_batch_argparser(
+            ["-i", "unused", "-d", str(tmp_path / mode), "--workers", "2", "--output-ext", "pdb", *options]
+        )
+        assert run_batch(INPUTS, args) == {"done": 3, "failed": 0}
+        assert run_batch(INPUTS, args) == {"done": 0, "failed": 0}  # resumed from the store
+
+    journal = BatchJournal(str(tmp_path / "store" / "docktprep-journal.jsonl"))
+    with StoreReader(str(tmp_path / "store")) as reader:
+        assert sorted(reader) == ["1BKX.pdb", "1az5.pdb", "9ins.pdb"]
+        for record_id in reader:
+            assert reader.read(record_id).decode() == (tmp_path / "files" / record_id).read_text()
+        assert {e.sha256 for e in journal.entries()} == {r.sha256 for r in reader.index.values()}
+    assert not list((tmp_path / "store").glob("*.pdb"))
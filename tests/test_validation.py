@@ -0,0 +1,37 @@
+import json
+
+from docktprep.atom_table import AtomTable
+from docktprep.receptor_parser import Receptor
+from docktprep.validation import ReceptorValidator
+
+
+def sanitized_table(file):
+    receptor = Receptor(file)
+    receptor.sanitize_file()
+    table = AtomTable.from_structure(receptor.parse_current_file_stream())
+    receptor.close_file_stream()
+    return table
+
+
+def test_validate_reports_chain_breaks():
+    table = sanitized_table("tests/data/1az5.pdb")
+    report = ReceptorValidator().validate_table(table, receptor_id="1az5")
+    assert report.n_chain_breaks == 1
+    assert report.chain_breaks[0]["atoms"] == ["A:VAL47:C", "A:GLY52:N"]
+    assert report.passed
+    assert json.loads(report.to_json())["receptor"] == "1az5"
+
+
+def test_validate_detects_clash_and_bond_outlier():
+    table = sanitized_table("tests/data/1az5.pdb")
+    clean = ReceptorValidator().validate_table(table)
+
+    # move a side-chain atom onto a distant residue
+    cb = (table.resseq == 10) & (table.name == "CB") & (table.chain_id == "A")
+    target = (table.resseq == 60) & (table.name == "CA") & (table.chain_id == "A")
+    table.coord[cb] = table.coord[target] + 0.5
+    report = ReceptorValidator(max_clashes=0).validate_table(table)
+
+    assert report.n_clashes > clean.n_clashes
+    assert report.n_bond_outliers > clean.n_bond_outliers
+    assert not report.passed
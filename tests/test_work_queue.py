@@ -0,0 +1,72 @@
+import json
+import os
+import subprocess
+import sys
+
+from docktprep.journal import BatchJournal
+from docktprep.work_queue import WorkQueue
+
+INPUTS = ["tests/data/1az5.pdb", "tests/data/9ins.pdb", "tests/data/1bkx.pdb", "tests/data/1BKX.cif"]
+
+
+def test_claims_are_exclusive_and_expired_leases_are_released(tmp_path):
+    dead = WorkQueue(str(tmp_path), worker="dead", lease_seconds=60)
+    alive = WorkQueue(str(tmp_path), worker="alive", lease_seconds=60)
+    assert dead.create([("a.pdb", 1, 100.0), ("b.pdb", 2, 10.0)])
+    assert not alive.create([("c.pdb", 1, 100.0)])
+
+    assert alive.claim(memory_room=50.0).input == "b.pdb"  # backfilled
+    claimed = dead.claim()
+    assert claimed.input == "a.pdb"
+    assert alive.claim() is None and not alive.drained()
+    assert alive.reap(max_attempts=3) == []
+
+    os.utime(claimed.path, (0, 0))  # the dead worker stopped renewing its lease
+    entries = alive.reap(max_attempts=3)
+    assert [(e.input, e.attempt, e.error.split(":")[0]) for e in entries] == [
+        ("a.pdb", 1, "LeaseExpired")
+    ]
+    assert sorted(os.listdir(alive.todo_dir)) == [".created", "00000000.2"]
+    assert not dead.renew(claimed)
+
+    # the last attempt is not requeued
+    retry = alive.claim()
+    assert retry.attempt == 2
+    os.utime(retry.path, (0, 0))
+    assert len(alive.reap(max_attempts=2)) == 1
+    assert os.listdir(alive.lost_dir) == ["00000000.2.alive"]
+
+
+def test_a_drained_queue_is_not_created_again(tmp_path):
+    first = WorkQueue(str(tmp_path), worker="first")
+    assert not first.exists()
+    assert first.create([("a.pdb", 1, 100.0)], config={"output_ext": "pdb"})
+    first.complete(first.claim())
+    assert first.drained() and first.exists()
+
+    late = WorkQueue(str(tmp_path), worker="late")
+    assert not late.create([("a.pdb", 1, 100.0)], config={"output_ext": "cif"})
+    assert late.claim() is None
+    assert late.config() == {"output_ext": "pdb"}
+
+
+def test_workers_drain_a_shared_queue(tmp_path):
+    command = [
+        sys.executable, "-m", "docktprep.main", "batch", "-i", *INPUTS,
+        "-d", str(tmp_path / "out"), "--output-ext", "pdb", "--queue", str(tmp_path / "queue"),
+        "--workers", "1", "--executor", "thread", "--poll-interval", "0.2",
+    ]
+    workers = [subprocess.Popen(command) for _ in range(3)]
+    assert [worker.wait(timeout=300) for worker in workers] == [0, 0, 0]
+
+    journal = BatchJournal(str(tmp_path / "out" / "docktprep-journal.jsonl"))
+    assert sorted(journal.scan()) == sorted(INPUTS)
+    assert len(journal.entries()) == len(INPUTS)  # each input prepared once
+    with open(tmp_path / "out" / "docktprep-metrics.json") as f:
+        metrics = json.load(f)
+    assert metrics["done"] == len(INPUTS) and metrics["failed"] == 0
+    assert sum(worker["done"] for worker in metrics["workers"].values()) == len(INPUTS)
+    assert "sanitize" in metrics["stages"]
+    assert sorted(os.listdir(tmp_path / "out")) == [
+        "1BKX.pdb", "1az5.pdb", "1bkx.pdb", "9ins.pdb", "docktprep-journal.jsonl", "docktprep-metrics.json"
+    ]